@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+
+
+"""
+Long-lived process serving the preprocessing (languagefilter.py) and the
+    authorship attribution (rfclassy.py) of the user interface, so that the
+    interpreter start, the imports of scikit-learn and guess_language, the
+    language tables and the saved models are paid once instead of at every
+    run.
+The requests and the responses are JSON objects, one per line, through a
+    Unix socket (one request per connection) or, with --stdio, through the
+    standard input and output of the daemon:
+    request:    {"op": "preprocess" | "attribute" | "ping" | "shutdown",
+                 "args": [command line arguments of the script],
+                 "cwd": "directory the relative paths are relative to"}
+    responses:  {"output": "text printed by the script"}, as it is printed,
+                and finally {"exit_code": 0}
+The scripts are thin clients: run as programs, they forward their command
+    line to the daemon listening on the socket (see run_as_client) and print
+    its output, or run by themselves when there is none.
+"""
+
+
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import time
+import traceback
+
+
+# the socket of the daemon, overridden by this environment variable
+socket_variable = 'TWEETIFI_DAEMON_SOCKET'
+default_socket_filename = os.sep.join([tempfile.gettempdir(), ''.join(['tweetifi-attribution-', str(os.getuid()), '.sock'])])
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', '-s',
+                        dest='socket_filename',
+                        default=socket_filename(),
+                        help='Unix socket the daemon listens to. Default = $' + socket_variable + ' or ' + default_socket_filename + '.')
+    parser.add_argument('--stdio',
+                        dest='stdio',
+                        action='store_true',
+                        default=False,
+                        help='Serve the requests of the standard input instead of a socket.')
+    return parser.parse_args()
+
+
+def socket_filename():
+    return os.environ.get(socket_variable) or default_socket_filename
+
+
+def connect(filename):
+    """
+    Returns a socket connected to the daemon, or None when none is listening.
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(filename)
+    except socket.error:
+        connection.close()
+        return None
+    return connection
+
+
+def request(connection, op, args=(), cwd=None):
+    """
+    Sends the request through the connection and yields its responses.
+    """
+    connection.sendall(json.dumps({'op': op, 'args': list(args), 'cwd': cwd or os.getcwd()}) + '\n')
+    for line in connection.makefile('r'):
+        yield json.loads(line)
+
+
+def run_as_client(op):
+    """
+    Forwards the command line of the running script to the daemon as the op
+        request and exits with its exit code, the script's output printed as
+        it comes. Returns when no daemon is listening, for the script to run
+        by itself.
+    """
+    connection = connect(socket_filename())
+    if connection is None:
+        return
+    exit_code = 1
+    try:
+        for response in request(connection, op, sys.argv[1:]):
+            if 'output' in response:
+                sys.stdout.write(response['output'].encode('utf-8'))
+                sys.stdout.flush()
+            elif 'exit_code' in response:
+                exit_code = response['exit_code']
+    finally:
+        connection.close()
+    sys.exit(exit_code)
+
+
+class ResponseOutput(object):
+    """
+    File-like object sending what is written to it as output responses.
+    """
+
+    def __init__(self, send):
+        self.send = send
+
+    def write(self, text):
+        if isinstance(text, str):
+            text = text.decode('utf-8', 'replace')
+        if text:
+            self.send({'output': text})
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+
+def preprocess(args):
+    import languagefilter
+    languagefilter.main(args)
+
+
+def attribute(args):
+    import rfclassy
+    rfclassy.main(['rfclassy.py'] + args)
+
+
+operations = {'preprocess': preprocess,
+              'attribute': attribute,
+             }
+
+
+def warm_up():
+    """
+    Imports the scripts and their dependencies before the first request, and
+        builds the tables of the guess_language next to them.
+    """
+    import languagefilter
+    import rfclassy
+    lang_mod_dir = os.sep.join([os.path.dirname(os.path.realpath(__file__)), 'guess-language-0.2'])
+    if os.path.isdir(lang_mod_dir):
+        sys.path.append(lang_mod_dir)
+        import guess_language
+        guess_language.guessLanguageName(u'This is a test of the language checker')
+
+
+def serve_request(message, send):
+    """
+    Runs the request of the message, sending the responses through send.
+        Returns False when the daemon must stop.
+    """
+    op = message.get('op')
+    if op == 'ping':
+        send({'exit_code': 0})
+        return True
+    if op == 'shutdown':
+        send({'exit_code': 0})
+        return False
+    if op not in operations:
+        send({'output': ''.join(['Unknown operation ', str(op), '.\n'])})
+        send({'exit_code': 1})
+        return True
+
+    cwd = os.getcwd()
+    stdout = sys.stdout
+    sys.stdout = ResponseOutput(send)
+    exit_code = 0
+    try:
+        os.chdir(message.get('cwd') or cwd)
+        operations[op]([arg.encode('utf-8') for arg in message.get('args', [])])     # byte strings, as sys.argv
+    except SystemExit as error:     # the scripts quit through sys.exit
+        if error.code is None:
+            exit_code = 0
+        elif isinstance(error.code, int):
+            exit_code = error.code
+        else:
+            print(error.code)
+            exit_code = 1
+    except Exception:
+        print(traceback.format_exc())
+        exit_code = 1
+    finally:
+        sys.stdout = stdout
+        os.chdir(cwd)
+    send({'exit_code': exit_code})
+    return True
+
+
+def serve_stdio():
+    stdout = sys.stdout
+
+    def send(response):
+        stdout.write(json.dumps(response) + '\n')
+        stdout.flush()
+
+    for line in iter(sys.stdin.readline, ''):
+        if line.strip() and not serve_request(json.loads(line), send):
+            break
+
+
+def serve_socket(filename):
+    if connect(filename) is not None:
+        print(''.join(['A daemon is already listening to ', filename, '. Quitting ...']))
+        sys.exit(1)
+    if os.path.exists(filename):    # left by a daemon that did not stop cleanly
+        os.remove(filename)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(filename)
+    server.listen(5)
+    try:
+        running = True
+        while running:
+            connection = server.accept()[0]
+            fd = connection.makefile('rw')
+            try:
+                line = fd.readline()
+
+                def send(response):
+                    fd.write(json.dumps(response) + '\n')
+                    fd.flush()
+
+                if line.strip():
+                    running = serve_request(json.loads(line), send)
+            except socket.error as error:     # the client went away
+                sys.stderr.write(''.join(['Connection error: ', str(error), '\n']))
+            finally:
+                try:
+                    fd.close()
+                except socket.error:
+                    pass
+                connection.close()
+    finally:
+        server.close()
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    args = command_line_parsing()
+
+    start = time.time()
+    warm_up()
+    sys.stderr.write(''.join(['Daemon warmed up in ', str(round(time.time() - start, 2)), ' s.\n']))
+
+    if args.stdio:
+        serve_stdio()
+    else:
+        sys.stderr.write(''.join(['Listening to ', args.socket_filename, ' ...\n']))
+        serve_socket(args.socket_filename)
@@ -0,0 +1,122 @@
+# coding=utf-8
+
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import attribution_daemon
+import rfclassy
+
+
+def echo(args):
+    print(' '.join(args))
+    print(u'çã'.encode('utf-8'))
+    if args and args[0] == 'quit':
+        sys.exit(2)
+
+
+class attribution_daemon_test(unittest.TestCase):
+    def setUp(self):
+        attribution_daemon.operations['echo'] = echo
+
+    def tearDown(self):
+        del attribution_daemon.operations['echo']
+
+    def serve(self, message):
+        responses = []
+        running = attribution_daemon.serve_request(message, responses.append)
+        return running, responses
+
+    def test_serve_request(self):
+        stdout = sys.stdout
+        cwd = os.getcwd()
+        running, responses = self.serve({'op': 'echo', 'args': [u'a', u'b'], 'cwd': os.pardir})
+        self.assertTrue(running)
+        self.assertEqual(u'a b\nçã\n', u''.join(response['output'] for response in responses[:-1]))
+        self.assertEqual({'exit_code': 0}, responses[-1])
+        self.assertEqual((stdout, cwd), (sys.stdout, os.getcwd()))
+
+        self.assertEqual({'exit_code': 2}, self.serve({'op': 'echo', 'args': [u'quit']})[1][-1])
+        self.assertEqual({'exit_code': 1}, self.serve({'op': 'unknown'})[1][-1])
+        self.assertEqual((True, [{'exit_code': 0}]), self.serve({'op': 'ping'}))
+        self.assertEqual((False, [{'exit_code': 0}]), self.serve({'op': 'shutdown'}))
+
+    def test_serve_socket(self):
+        package_dir = os.path.dirname(os.path.realpath(__file__))
+        work_dir = tempfile.mkdtemp()
+        socket_filename = os.path.join(work_dir, 'daemon.sock')
+        # a socket file left by a daemon that did not stop cleanly
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind(socket_filename)
+        stale.close()
+        server = threading.Thread(target=attribution_daemon.serve_socket, args=(socket_filename,))
+        server.daemon = True
+        server.start()
+        try:
+            for _ in range(100):
+                connection = attribution_daemon.connect(socket_filename)
+                if connection is not None:
+                    break
+                time.sleep(0.05)
+            self.assertIsNotNone(connection)
+            self.assertEqual([{'exit_code': 0}], list(attribution_daemon.request(connection, 'ping')))
+            connection.close()
+
+            def args(mode, test_ngrams_dir):       # the relative paths are relative to the client's directory
+                return [os.path.join(package_dir, 'DataTest'), test_ngrams_dir, 'all', 'False', os.path.join(package_dir, 'Data5'),
+                        'model', '20', test_ngrams_dir, '1', '3', '50', 'all', '10', '100', 'False', mode]
+
+            def client(*args):
+                process = subprocess.Popen([sys.executable, os.path.join(package_dir, 'rfclassy.py')] + list(args), cwd=work_dir,
+                                           env=dict(os.environ, **{attribution_daemon.socket_variable: socket_filename}),
+                                           stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                output = process.communicate()[0]
+                return process.returncode, output
+
+            # the thin client runs the script in the daemon, with its exit code
+            exit_code, output = client(*args('train-predict', 'test_1'))
+            self.assertEqual(0, exit_code)
+            predictions = [line for line in output.splitlines() if 'prediction of' in line]
+            self.assertEqual(2, len(predictions))
+            exit_code, output = client(*args('predict', 'test_2'))
+            self.assertEqual(0, exit_code)
+            self.assertEqual(predictions, [line for line in output.splitlines() if 'prediction of' in line])
+            model_dir = os.path.join(work_dir, 'model')
+            self.assertTrue(model_dir in rfclassy.loaded_models)   # loaded by the daemon, in this process
+            model = rfclassy.loaded_models[model_dir][1]
+            exit_code, output = client(*args('unknown', 'test_1'))
+            self.assertEqual(1, exit_code)
+            self.assertTrue(output.startswith('Unknown mode unknown'))
+
+            # the output is streamed as it is printed, and the second request reuses the loaded model
+            connection = attribution_daemon.connect(socket_filename)
+            responses = list(attribution_daemon.request(connection, 'attribute', args('predict', 'test_3'), work_dir))
+            connection.close()
+            self.assertTrue(len(responses) > 2)
+            self.assertEqual({'exit_code': 0}, responses[-1])
+            self.assertEqual(predictions, [line for line in u''.join(response['output'] for response in responses[:-1]).splitlines() if 'prediction of' in line])
+            self.assertTrue(rfclassy.loaded_models[model_dir][1] is model)
+
+            connection = attribution_daemon.connect(socket_filename)
+            self.assertEqual([{'exit_code': 0}], list(attribution_daemon.request(connection, 'shutdown')))
+            connection.close()
+            server.join(10)
+            self.assertFalse(server.is_alive())
+            self.assertFalse(os.path.exists(socket_filename))
+        finally:
+            if server.is_alive():
+                connection = attribution_daemon.connect(socket_filename)
+                if connection is not None:
+                    list(attribution_daemon.request(connection, 'shutdown'))
+                    connection.close()
+            shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Auxiliary code for processing the authors' files of a dataset in parallel.
+Each author's file is processed independently, so the list of files is
+    sharded across a pool of worker processes.
+"""
+
+
+import multiprocessing
+import sys
+
+
+class WorkerExit(Exception):
+    """
+    Raised in the main process when a worker called sys.exit().
+    """
+
+    def __init__(self, code):
+        Exception.__init__(self, code)
+        self.code = code
+
+
+class _Task(object):
+    # a worker that dies by sys.exit() would hang the pool, so the exit is
+    #   turned into an exception that is re-raised in the main process
+    def __init__(self, function):
+        self.function = function
+
+    def __call__(self, filename):
+        try:
+            return self.function(filename)
+        except SystemExit as e:
+            raise WorkerExit(e.code)
+
+
+def map_authors(function, filenames, workers=1):
+    """
+    Yields function(filename) for each filename, in the order of filenames.
+    The function must be picklable (a module-level function or a
+        functools.partial of one) when workers is greater than 1.
+    """
+    if workers <= 1 or len(filenames) <= 1:
+        for filename in filenames:
+            yield function(filename)
+        return
+
+    pool = multiprocessing.Pool(min(workers, len(filenames)))
+    try:
+        for result in pool.imap(_Task(function), filenames):
+            yield result
+        pool.close()
+    except WorkerExit as e:
+        pool.terminate()
+        sys.exit(e.code)
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+
+"""
+Benchmark of the latency of the requests of the user interface, run cold
+    (a fresh interpreter running the script by itself, as spawned by the
+    user interface before the daemon) and warm (through attribution_daemon.py),
+    on copies of the sample data of the repository:
+    attribute: rfclassy.py predicting with a model trained once beforehand
+    preprocess: languagefilter.py running its four stages
+The warm requests are measured both through the scripts, as thin clients
+    (interpreter start included), and straight through the socket.
+"""
+
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+package_dir = os.path.realpath(os.sep.join([script_dir, os.pardir]))
+sys.path.insert(0, package_dir)
+import attribution_daemon
+
+attribute_args = ['DataTest', 'DataTest2', 'all', 'False', 'Data5', 'Data6', '20', 'DataTest2', '1', '3', '50', 'all', '100', '100', 'False']
+preprocess_args = ['Data1', 'Data2', os.sep.join([package_dir, 'guess-language-0.2']), 'English', 'False', 'Data2', 'Data3', 'True', '3', 'False',
+                   'Data3', 'Data4', 'False', 'Data4', 'Data5', 'all', 'False']
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repetitions', '-r',
+                        dest='repetitions',
+                        type=int,
+                        default=5,
+                        help='Number of runs of each measure. Default = 5.')
+    return parser.parse_args()
+
+
+def script_request(work_dir, env, script, args):
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call([sys.executable, os.sep.join([package_dir, script])] + args, cwd=work_dir, env=env, stdout=devnull, stderr=devnull)
+
+
+def socket_request(work_dir, socket_filename, op, args):
+    connection = attribution_daemon.connect(socket_filename)
+    try:
+        for response in attribution_daemon.request(connection, op, args, work_dir):
+            if response.get('exit_code'):
+                raise RuntimeError(''.join(['Request ', op, ' failed.']))
+    finally:
+        connection.close()
+
+
+def measure(repetitions, clean, run):
+    times = []
+    for _ in range(repetitions):
+        clean()
+        start = time.time()
+        run()
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def report(name, cold, warm_script, warm_socket):
+    print('%-12s cold: %8.1f ms    warm through the script: %8.1f ms    warm through the socket: %8.1f ms' % (name, 1000 * cold, 1000 * warm_script, 1000 * warm_socket))
+
+
+if __name__ == '__main__':
+    args = command_line_parsing()
+    work_dir = tempfile.mkdtemp()
+    socket_filename = os.sep.join([work_dir, 'daemon.sock'])
+    env = dict(os.environ)
+    env[attribution_daemon.socket_variable] = socket_filename     # no daemon listening to it yet: the scripts run by themselves
+    daemon = None
+    try:
+        for dirname in ['Data1', 'Data5', 'DataTest']:
+            shutil.copytree(os.sep.join([package_dir, dirname]), os.sep.join([work_dir, dirname]))
+        script_request(work_dir, env, 'rfclassy.py', attribute_args + ['train'])
+
+        def clean_attribute():
+            shutil.rmtree(os.sep.join([work_dir, 'DataTest2']), ignore_errors=True)
+
+        def clean_preprocess():
+            for dirname in ['Data2', 'Data3', 'Data4', 'Data5']:
+                shutil.rmtree(os.sep.join([work_dir, 'preprocess', dirname]), ignore_errors=True)
+
+        os.mkdir(os.sep.join([work_dir, 'preprocess']))
+        shutil.copytree(os.sep.join([package_dir, 'Data1']), os.sep.join([work_dir, 'preprocess', 'Data1']))
+
+        cold = {'attribute': measure(args.repetitions, clean_attribute, lambda: script_request(work_dir, env, 'rfclassy.py', attribute_args + ['predict'])),
+                'preprocess': measure(args.repetitions, clean_preprocess, lambda: script_request(os.sep.join([work_dir, 'preprocess']), env, 'languagefilter.py', preprocess_args)),
+               }
+
+        with open(os.devnull, 'w') as devnull:
+            daemon = subprocess.Popen([sys.executable, os.sep.join([package_dir, 'attribution_daemon.py']), '--socket', socket_filename], stdout=devnull, stderr=devnull)
+        while attribution_daemon.connect(socket_filename) is None:
+            time.sleep(0.05)
+
+        report('attribute', cold['attribute'],
+               measure(args.repetitions, clean_attribute, lambda: script_request(work_dir, env, 'rfclassy.py', attribute_args + ['predict'])),
+               measure(args.repetitions, clean_attribute, lambda: socket_request(work_dir, socket_filename, 'attribute', attribute_args + ['predict'])))
+        report('preprocess', cold['preprocess'],
+               measure(args.repetitions, clean_preprocess, lambda: script_request(os.sep.join([work_dir, 'preprocess']), env, 'languagefilter.py', preprocess_args)),
+               measure(args.repetitions, clean_preprocess, lambda: socket_request(os.sep.join([work_dir, 'preprocess']), socket_filename, 'preprocess', preprocess_args)))
+    finally:
+        if daemon is not None:
+            socket_request(work_dir, socket_filename, 'shutdown', [])
+            daemon.wait()
+        shutil.rmtree(work_dir)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+
+"""
+Benchmark of the start-up time of guess_language, as paid by every
+    languagefilter.py run: importing the module and detecting the language of
+    the first tweet. Each measure runs in a fresh interpreter.
+The 'eager' measure rebuilds the non-alphabetic characters regex the way it
+    was built at import time before it became lazy and cached (one character
+    class entry per alphabetic codepoint).
+"""
+
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+default_lang_mod_dir = os.sep.join([script_dir, os.pardir, 'guess-language-0.2'])
+
+measure_code = '''
+import sys, time
+sys.path.insert(0, %(lang_mod_dir)r)
+start = time.time()
+import guess_language
+import guess_language.guess_language as implementation
+if %(eager)r:
+    import re
+    nonAlpha = [u'[^']
+    for i in range(sys.maxunicode):
+        c = unichr(i)
+        if c.isalpha(): nonAlpha.append(c)
+    nonAlpha.append(u']')
+    implementation.nonAlphaRe = re.compile(u''.join(nonAlpha))
+imported = time.time()
+guess_language.guessLanguageName(u'This is a test of the language checker')
+first_guess = time.time()
+print('%%f %%f' %% (imported - start, first_guess - start))
+'''
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lang-mod-dir', '-l',
+                        dest='lang_mod_dir',
+                        default=default_lang_mod_dir,
+                        help='Directory of the language detection module (guess_language).')
+    parser.add_argument('--repetitions', '-r',
+                        dest='repetitions',
+                        type=int,
+                        default=5,
+                        help='Number of runs of each measure. Default = 5.')
+    return parser.parse_args()
+
+
+def remove_caches(lang_mod_dir):
+    for filename in glob.glob(os.sep.join([lang_mod_dir, 'guess_language', '*.cache'])):
+        os.remove(filename)
+
+
+def measure(lang_mod_dir, eager):
+    output = subprocess.check_output([sys.executable, '-c', measure_code % {'lang_mod_dir': lang_mod_dir, 'eager': eager}])
+    return [float(value) for value in output.split()]
+
+
+def report(name, measures):
+    imports = sorted(measure[0] for measure in measures)
+    first_guesses = sorted(measure[1] for measure in measures)
+    print('%-28s import: %8.1f ms    import + first guess: %8.1f ms' % (name, 1000 * imports[len(imports) // 2], 1000 * first_guesses[len(first_guesses) // 2]))
+
+
+if __name__ == '__main__':
+    args = command_line_parsing()
+    lang_mod_dir = os.path.realpath(args.lang_mod_dir)
+
+    report('eager (before)', [measure(lang_mod_dir, True) for _ in range(args.repetitions)])
+    cold = []
+    for _ in range(args.repetitions):
+        remove_caches(lang_mod_dir)
+        cold.append(measure(lang_mod_dir, False))
+    report('lazy, no cache', cold)
+    report('lazy, cached', [measure(lang_mod_dir, False) for _ in range(args.repetitions)])
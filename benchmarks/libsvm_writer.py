@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+
+"""
+Benchmark of the throughput of the libsvm serializer of pmsvm_classifier.py
+    (write_libsvm) on a synthetic sparse matrix of binary activations, by
+    default of 100k rows (tweets) by 1M columns (grams).
+The 'per row' measure runs the serializer as it was before it became
+    vectorized (getrow, sort_indices and a join per non-zero) on the first
+    rows of the matrix only, as it is far slower; its output must match the
+    output of the vectorized serializer for these rows.
+"""
+
+
+import argparse
+import io
+import itertools
+import os
+import sys
+import tempfile
+import time
+
+import numpy
+import scipy.sparse
+
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.sep.join([script_dir, os.pardir]))
+import pmsvm_classifier
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', '-r',
+                        dest='rows',
+                        type=int,
+                        default=100000,
+                        help='Number of rows of the matrix. Default = 100000.')
+    parser.add_argument('--columns', '-c',
+                        dest='columns',
+                        type=int,
+                        default=1000000,
+                        help='Number of columns of the matrix. Default = 1000000.')
+    parser.add_argument('--non-zeros', '-n',
+                        dest='non_zeros',
+                        type=int,
+                        default=50,
+                        help='Mean number of non-zeros per row. Default = 50.')
+    parser.add_argument('--per-row-rows', '-p',
+                        dest='per_row_rows',
+                        type=int,
+                        default=5000,
+                        help='Number of rows written by the per row serializer. Default = 5000.')
+    return parser.parse_args()
+
+
+def synthetic_matrix(rows, columns, non_zeros):
+    rng = numpy.random.RandomState(0)
+    lengths = rng.poisson(non_zeros, rows)
+    indptr = numpy.append(0, numpy.cumsum(lengths))
+    indices = rng.randint(0, columns, indptr[-1]).astype(numpy.int32)
+    matrix = scipy.sparse.csr_matrix((numpy.ones(len(indices), dtype=int), indices, indptr), shape=(rows, columns))
+    matrix.sum_duplicates()     # sorted indices without duplicates, as the fold matrices
+    matrix.data[:] = 1
+    return matrix, numpy.asmatrix(rng.randint(0, 50, rows)).reshape(rows, 1)
+
+
+def per_row_write(fd, x, y):
+    for row_idx in range(x.shape[0]):
+        sample = [ str(y[row_idx, 0]) ]
+        row = x.getrow(row_idx)
+        row.sort_indices()
+        for idx,value in itertools.izip(row.indices, row.data):
+            sample.append(':'.join([str(idx+1), str(value)]))
+        sample.append('\n')
+        fd.write(' '.join(sample))
+
+
+def measure(write, x, y):
+    with tempfile.TemporaryFile() as fd:
+        start = time.time()
+        write(fd, x, y)
+        fd.flush()
+        elapsed = time.time() - start
+        size = fd.tell()
+    return elapsed, size
+
+
+def report(name, x, elapsed, size):
+    print('%-24s %8.2f s  %10.0f rows/s  %12.0f non-zeros/s  %8.1f MB/s' % (name, elapsed, x.shape[0] / elapsed, x.nnz / elapsed, size / elapsed / 2 ** 20))
+
+
+if __name__ == '__main__':
+    args = command_line_parsing()
+    x, y = synthetic_matrix(args.rows, args.columns, args.non_zeros)
+    print('Matrix of %d x %d with %d non-zeros.' % (x.shape[0], x.shape[1], x.nnz))
+
+    x_head, y_head = x[:args.per_row_rows], y[:args.per_row_rows]
+    expected = io.BytesIO()
+    per_row_write(expected, x_head, y_head)
+    written = io.BytesIO()
+    pmsvm_classifier.write_libsvm(written, x_head, y_head)
+    if written.getvalue() != expected.getvalue():
+        print('The serializers\' outputs differ. Quitting ...')
+        sys.exit(1)
+
+    report('per row (before)', x_head, *measure(per_row_write, x_head, y_head))
+    report('vectorized', x, *measure(pmsvm_classifier.write_libsvm, x, y))
+    report('vectorized, binary', x, *measure(lambda fd, x, y: pmsvm_classifier.write_libsvm(fd, x, y, binary=True), x, y))
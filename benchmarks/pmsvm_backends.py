@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+
+
+"""
+Benchmark of the classifier backends of pmsvm_classifier.py: the wall time
+    and the accuracy of classifying the same folds (same seed) with each
+    backend, in a single process.
+The pmsvm backend is skipped when the PmSVM sources are not found; its time
+    includes writing the libsvm files and running the external classifier,
+    while its compilation is timed apart. The times include sampling the
+    runs, the same for every backend.
+"""
+
+
+import argparse
+import functools
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.sep.join([script_dir, os.pardir]))
+import feature_store
+import pmsvm_classifier
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source-dir-data', '-a',
+                        dest='source_dir_data',
+                        default=os.sep.join([script_dir, os.pardir, 'Data5']),
+                        help='Directory where the authors\' n-grams are stored.')
+    parser.add_argument('--backends', '-b',
+                        choices=sorted(pmsvm_classifier.backends),
+                        nargs='+',
+                        default=sorted(pmsvm_classifier.backends),
+                        help='Backends to be measured. Default = all.')
+    parser.add_argument('--authors', '-n',
+                        dest='num_authors',
+                        type=int,
+                        default=3,
+                        help='Number of authors sampled in each run. Default = 3.')
+    parser.add_argument('--tweets', '-t',
+                        dest='num_tweets',
+                        type=int,
+                        default=4,
+                        help='Number of tweets sampled from each author. Default = 4.')
+    parser.add_argument('--folds', '-f',
+                        dest='validation_folding',
+                        type=int,
+                        default=2,
+                        help='Number of folds in cross validation. Default = 2.')
+    parser.add_argument('--repetitions', '-r',
+                        dest='repetitions',
+                        type=int,
+                        default=3,
+                        help='Number of runs of the experiment. Default = 3.')
+    parser.add_argument('--seed', '-s',
+                        dest='seed',
+                        type=int,
+                        default=0,
+                        help='Seed of the sampling of the runs. Default = 0.')
+    return parser.parse_args()
+
+
+def measure(runs):
+    start = time.time()
+    accuracies = [accuracy for fold_accuracies in runs for accuracy in fold_accuracies]
+    return time.time() - start, len(accuracies), sum(accuracies) / len(accuracies)
+
+
+if __name__ == '__main__':
+    args = command_line_parsing()
+    logging.basicConfig(level=logging.WARNING, format='[%(asctime)s] - %(levelname)s - %(message)s')
+
+    authors_list = pmsvm_classifier.filter_authors(args.source_dir_data, 0)
+    vocabulary = feature_store.corpus_vocabulary(args.source_dir_data)
+    output_dir = tempfile.mkdtemp()
+    try:
+        for name in args.backends:
+            if name == 'pmsvm' and not os.path.exists(os.sep.join([script_dir, os.pardir, 'PmSVM', 'PmSVM.cpp'])):
+                print('%-12s skipped: PmSVM sources not found' % name)
+                continue
+            backend = pmsvm_classifier.backends[name]
+            start = time.time()
+            backend.prepare()
+            prepare_time = time.time() - start
+            elapsed, num_folds, accuracy = measure(pmsvm_classifier.classify_runs(authors_list, os.sep.join([output_dir, name]), args.repetitions, args.num_authors, args.num_tweets,
+                                                                                  args.validation_folding, pmsvm_classifier.features_list, vocabulary, args.seed, backend))
+            print('%-12s prepare: %8.1f ms    %d folds: %8.1f ms (%6.1f ms/fold)    accuracy: %6.2f%%' % (name, 1000 * prepare_time, num_folds, 1000 * elapsed, 1000 * elapsed / num_folds, accuracy))
+    finally:
+        shutil.rmtree(output_dir)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+
+"""
+Benchmark of the peak memory (resident set size) of the classification of
+    rfclassy.py (fit_classify) versus the vocabulary size, on synthetic
+    binary activation matrices. Each measure runs in a fresh interpreter.
+The 'dense' measure densifies the training and test sets the way
+    rfclassy.py did before the classification became sparse end to end.
+"""
+
+
+import argparse
+import os
+import subprocess
+import sys
+
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+
+measure_code = '''
+import resource, sys
+sys.path.insert(0, %(package_dir)r)
+import numpy, scipy.sparse
+import rfclassy
+rng = numpy.random.RandomState(0)
+def matrix(rows):
+    indices = rng.randint(0, %(vocabulary)d, rows * %(non_zeros)d)
+    indptr = numpy.arange(0, len(indices) + 1, %(non_zeros)d)
+    matrix = scipy.sparse.csr_matrix((numpy.ones(len(indices), dtype=int), indices, indptr), shape=(rows, %(vocabulary)d))
+    matrix.sum_duplicates()
+    return matrix.astype(bool).astype(int)
+x_train = matrix(%(rows)d)
+x_test = matrix(1)
+y_train = list(range(%(rows)d))
+baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if %(dense)r:
+    x_train, x_test = x_train.todense(), x_test.todense()
+rfclassy.fit_classify(%(num_trees)d, x_train, y_train, x_test, [0])
+print('%%d %%d' %% (baseline, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+'''
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vocabulary-sizes', '-v',
+                        dest='vocabulary_sizes',
+                        type=int,
+                        nargs='+',
+                        default=[10000, 30000, 100000, 300000],
+                        help='Numbers of columns (grams) of the matrices. Default = 10000 30000 100000 300000.')
+    parser.add_argument('--rows', '-r',
+                        dest='rows',
+                        type=int,
+                        default=50,
+                        help='Number of training rows (authors). Default = 50.')
+    parser.add_argument('--non-zeros', '-n',
+                        dest='non_zeros',
+                        type=int,
+                        default=1000,
+                        help='Number of non-zeros per row, before removing the duplicates. Default = 1000.')
+    parser.add_argument('--trees', '-t',
+                        dest='num_trees',
+                        type=int,
+                        default=100,
+                        help='Number of trees of the random forest. Default = 100.')
+    return parser.parse_args()
+
+
+def measure(args, vocabulary, dense, devnull):
+    output = subprocess.check_output([sys.executable, '-c', measure_code % {'package_dir': os.sep.join([script_dir, os.pardir]),
+                                                                             'vocabulary': vocabulary,
+                                                                             'rows': args.rows,
+                                                                             'non_zeros': args.non_zeros,
+                                                                             'num_trees': args.num_trees,
+                                                                             'dense': dense,
+                                                                            }], stderr=devnull)
+    return [int(value) / 1024.0 for value in output.split()]     # ru_maxrss is in KB
+
+
+if __name__ == '__main__':
+    args = command_line_parsing()
+    devnull = open(os.devnull, 'w')     # the estimators' deprecation warnings
+    print('%10s %24s %24s' % ('vocabulary', 'dense peak RSS (before)', 'sparse peak RSS'))
+    for vocabulary in args.vocabulary_sizes:
+        dense_baseline, dense_peak = measure(args, vocabulary, True, devnull)
+        sparse_baseline, sparse_peak = measure(args, vocabulary, False, devnull)
+        print('%10d %14.1f MB (+%5.1f) %14.1f MB (+%5.1f)' % (vocabulary, dense_peak, dense_peak - dense_baseline, sparse_peak, sparse_peak - sparse_baseline))
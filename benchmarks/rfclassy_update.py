@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+
+"""
+Benchmark of adding authors to a trained rfclassy.py model: the wall time of
+    training the random forest and the linear model again on all the authors
+    against updating them (rfclassy.update: growing the forest by the new
+    trees only, partial_fit of the SGD linear model), on synthetic sparse
+    binary tweets, with the accuracy on held-out tweets of the authors.
+"""
+
+
+import argparse
+import os
+import sys
+import time
+
+import numpy
+import scipy.sparse
+
+
+script_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.sep.join([script_dir, os.pardir]))
+import feature_store
+import rfclassy
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--authors', '-n',
+                        dest='num_authors',
+                        type=int,
+                        default=50,
+                        help='Number of authors of the trained model. Default = 50.')
+    parser.add_argument('--new-authors', '-m',
+                        dest='num_new_authors',
+                        type=int,
+                        default=5,
+                        help='Number of authors added to the model. Default = 5.')
+    parser.add_argument('--tweets', '-t',
+                        dest='num_tweets',
+                        type=int,
+                        default=40,
+                        help='Number of tweets of each author. Default = 40.')
+    parser.add_argument('--grams', '-g',
+                        dest='num_grams',
+                        type=int,
+                        default=20000,
+                        help='Number of distinct grams. Default = 20000.')
+    parser.add_argument('--trees', '-r',
+                        dest='num_trees',
+                        type=int,
+                        default=100,
+                        help='Number of trees of the trained model. Default = 100.')
+    parser.add_argument('--new-trees', '-u',
+                        dest='num_new_trees',
+                        type=int,
+                        default=50,
+                        help='Number of trees grown by the update. Default = 50.')
+    return parser.parse_args()
+
+
+def author_tweets(random, num_tweets, num_grams, author_grams):
+    """
+    Returns the CSR matrix of tweets of 20 grams, half of them drawn from the
+        author's own grams.
+    """
+    rows = [numpy.unique(numpy.concatenate([random.choice(author_grams, 10), random.randint(0, num_grams, 10)])) for _ in range(num_tweets)]
+    indptr = numpy.cumsum([0] + [len(row) for row in rows])
+    return scipy.sparse.csr_matrix((numpy.ones(indptr[-1], dtype=int), numpy.concatenate(rows), indptr), shape=(num_tweets, num_grams))
+
+
+def dataset(random, authors, num_tweets, num_grams):
+    x_list = []
+    y = []
+    for author in authors:
+        x_list.append(author_tweets(random, num_tweets, num_grams, random.randint(0, num_grams, 50)))
+        y += [author] * num_tweets
+    return scipy.sparse.vstack(x_list).tocsr(), numpy.array(y)
+
+
+def timed(function):
+    start = time.time()
+    result = function()
+    return time.time() - start, result
+
+
+if __name__ == '__main__':
+    args = command_line_parsing()
+    random = numpy.random.RandomState(0)
+    authors = ['author_%03d' % i for i in range(args.num_authors + args.num_new_authors)]
+    x, y = dataset(random, authors, 2 * args.num_tweets, args.num_grams)
+    train = numpy.arange(len(y)) % 2 == 0
+    old = numpy.in1d(y, authors[:args.num_authors])
+    grams = [('word-1-gram', (unicode(gram),)) for gram in range(args.num_grams)]
+    vocabulary = feature_store.CorpusVocabulary(None, ['word-1-gram'], None, grams, None,
+                                                numpy.zeros(args.num_grams, dtype=numpy.uint8), numpy.ones(args.num_grams, dtype=numpy.int64))
+
+    x_old = x[train & old]
+    model_columns = numpy.unique(x_old.indices)
+    for linear_model in sorted(rfclassy.linear_models):
+        rf, clf = rfclassy.fit(args.num_trees, x_old[:, model_columns], y[train & old], linear_model)
+        refit_time, (refit_rf, refit_clf) = timed(lambda: rfclassy.fit(args.num_trees + args.num_new_trees, x[train], y[train], linear_model))
+        update_time, (columns, rf, clf) = timed(lambda: rfclassy.update(args.num_new_trees, vocabulary.subset(model_columns, None), rf, clf, vocabulary, x[train], y[train]))
+        x_test = x[~train]
+        print('%-4s refit: %7.2f s (rf accuracy %.3f, linear accuracy %.3f)    update: %7.2f s (rf accuracy %.3f, linear accuracy %.3f)' % (
+              linear_model,
+              refit_time, (refit_rf.predict(x_test) == y[~train]).mean(), (refit_clf.predict(x_test) == y[~train]).mean(),
+              update_time, (rf.predict(x_test[:, columns]) == y[~train]).mean(), (clf.predict(x_test[:, columns]) == y[~train]).mean()))
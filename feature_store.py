@@ -0,0 +1,660 @@
+#!/usr/bin/env python
+
+
+"""
+Auxiliary code for storing the n-gram histograms of an author as sparse
+    arrays instead of pickled lists of dicts.
+The histograms of each feature kind (char-4-gram, word-1-gram, ...) are saved
+    in CSR form: the ids and counts of the grams of tweet i are
+    indices[indptr[i]:indptr[i+1]] and data[indptr[i]:indptr[i+1]]. The three
+    arrays are .npy files, so they can be memory-mapped and only the rows of
+    the sampled tweets are read.
+By default the ids index the vocabulary of the author, a list of the
+    (kind, gram) shared by all its feature kinds. In the hashing mode each
+    gram, namespaced by its feature kind, is mapped to a 32 or 64 bits
+    integer id, and a side table maps the ids back to the grams.
+The corpus vocabulary, built once all the authors are written, numbers the
+    grams of the whole corpus directory and keeps the feature kind and the
+    document frequency of each one, so that the classifiers vectorize the
+    tweets by slicing integer arrays.
+Run this module as a script to convert the directories of pickled histograms
+    written by former versions of ngrams_generator.py.
+"""
+
+
+import argparse
+import functools
+import glob
+import hashlib
+import logging
+import os
+import struct
+import sys
+import weakref
+import numpy
+import scipy.sparse
+import sklearn.externals.joblib
+import authors_pool
+
+
+hashing_bits_choices = [32, 64]
+
+hashed_grams_filename = 'hashed_grams.pkl'
+vocabulary_filename = 'vocabulary.pkl'
+corpus_ids_filename = 'corpus_ids.npy'
+corpus_dirname = '.vocabulary'
+corpus_info_filename = 'info.pkl'
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--source-dir-data', '-a',
+                        dest='source_dir_data',
+                        required=True,
+                        help='Directory where the authors\' directories of pickled histograms are stored.')
+    parser.add_argument('--workers', '-w',
+                        dest='workers',
+                        type=int,
+                        default=1,
+                        help='Number of processes sharing the authors\' directories. Default = 1.')
+    parser.add_argument('--remove-pickles',
+                        dest='remove_pickles',
+                        action='store_true',
+                        default=False,
+                        help='Remove the pickled histograms once converted.')
+    parser.add_argument('--debug', '-d',
+                        dest='debug',
+                        action='store_true',
+                        default=False,
+                        help='Print debug information.')
+    return parser.parse_args()
+
+
+def hash_gram(kind, gram, bits):
+    """
+    Returns the integer id of the gram (a tuple of unicode strings) of the
+        feature kind, taken from the first bytes of the MD5 digest so that it
+        does not change between runs nor processes.
+    """
+    digest = hashlib.md5(u'\x00'.join((kind,) + gram).encode('utf-8')).digest()
+    if bits == 32:
+        return struct.unpack('<I', digest[:4])[0]
+    return struct.unpack('<Q', digest[:8])[0]
+
+
+class GramIds(dict):
+    """
+    Dict mapping the grams of a feature kind to their ids. A missing gram
+        gets its hashed id or, with a vocabulary, is appended to it as
+        (kind, gram) and gets its index.
+    """
+
+    def __init__(self, kind, hashing_bits=None, vocabulary=None):
+        dict.__init__(self)
+        self.kind = kind
+        self.hashing_bits = hashing_bits
+        self.vocabulary = vocabulary
+
+    def __missing__(self, gram):
+        if self.hashing_bits:
+            gram_id = hash_gram(self.kind, gram, self.hashing_bits)
+        else:
+            gram_id = len(self.vocabulary)
+            self.vocabulary.append((self.kind, gram))
+        self[gram] = gram_id
+        return gram_id
+
+
+def encode_histograms(histograms_list, gram_ids, dtype):
+    """
+    Returns the CSR arrays (indptr, indices, data) of the histograms, the ids
+        of the grams given by gram_ids. The counts of the grams sharing an id
+        in a tweet are summed.
+    """
+    indptr = numpy.zeros(len(histograms_list) + 1, dtype=numpy.int64)
+    indices = []
+    data = []
+    for i, histogram in enumerate(histograms_list):
+        row = {}
+        for gram, count in histogram.iteritems():
+            gram_id = gram_ids[gram]
+            row[gram_id] = row.get(gram_id, 0) + count
+        row_ids = sorted(row)
+        indices.extend(row_ids)
+        data.extend(row[gram_id] for gram_id in row_ids)
+        indptr[i + 1] = len(indices)
+    return indptr, numpy.array(indices, dtype=dtype), numpy.array(data, dtype=numpy.int32)
+
+
+def hash_histograms(histograms_list, kind, bits, hashed_grams=None):
+    """
+    Returns the CSR arrays (indptr, indices, data) of the histograms of the
+        feature kind, the grams hashed to ids of the given number of bits.
+    When hashed_grams is given, it is updated with the (kind, gram) of each id.
+    """
+    gram_ids = GramIds(kind, hashing_bits=bits)
+    csr_arrays = encode_histograms(histograms_list, gram_ids, numpy.uint32 if bits == 32 else numpy.uint64)
+    if hashed_grams is not None:
+        for gram, gram_id in gram_ids.iteritems():
+            hashed_grams.setdefault(gram_id, (kind, gram))
+    return csr_arrays
+
+
+def index_histograms(histograms_list, kind, vocabulary):
+    """
+    Returns the CSR arrays (indptr, indices, data) of the histograms of the
+        feature kind, the ids being indexes of the vocabulary, to which the
+        new grams are appended.
+    """
+    return encode_histograms(histograms_list, GramIds(kind, vocabulary=vocabulary), numpy.int32)
+
+
+def csr_filenames(author_dir, kind):
+    return [''.join([author_dir, os.sep, kind, '.', array_name, '.npy']) for array_name in ['indptr', 'indices', 'data']]
+
+
+def save_csr(author_dir, kind, csr_arrays):
+    for filename, array in zip(csr_filenames(author_dir, kind), csr_arrays):
+        numpy.save(filename, array)
+
+
+def load_csr(author_dir, kind, mmap_mode='r'):
+    """
+    Returns the CSR arrays (indptr, indices, data) of the feature kind,
+        memory-mapped by default.
+    """
+    return tuple(numpy.load(filename, mmap_mode=mmap_mode) for filename in csr_filenames(author_dir, kind))
+
+
+def slice_rows(csr_arrays, rows):
+    """
+    Returns the CSR arrays (indptr, indices, data) of the given rows, in their
+        order. Only the entries of those rows are read from the arrays.
+    """
+    indptr, indices, data = csr_arrays
+    rows = numpy.asarray(rows, dtype=numpy.int64)
+    starts = numpy.asarray(indptr[rows])
+    lengths = numpy.asarray(indptr[rows + 1]) - starts
+    rows_indptr = numpy.zeros(len(rows) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=rows_indptr[1:])
+    positions = numpy.repeat(starts - rows_indptr[:-1], lengths) + numpy.arange(rows_indptr[-1])
+    return rows_indptr, numpy.asarray(indices[positions]), numpy.asarray(data[positions])
+
+
+def save_hashed_grams(author_dir, bits, hashed_grams):
+    sklearn.externals.joblib.dump((bits, hashed_grams), os.sep.join([author_dir, hashed_grams_filename]))
+
+
+def load_hashed_grams(author_dir):
+    """
+    Returns the number of bits of the ids and the side table mapping each id
+        to its (kind, gram).
+    """
+    return sklearn.externals.joblib.load(os.sep.join([author_dir, hashed_grams_filename]))
+
+
+def is_hashed(author_dir):
+    return os.path.exists(os.sep.join([author_dir, hashed_grams_filename]))
+
+
+def save_vocabulary(author_dir, vocabulary):
+    sklearn.externals.joblib.dump(vocabulary, os.sep.join([author_dir, vocabulary_filename]))
+
+
+def load_vocabulary(author_dir):
+    """
+    Returns the list of the (kind, gram) indexed by the ids of the author.
+    """
+    return sklearn.externals.joblib.load(os.sep.join([author_dir, vocabulary_filename]))
+
+
+def is_store(author_dir):
+    """
+    True if the histograms of the author are stored as CSR arrays, the
+        vocabulary or the side table being saved after all of them.
+    """
+    return is_hashed(author_dir) or os.path.exists(os.sep.join([author_dir, vocabulary_filename]))
+
+
+def corpus_author_dirs(source_dir_data):
+    # the corpus vocabulary is in a hidden directory, left out by glob
+    return sorted(glob.glob(os.sep.join([source_dir_data, '*'])))
+
+
+def corpus_hashing_bits(source_dir_data):
+    """
+    Returns the number of bits of the ids of the authors' n-grams in
+        source_dir_data, or None when they are not hashed.
+    """
+    for author_dir in corpus_author_dirs(source_dir_data):
+        if is_hashed(author_dir):
+            return load_hashed_grams(author_dir)[0]
+    return None
+
+
+def merge_hashed_grams(author_dirs):
+    """
+    Returns the side table mapping the ids of all the authors to their (kind, gram).
+    """
+    hashed_grams = {}
+    for author_dir in author_dirs:
+        hashed_grams.update(load_hashed_grams(author_dir)[1])
+    return hashed_grams
+
+
+class FeatureStore(object):
+    """
+    The CSR arrays of the histograms of an author, memory-mapped.
+    The pickled histograms of former versions are converted in memory.
+    """
+
+    def __init__(self, author_dir):
+        self.author_dir = author_dir
+        self.hashed = is_hashed(author_dir)
+        self._vocabulary = None
+        self._pickled_csr = None
+        if not is_store(author_dir):
+            self._vocabulary = []
+            self._pickled_csr = {}
+
+    def kinds(self):
+        """
+        Returns the feature kinds of the author.
+        """
+        if self._pickled_csr is None:
+            suffix = '.indptr.npy'
+            filenames = glob.glob(''.join([self.author_dir, os.sep, '*', suffix]))
+            return sorted(os.path.basename(filename)[:-len(suffix)] for filename in filenames)
+        filenames = glob.glob(os.sep.join([self.author_dir, '*.pkl']))
+        return sorted(os.path.basename(filename)[:-len('.pkl')] for filename in filenames if os.path.basename(filename) != hashed_grams_filename)
+
+    def csr(self, kind):
+        if self._pickled_csr is None:
+            return load_csr(self.author_dir, kind)
+        self._load_pickles()
+        return self._pickled_csr[kind]
+
+    def _load_pickles(self):
+        # all the kinds, in the order of kinds(), so that the ids do not depend on the first kind read
+        if not self._pickled_csr:
+            for kind in self.kinds():
+                self._pickled_csr[kind] = index_histograms(load_pickled_histograms(self.author_dir, kind), kind, self._vocabulary)
+
+    def num_tweets(self, kind):
+        return len(self.csr(kind)[0]) - 1
+
+    def rows(self, kind, tweet_idxs):
+        return slice_rows(self.csr(kind), tweet_idxs)
+
+    def vocabulary(self):
+        """
+        Returns the list of the (kind, gram) indexed by the ids of the author.
+        """
+        if self._pickled_csr is not None:
+            self._load_pickles()
+        elif self._vocabulary is None:
+            self._vocabulary = load_vocabulary(self.author_dir)
+        return self._vocabulary
+
+
+def save_array(filename, array):
+    """
+    Saves the array in a new file replacing filename, so that the arrays
+        memory-mapped from the former one, the array itself maybe, stay valid.
+    """
+    with open(filename + '.tmp', mode='wb') as fd:
+        numpy.save(fd, array)
+    os.rename(filename + '.tmp', filename)
+
+
+class CorpusVocabulary(object):
+    """
+    Index of the grams of all the authors of a corpus directory.
+    The corpus ids number the distinct grams of the corpus: the (kind, gram)
+        of the authors' vocabularies in order of appearance or, in the
+        hashing mode, the sorted hashed ids. For each corpus id, id_kinds
+        gives the index of its feature kind in kinds and df its document
+        frequency, the number of tweets it occurs in.
+    The ids of the authors of the corpus are mapped to corpus ids by an array
+        saved in each author's directory; the grams of other authors (the
+        test tweets, for instance) are looked up, the unknown ones being
+        left out.
+    """
+
+    def __init__(self, source_dir_data, kinds, hashing_bits, grams, ids, id_kinds, df):
+        self.source_dir_data = source_dir_data
+        self.kinds = kinds
+        self.hashing_bits = hashing_bits
+        self.grams = grams
+        self.ids = ids
+        self.id_kinds = id_kinds
+        self.df = df
+        self._authors_corpus_ids = {}
+        self._stores_corpus_ids = weakref.WeakKeyDictionary()
+        self._gram_ids = None
+
+    def __len__(self):
+        return len(self.id_kinds)
+
+    def kind(self, corpus_id):
+        return self.kinds[self.id_kinds[corpus_id]]
+
+    def key(self, corpus_id):
+        """
+        Returns the (kind, gram) of the corpus id or, in the hashing mode, its hashed id.
+        """
+        if self.hashing_bits:
+            return self.ids[corpus_id].item()
+        return self.grams[corpus_id]
+
+    def subset(self, corpus_ids, source_dir_data):
+        """
+        Returns the vocabulary of the grams of the given sorted corpus ids only,
+            numbered in that order, to be saved in source_dir_data. Trained
+            models keep the vocabulary of their columns this way.
+        """
+        corpus_ids = numpy.asarray(corpus_ids)
+        return CorpusVocabulary(source_dir_data, self.kinds, self.hashing_bits,
+                                [self.grams[corpus_id] for corpus_id in corpus_ids] if self.grams is not None else None,
+                                numpy.asarray(self.ids[corpus_ids]) if self.ids is not None else None,
+                                numpy.asarray(self.id_kinds[corpus_ids]),
+                                numpy.asarray(self.df[corpus_ids]) if self.df is not None else None)
+
+    def columns(self, store, indices):
+        """
+        Returns the corpus ids of the ids of the store, -1 for the unknown ones.
+        """
+        if self.hashing_bits:
+            if not len(self.ids):
+                return numpy.repeat(-1, len(indices))
+            columns = numpy.searchsorted(self.ids, indices)
+            columns[columns == len(self.ids)] = 0
+            columns[self.ids[columns] != indices] = -1
+            return columns
+        return self._author_corpus_ids(store)[indices]
+
+    def corpus_ids(self, vocabulary):
+        """
+        Returns the corpus ids of the grams of the other vocabulary (a model's,
+            for instance), -1 for the unknown ones.
+        """
+        if self.hashing_bits:
+            return self.columns(None, numpy.asarray(vocabulary.ids))
+        self._load_gram_ids()
+        return numpy.array([self._gram_ids.get(gram, -1) for gram in vocabulary.grams], dtype=numpy.int64)
+
+    def _load_gram_ids(self):
+        if self._gram_ids is None:
+            self._gram_ids = dict((gram, corpus_id) for corpus_id, gram in enumerate(self.grams))
+
+    def _author_corpus_ids(self, store):
+        author_dir = os.path.abspath(store.author_dir)
+        if author_dir in self._authors_corpus_ids:
+            return self._authors_corpus_ids[author_dir]
+        filename = os.sep.join([author_dir, corpus_ids_filename])
+        if os.path.dirname(author_dir) == os.path.abspath(self.source_dir_data) and os.path.exists(filename):
+            self._authors_corpus_ids[author_dir] = numpy.load(filename)
+            return self._authors_corpus_ids[author_dir]
+        # the authors out of the corpus are kept by store, as their directory may be rewritten meanwhile
+        if store not in self._stores_corpus_ids:
+            self._load_gram_ids()
+            self._stores_corpus_ids[store] = numpy.array([self._gram_ids.get(gram, -1) for gram in store.vocabulary()], dtype=numpy.int64)
+        return self._stores_corpus_ids[store]
+
+    def remove_author(self, store):
+        """
+        Takes the tweets of the corpus author out of the document frequencies,
+            before its directory is removed or rewritten. Its grams keep their
+            corpus ids, the ids of the other authors being left untouched.
+        """
+        self.df = numpy.array(self.df)      # loaded memory-mapped
+        for kind in store.kinds():
+            self.df -= numpy.bincount(self.columns(store, store.csr(kind)[1]), minlength=len(self))
+        self._authors_corpus_ids.pop(os.path.abspath(store.author_dir), None)
+
+    def add_author(self, store):
+        """
+        Adds the grams of the new corpus author and its tweets to the document
+            frequencies. The new grams get the next corpus ids or, in the
+            hashing mode, are merged into the sorted hashed ids.
+        """
+        for kind in store.kinds():
+            if kind not in self.kinds:
+                self.kinds = self.kinds + [kind]
+        kind_idxs = dict((kind, i) for i, kind in enumerate(self.kinds))
+        if self.hashing_bits:
+            store_ids = []
+            store_kinds = []
+            for kind in store.kinds():
+                kind_ids = numpy.unique(store.csr(kind)[1])
+                store_ids.append(kind_ids)
+                store_kinds.append(numpy.repeat(numpy.uint8(kind_idxs[kind]), len(kind_ids)))
+            store_ids, first = numpy.unique(numpy.concatenate(store_ids) if store_ids else numpy.zeros(0, dtype=numpy.uint64), return_index=True)
+            ids = numpy.union1d(self.ids, store_ids).astype(store_ids.dtype if len(self.ids) == 0 else self.ids.dtype)
+            id_kinds = numpy.zeros(len(ids), dtype=numpy.uint8)
+            id_kinds[numpy.searchsorted(ids, store_ids)] = numpy.concatenate(store_kinds)[first] if store_kinds else []
+            df = numpy.zeros(len(ids), dtype=numpy.int64)
+            positions = numpy.searchsorted(ids, self.ids)
+            id_kinds[positions] = self.id_kinds     # the corpus kinds of the ids already known
+            df[positions] = self.df
+            self.ids = ids
+            self.id_kinds = id_kinds
+            self.df = df
+        else:
+            self._load_gram_ids()
+            corpus_ids = []
+            new_kinds = []
+            for gram in store.vocabulary():
+                corpus_id = self._gram_ids.get(gram)
+                if corpus_id is None:
+                    corpus_id = self._gram_ids[gram] = len(self.grams)
+                    self.grams.append(gram)
+                    new_kinds.append(kind_idxs[gram[0]])
+                corpus_ids.append(corpus_id)
+            self._authors_corpus_ids[os.path.abspath(store.author_dir)] = numpy.array(corpus_ids, dtype=numpy.int64)
+            self.id_kinds = numpy.append(self.id_kinds, numpy.array(new_kinds, dtype=numpy.uint8))
+            self.df = numpy.append(self.df, numpy.zeros(len(new_kinds), dtype=numpy.int64))
+        for kind in store.kinds():
+            self.df += numpy.bincount(self.columns(store, store.csr(kind)[1]), minlength=len(self))
+
+    def save(self):
+        corpus_dir = os.sep.join([self.source_dir_data, corpus_dirname])
+        if not os.path.exists(corpus_dir):
+            os.makedirs(corpus_dir)
+        remove_corpus_vocabulary_info(self.source_dir_data)     # incomplete until saved again
+        for author_dir, corpus_ids in self._authors_corpus_ids.iteritems():
+            save_array(os.sep.join([author_dir, corpus_ids_filename]), corpus_ids)
+        if self.hashing_bits:
+            save_array(os.sep.join([corpus_dir, 'ids.npy']), self.ids)
+        else:
+            sklearn.externals.joblib.dump(self.grams, os.sep.join([corpus_dir, 'grams.pkl']))
+        save_array(os.sep.join([corpus_dir, 'kinds.npy']), self.id_kinds)
+        save_array(os.sep.join([corpus_dir, 'df.npy']), self.df)
+        sklearn.externals.joblib.dump((self.kinds, self.hashing_bits), os.sep.join([corpus_dir, corpus_info_filename]))      # saved last, marks a complete vocabulary
+
+
+def build_corpus_vocabulary(source_dir_data, save=True):
+    """
+    Returns the vocabulary of the authors of source_dir_data, saved in it
+        unless save is False.
+    """
+    stores = [FeatureStore(author_dir) for author_dir in corpus_author_dirs(source_dir_data)]
+    kinds = sorted(set(kind for store in stores for kind in store.kinds()))
+    hashing_bits = corpus_hashing_bits(source_dir_data)
+    if hashing_bits:
+        ids_list = []
+        kinds_list = []
+        for store in stores:
+            for kind in store.kinds():
+                store_ids = numpy.unique(store.csr(kind)[1])
+                ids_list.append(store_ids)
+                kinds_list.append(numpy.repeat(numpy.uint8(kinds.index(kind)), len(store_ids)))
+        ids, first = numpy.unique(numpy.concatenate(ids_list) if ids_list else numpy.zeros(0, dtype=numpy.uint64), return_index=True)
+        id_kinds = numpy.concatenate(kinds_list)[first] if kinds_list else numpy.zeros(0, dtype=numpy.uint8)
+        vocabulary = CorpusVocabulary(source_dir_data, kinds, hashing_bits, None, ids, id_kinds, None)
+    else:
+        gram_ids = {}
+        grams = []
+        authors_corpus_ids = {}
+        for store in stores:
+            corpus_ids = []
+            for gram in store.vocabulary():
+                corpus_id = gram_ids.get(gram)
+                if corpus_id is None:
+                    corpus_id = gram_ids[gram] = len(grams)
+                    grams.append(gram)
+                corpus_ids.append(corpus_id)
+            authors_corpus_ids[os.path.abspath(store.author_dir)] = numpy.array(corpus_ids, dtype=numpy.int64)
+        kind_idxs = dict((kind, i) for i, kind in enumerate(kinds))
+        id_kinds = numpy.array([kind_idxs[kind] for kind, gram in grams], dtype=numpy.uint8)
+        vocabulary = CorpusVocabulary(source_dir_data, kinds, hashing_bits, grams, None, id_kinds, None)
+        vocabulary._authors_corpus_ids = authors_corpus_ids
+        vocabulary._gram_ids = gram_ids
+
+    vocabulary.df = numpy.zeros(len(vocabulary), dtype=numpy.int64)
+    for store in stores:
+        for kind in store.kinds():
+            vocabulary.df += numpy.bincount(vocabulary.columns(store, store.csr(kind)[1]), minlength=len(vocabulary))
+    if save:
+        vocabulary.save()
+    return vocabulary
+
+
+def is_corpus_vocabulary(source_dir_data):
+    return os.path.exists(os.sep.join([source_dir_data, corpus_dirname, corpus_info_filename]))
+
+
+def remove_corpus_vocabulary_info(source_dir_data):
+    """
+    Marks the saved corpus vocabulary of source_dir_data as incomplete, to be
+        built again, until it is saved again.
+    """
+    filename = os.sep.join([source_dir_data, corpus_dirname, corpus_info_filename])
+    if os.path.exists(filename):
+        os.remove(filename)
+
+
+def load_corpus_vocabulary(source_dir_data):
+    corpus_dir = os.sep.join([source_dir_data, corpus_dirname])
+    kinds, hashing_bits = sklearn.externals.joblib.load(os.sep.join([corpus_dir, corpus_info_filename]))
+    grams = None
+    ids = None
+    if hashing_bits:
+        ids = numpy.load(os.sep.join([corpus_dir, 'ids.npy']), mmap_mode='r')
+    else:
+        grams = sklearn.externals.joblib.load(os.sep.join([corpus_dir, 'grams.pkl']))
+    return CorpusVocabulary(source_dir_data, kinds, hashing_bits, grams, ids,
+                            numpy.load(os.sep.join([corpus_dir, 'kinds.npy']), mmap_mode='r'),
+                            numpy.load(os.sep.join([corpus_dir, 'df.npy']), mmap_mode='r'))
+
+
+def corpus_vocabulary(source_dir_data):
+    """
+    Returns the vocabulary saved in source_dir_data or, when there is none
+        (directories written by former versions), one built in memory.
+    """
+    if is_corpus_vocabulary(source_dir_data):
+        return load_corpus_vocabulary(source_dir_data)
+    return build_corpus_vocabulary(source_dir_data, save=False)
+
+
+def stack(stores, tweet_idxs_list, kinds, vocabulary):
+    """
+    Returns the CSR matrix of the given tweets of each store, one row per
+        tweet in the order of the stores, with the counts of the grams of all
+        the feature kinds in the columns of their corpus ids. The grams not in
+        the corpus vocabulary are left out.
+    """
+    rows_list = []
+    columns_list = []
+    data_list = []
+    num_rows = 0
+    for store, tweet_idxs in zip(stores, tweet_idxs_list):
+        row_ids = numpy.arange(num_rows, num_rows + len(tweet_idxs))
+        for kind in kinds:
+            indptr, indices, data = store.rows(kind, tweet_idxs)
+            columns = vocabulary.columns(store, indices)
+            known = columns >= 0
+            rows_list.append(numpy.repeat(row_ids, numpy.diff(indptr))[known])
+            columns_list.append(columns[known])
+            data_list.append(data[known])
+        num_rows += len(tweet_idxs)
+
+    if not data_list:
+        return scipy.sparse.csr_matrix((num_rows, len(vocabulary)), dtype=numpy.int32)
+    matrix = scipy.sparse.csr_matrix((numpy.concatenate(data_list), (numpy.concatenate(rows_list), numpy.concatenate(columns_list))),
+                                     shape=(num_rows, len(vocabulary)))
+    matrix.sort_indices()
+    return matrix
+
+
+def remove_hapax_legomena(matrix, rows):
+    """
+    Zeroes, in place, the entries of the given rows of the CSR matrix whose
+        columns (grams) occur only once through all those rows. The zeroed
+        entries are left to matrix.eliminate_zeros().
+    The hapax legomena are a mask of the columns, counted over the entries
+        of the rows without slicing them out of the matrix.
+    """
+    rows = numpy.asarray(rows, dtype=numpy.int64)
+    starts = matrix.indptr[rows]
+    lengths = matrix.indptr[rows + 1] - starts
+    positions = numpy.repeat(starts - numpy.cumsum(lengths) + lengths, lengths) + numpy.arange(lengths.sum())
+    columns = matrix.indices[positions]
+    hapax = numpy.bincount(columns, weights=matrix.data[positions], minlength=matrix.shape[1]) == 1
+    matrix.data[positions[hapax[columns]]] = 0
+
+
+def load_pickled_histograms(author_dir, kind):
+    """
+    Returns the list of histograms (one dict per tweet) of the feature kind
+        pickled by former versions of ngrams_generator.py.
+    """
+    histograms_list = sklearn.externals.joblib.load(''.join([author_dir, os.sep, kind, '.pkl']))
+    if kind.startswith('pos-'):
+        # the pos-tag grams were pickled as (1, gram) to not mix up with char/word grams
+        histograms_list = [dict((gram[1], count) for gram, count in histogram.iteritems()) for histogram in histograms_list]
+    return histograms_list
+
+
+def convert_author(author_dir, remove_pickles=False):
+    """
+    Converts the pickled histograms (one list of dicts per feature kind) of
+        the author to CSR arrays of the ids of a new vocabulary.
+    """
+    vocabulary = []
+    pickles = [filename for filename in sorted(glob.glob(os.sep.join([author_dir, '*.pkl'])))
+               if os.path.basename(filename) not in [vocabulary_filename, hashed_grams_filename]]
+    for filename in pickles:
+        kind = os.path.splitext(os.path.basename(filename))[0]
+        logging.debug(''.join(['\tConverting ', kind, ' ...']))
+        save_csr(author_dir, kind, index_histograms(load_pickled_histograms(author_dir, kind), kind, vocabulary))
+    save_vocabulary(author_dir, vocabulary)
+    if remove_pickles:
+        for filename in pickles:
+            os.remove(filename)
+
+
+if  __name__ == '__main__':
+    # parsing arguments
+    args = command_line_parsing()
+
+    # logging configuration
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='[%(asctime)s] - %(levelname)s - %(message)s')
+
+    logging.info(''.join(['Starting converting the pickled histograms ...',
+                           '\n\tsource directory data = ', args.source_dir_data,
+                           '\n\tremove pickles = ', str(args.remove_pickles),
+                           '\n\tdebug = ', str(args.debug),
+                         ]))
+
+    author_dirnames = [author_dir for author_dir in glob.glob(os.sep.join([args.source_dir_data, '*'])) if not is_store(author_dir)]
+    num_dirs = len(author_dirnames)     # processing feedback
+    i = 0                               # processing feedback
+    for _ in authors_pool.map_authors(functools.partial(convert_author, remove_pickles=args.remove_pickles), author_dirnames, args.workers):
+        i += 1
+        sys.stderr.write(''.join(['\t', str(i), '/', str(num_dirs), ' directories converted\r']))   # processing feedback
+
+    logging.info('Building the corpus vocabulary ...')
+    build_corpus_vocabulary(args.source_dir_data)
+    logging.info('Finishing ...')
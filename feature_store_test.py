@@ -0,0 +1,184 @@
+# coding=utf-8
+
+import copy
+import os
+import shutil
+import tempfile
+import unittest
+
+import scipy.sparse
+import sklearn.externals.joblib
+
+import feature_store
+from ngrams_generator import remove_hapax_legomena
+
+
+class feature_store_test(unittest.TestCase):
+    histograms = [
+        {(u'a', u'b'): 2, (u'b', u'c'): 1},
+        {},
+        {(u'ç', u'ã'): 1, (u'a', u'b'): 3},
+    ]
+
+    def setUp(self):
+        self.author_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.author_dir)
+
+    def test_hash_gram(self):
+        for bits in feature_store.hashing_bits_choices:
+            gram_id = feature_store.hash_gram('word-2-gram', (u'a', u'b'), bits)
+            self.assertTrue(0 <= gram_id < 2 ** bits)
+            self.assertEqual(gram_id, feature_store.hash_gram('word-2-gram', (u'a', u'b'), bits))
+            self.assertNotEqual(gram_id, feature_store.hash_gram('pos-2-gram', (u'a', u'b'), bits))
+
+    def test_hashed_histograms(self):
+        for bits in feature_store.hashing_bits_choices:
+            hashed_grams = {}
+            feature_store.save_csr(self.author_dir, 'word-2-gram', feature_store.hash_histograms(self.histograms, 'word-2-gram', bits, hashed_grams))
+            feature_store.save_hashed_grams(self.author_dir, bits, hashed_grams)
+
+            self.assertTrue(feature_store.is_hashed(self.author_dir))
+            self.assertEqual((bits, hashed_grams), feature_store.load_hashed_grams(self.author_dir))
+            self.assertEqual(self.histograms, self.load_histograms(feature_store.FeatureStore(self.author_dir), 'word-2-gram', lambda key: hashed_grams[key][1]))
+
+    def test_vocabulary(self):
+        vocabulary = []
+        feature_store.save_csr(self.author_dir, 'word-2-gram', feature_store.index_histograms(self.histograms, 'word-2-gram', vocabulary))
+        feature_store.save_csr(self.author_dir, 'pos-2-gram', feature_store.index_histograms(self.histograms, 'pos-2-gram', vocabulary))
+        feature_store.save_vocabulary(self.author_dir, vocabulary)
+
+        self.assertTrue(feature_store.is_store(self.author_dir))
+        self.assertFalse(feature_store.is_hashed(self.author_dir))
+        self.assertEqual(6, len(vocabulary))
+        store = feature_store.FeatureStore(self.author_dir)
+        self.assertEqual(3, store.num_tweets('pos-2-gram'))
+        for kind in ['word-2-gram', 'pos-2-gram']:
+            self.assertEqual(self.histograms, self.load_histograms(store, kind, lambda key: key[1]))
+
+        indptr, indices, data = store.rows('word-2-gram', [2, 1, 2])
+        self.assertEqual([0, 2, 2, 4], indptr.tolist())
+        self.assertEqual([3, 1, 3, 1], data.tolist())
+
+    def test_corpus_vocabulary(self):
+        for author, histograms_lists in [('a', [self.histograms, self.histograms[::-1]]), ('b', [[{(u'x', u'y'): 1}, {(u'a', u'b'): 1}], [{}, {}]])]:
+            vocabulary = []
+            os.mkdir(os.path.join(self.author_dir, author))
+            for kind, histograms in zip(['word-2-gram', 'pos-2-gram'], histograms_lists):
+                feature_store.save_csr(os.path.join(self.author_dir, author), kind, feature_store.index_histograms(histograms, kind, vocabulary))
+            feature_store.save_vocabulary(os.path.join(self.author_dir, author), vocabulary)
+        feature_store.build_corpus_vocabulary(self.author_dir)
+
+        corpus_vocabulary = feature_store.corpus_vocabulary(self.author_dir)
+        self.assertEqual(['pos-2-gram', 'word-2-gram'], corpus_vocabulary.kinds)
+        self.assertEqual(7, len(corpus_vocabulary))
+        keys = [corpus_vocabulary.key(corpus_id) for corpus_id in range(len(corpus_vocabulary))]
+        self.assertEqual(['word-2-gram', 'pos-2-gram'], [corpus_vocabulary.kind(keys.index((kind, (u'a', u'b')))) for kind in ['word-2-gram', 'pos-2-gram']])
+        self.assertEqual([3, 2, 1], [corpus_vocabulary.df[keys.index(key)] for key in [('word-2-gram', (u'a', u'b')), ('pos-2-gram', (u'a', u'b')), ('word-2-gram', (u'x', u'y'))]])
+
+        stores = [feature_store.FeatureStore(os.path.join(self.author_dir, author)) for author in ['a', 'b']]
+        matrix = feature_store.stack(stores, [[0, 2], [1]], ['word-2-gram', 'pos-2-gram'], corpus_vocabulary)
+        self.assertEqual((3, 7), matrix.shape)
+        self.assertEqual([{('word-2-gram', (u'a', u'b')): 2, ('word-2-gram', (u'b', u'c')): 1, ('pos-2-gram', (u'ç', u'ã')): 1, ('pos-2-gram', (u'a', u'b')): 3},
+                          {('word-2-gram', (u'ç', u'ã')): 1, ('word-2-gram', (u'a', u'b')): 3, ('pos-2-gram', (u'a', u'b')): 2, ('pos-2-gram', (u'b', u'c')): 1},
+                          {('word-2-gram', (u'a', u'b')): 1}],
+                         [dict((keys[column], count) for column, count in zip(matrix.getrow(row).indices, matrix.getrow(row).data)) for row in range(3)])
+
+        # the grams of an author out of the corpus are looked up
+        foreign_dir = tempfile.mkdtemp()
+        try:
+            vocabulary = []
+            feature_store.save_csr(foreign_dir, 'word-2-gram', feature_store.index_histograms([{(u'q', u'r'): 2, (u'a', u'b'): 1}], 'word-2-gram', vocabulary))
+            feature_store.save_vocabulary(foreign_dir, vocabulary)
+            matrix = feature_store.stack([feature_store.FeatureStore(foreign_dir)], [[0]], ['word-2-gram'], corpus_vocabulary)
+            self.assertEqual({keys.index(('word-2-gram', (u'a', u'b'))): 1}, dict(zip(matrix.indices, matrix.data)))
+
+            # a subset of the vocabulary, saved apart, numbers its grams in order
+            corpus_ids = sorted([keys.index(('word-2-gram', (u'x', u'y'))), keys.index(('word-2-gram', (u'a', u'b')))])
+            model_dir = os.path.join(foreign_dir, 'model')
+            corpus_vocabulary.subset(corpus_ids, model_dir).save()
+            subset = feature_store.load_corpus_vocabulary(model_dir)
+            self.assertEqual([keys[corpus_id] for corpus_id in corpus_ids], [subset.key(column) for column in range(len(subset))])
+            self.assertEqual([corpus_vocabulary.df[corpus_id] for corpus_id in corpus_ids], list(subset.df))
+            self.assertEqual(corpus_ids, corpus_vocabulary.corpus_ids(subset).tolist())
+            matrix = feature_store.stack([feature_store.FeatureStore(foreign_dir)], [[0]], ['word-2-gram'], subset)
+            self.assertEqual({corpus_ids.index(keys.index(('word-2-gram', (u'a', u'b')))): 1}, dict(zip(matrix.indices, matrix.data)))
+        finally:
+            shutil.rmtree(foreign_dir)
+
+    def test_update_corpus_vocabulary(self):
+        for hashing_bits in [None] + feature_store.hashing_bits_choices[:1]:
+            source_dir_data = tempfile.mkdtemp()
+            try:
+                for author, histograms in [('a', self.histograms), ('b', [{(u'x', u'y'): 1}, {(u'a', u'b'): 1}])]:
+                    author_dir = os.path.join(source_dir_data, author)
+                    os.mkdir(author_dir)
+                    if hashing_bits:
+                        hashed_grams = {}
+                        feature_store.save_csr(author_dir, 'word-2-gram', feature_store.hash_histograms(histograms, 'word-2-gram', hashing_bits, hashed_grams))
+                        feature_store.save_hashed_grams(author_dir, hashing_bits, hashed_grams)
+                    else:
+                        vocabulary = []
+                        feature_store.save_csr(author_dir, 'word-2-gram', feature_store.index_histograms(histograms, 'word-2-gram', vocabulary))
+                        feature_store.save_vocabulary(author_dir, vocabulary)
+                    if author == 'a':
+                        feature_store.build_corpus_vocabulary(source_dir_data)
+                full = feature_store.build_corpus_vocabulary(source_dir_data, save=False)
+
+                # the author added to the saved vocabulary counts as in the full one
+                updated = feature_store.load_corpus_vocabulary(source_dir_data)
+                updated.add_author(feature_store.FeatureStore(os.path.join(source_dir_data, 'b')))
+                updated.save()
+                updated = feature_store.load_corpus_vocabulary(source_dir_data)
+                self.assertEqual(dict((full.key(corpus_id), full.df[corpus_id]) for corpus_id in range(len(full))),
+                                 dict((updated.key(corpus_id), updated.df[corpus_id]) for corpus_id in range(len(updated))))
+                self.assertEqual([full.key(corpus_id) for corpus_id in range(len(full))], [updated.key(corpus_id) for corpus_id in updated.corpus_ids(full)])
+                stores = [feature_store.FeatureStore(os.path.join(source_dir_data, author)) for author in ['a', 'b']]
+                self.assertEqual(sorted(feature_store.stack(stores, [[0, 2], [0, 1]], ['word-2-gram'], full).sum(axis=0).tolist()[0]),
+                                 sorted(feature_store.stack(stores, [[0, 2], [0, 1]], ['word-2-gram'], updated).sum(axis=0).tolist()[0]))
+
+                # the removed author leaves its grams with no tweets
+                updated.remove_author(stores[1])
+                self.assertEqual(4, updated.df.sum())
+                self.assertEqual(0, updated.df[[updated.key(corpus_id) for corpus_id in range(len(updated))].index(
+                    feature_store.hash_gram('word-2-gram', (u'x', u'y'), hashing_bits) if hashing_bits else ('word-2-gram', (u'x', u'y')))])
+            finally:
+                shutil.rmtree(source_dir_data)
+
+    def test_convert_author(self):
+        sklearn.externals.joblib.dump(self.histograms, '/'.join([self.author_dir, 'word-2-gram.pkl']))
+        sklearn.externals.joblib.dump([dict(((1, gram), count) for gram, count in histogram.items()) for histogram in self.histograms],
+                                      '/'.join([self.author_dir, 'pos-2-gram.pkl']))
+        self.assertFalse(feature_store.is_store(self.author_dir))
+        for kind in ['word-2-gram', 'pos-2-gram']:
+            self.assertEqual(self.histograms, self.load_histograms(feature_store.FeatureStore(self.author_dir), kind, lambda key: key[1]))
+
+        feature_store.convert_author(self.author_dir, remove_pickles=True)
+        self.assertTrue(feature_store.is_store(self.author_dir))
+        for kind in ['word-2-gram', 'pos-2-gram']:
+            self.assertEqual(self.histograms, self.load_histograms(feature_store.FeatureStore(self.author_dir), kind, lambda key: key[1]))
+
+    def test_remove_hapax_legomena(self):
+        vocabulary = []
+        feature_store.save_csr(self.author_dir, 'word-2-gram', feature_store.index_histograms(self.histograms * 2, 'word-2-gram', vocabulary))
+        feature_store.save_vocabulary(self.author_dir, vocabulary)
+        indptr, indices, data = feature_store.FeatureStore(self.author_dir).csr('word-2-gram')
+        matrix = scipy.sparse.csr_matrix((data, indices, indptr))
+
+        for rows in [[0, 1, 2], [0, 3], [2, 4, 5]]:
+            histograms = copy.deepcopy([self.histograms[row % 3] for row in rows])
+            remove_hapax_legomena(histograms)
+            rows_matrix = matrix.copy()
+            feature_store.remove_hapax_legomena(rows_matrix, rows)
+            rows_matrix.eliminate_zeros()
+            self.assertEqual(histograms, [dict((vocabulary[column][1], count) for column, count in zip(rows_matrix.getrow(row).indices, rows_matrix.getrow(row).data)) for row in rows])
+
+    def load_histograms(self, store, kind, gram):
+        indptr, indices, data = store.csr(kind)
+        keys = indices.tolist() if store.hashed else [store.vocabulary()[gram_id] for gram_id in indices]
+        return [dict((gram(key), count) for key, count in zip(keys[start:end], data[start:end])) for start, end in zip(indptr[:-1], indptr[1:])]
+
+
+if __name__ == '__main__':
+    unittest.main()
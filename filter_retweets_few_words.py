@@ -13,21 +13,59 @@ import logging
 import os
 import sys
 import glob
+import functools
 import messages_persistence
+import authors_pool
 import re
 
 
+retweets_regex_mask = u'(^RT\s)|(?<!\S)RT\s*@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])' # rationale: RT at the beginning of the message or RT followed by a user reference in the middle
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source_dir_data', help='Directory where the tweets\' files are stored.')
+    parser.add_argument('dest_dir', help='Directory where the output files will be written.')
+    parser.add_argument('filter_retweets')
+    parser.add_argument('min_words', type=int)
+    parser.add_argument('debug')
+    parser.add_argument('--workers', '-w',
+                        dest='workers',
+                        type=int,
+                        default=1,
+                        help='Number of processes sharing the authors\' files. Default = 1.')
+    return parser.parse_args()
+
+
+def filter_file(filename, dest_dir, filter_retweets, min_words):
+    retweetsfiltered = 0
+    print(''.join(['Processing ', filename, ' file ...']))
+    with messages_persistence.Writer('full', ''.join([dest_dir, os.sep, os.path.basename(filename)])) as writer:
+        for message in messages_persistence.iter_messages(filename):
+            keep = True
+            if filter_retweets and re.search(retweets_regex_mask, message['tweet']):
+                keep = False
+            if len(message['tweet'].split()) < min_words:
+                keep = False
+            if keep:
+                writer.write(message)
+            else:
+                retweetsfiltered += 1
+                print('Filtering tweet: ' + message['tweet'])
+    return retweetsfiltered
+
 
 if __name__ == '__main__':
     # parsing arguments
+    args = command_line_parsing()
+    source_dir_data = args.source_dir_data
+    dest_dir = args.dest_dir
+    filter_retweets = args.filter_retweets
+    min_words = args.min_words
+    debug = args.debug
 
     # logging configuration
     logging.basicConfig(level=logging.DEBUG if debug else logging.INFO, format='[%(asctime)s] - %(levelname)s - %(message)s')
-    source_dir_data = sys.argv[1]
-    dest_dir = sys.argv[2]
-    filter_retweets = sys.argv[3]
-    min_words = int(sys.argv[4])
-    debug = sys.argv[5]
 
     print "Starting filtering out data ..\n\tsource directory data = {} \n\tdestination directory = {} \n\tfilter retweets = {} \n\tminimal number of words = {} \n\tdebug = {} ".format(str(source_dir_data), str(dest_dir), str(filter_retweets), str(min_words), str(debug))
 
@@ -43,24 +81,11 @@ if __name__ == '__main__':
     filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
     num_files = len(filenames)              # processing feedback
     i = 0                                   # processing feedback
-    retweets_regex_mask = u'(^RT\s)|(?<!\S)RT\s*@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])' # rationale: RT at the beginning of the message or RT followed by a user reference in the middle
-    for filename in filenames:
-        print(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))
+    retweetsfiltered = 0
+    for file_retweetsfiltered in authors_pool.map_authors(functools.partial(filter_file, dest_dir=dest_dir, filter_retweets=filter_retweets, min_words=min_words), filenames, args.workers):
         i += 1
-        print(''.join(['Processing ', filename, ' file ...']))
-        messages = messages_persistence.read(filename)
-        messages_filtered = []
-        for message in messages:
-            keep = True
-            if filter_retweets and re.search(retweets_regex_mask, message['tweet']):
-                keep = False
-            if len(message['tweet'].split()) < min_words:
-                keep = False
-            if keep:
-                messages_filtered.append(message)
-            else:
-                print('Filtering tweet: ' + message['tweet'])
-
-        messages_persistence.write(messages_filtered, 'full', ''.join([dest_dir, os.sep, os.path.basename(filename)]))
+        print(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))
+        retweetsfiltered += file_retweetsfiltered
 
+    logging.info(''.join(['Tweets filtered: ', str(retweetsfiltered)]))
     logging.info('Finishing ...RETWEETS PREPROCESSING')
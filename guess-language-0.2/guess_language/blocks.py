@@ -17,9 +17,14 @@
     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
 '''
 
-import os, re
+import array, os, re
 from bisect import bisect_left
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 def _loadBlocks():
     ''' Load Blocks.txt.
         Create and return two parallel lists. One has the start and end points for
@@ -53,11 +58,64 @@ def _loadBlocks():
     
 _endpoints, _names = _loadBlocks()
 
-    
+
+def _makeBlockTable():
+    ''' Create and return the list of the distinct block names and a table
+        mapping every codepoint up to the last endpoint to the index of its
+        block name, as found by unicodeBlock().
+    '''
+    blockNames = []
+    blockIds = {}
+    table = array.array('B', [0]) * (_endpoints[-1] + 1)
+    # bisect_left gives the codepoints between two endpoints to the upper one
+    start = 0
+    for end, name in zip(_endpoints, _names):
+        if name not in blockIds:
+            blockIds[name] = len(blockNames)
+            blockNames.append(name)
+        table[start:end + 1] = array.array('B', [blockIds[name]]) * (end + 1 - start)
+        start = end + 1
+    return blockNames, table
+
+_blockNames, _blockTable = _makeBlockTable()
+if numpy is not None:
+    _blockArray = numpy.frombuffer(_blockTable, dtype=numpy.uint8)
+
+
 def unicodeBlock(c):
     ''' Returns the name of the unicode block containing c
         c must be a single character. '''
     
-    ix = bisect_left(_endpoints, ord(c))
+    cp = ord(c)
+    if cp < len(_blockTable):
+        return _blockNames[_blockTable[cp]]
+    ix = bisect_left(_endpoints, cp)
     return _names[ix]
-    
\ No newline at end of file
+
+
+def count_blocks(text):
+    ''' Returns a dict mapping the name of each unicode block found in text
+        to its number of characters. '''
+    
+    counts = {}
+    if numpy is not None:
+        codepoints = numpy.frombuffer(text.encode('utf-32-le'), dtype='<u4')
+        inTable = codepoints < len(_blockTable)
+        for blockId, count in enumerate(numpy.bincount(_blockArray[codepoints[inTable]])):
+            if count:
+                counts[_blockNames[blockId]] = int(count)
+        astral = codepoints[~inTable].tolist()
+    else:
+        astral = []
+        for c in text:
+            cp = ord(c)
+            if cp < len(_blockTable):
+                name = _blockNames[_blockTable[cp]]
+                counts[name] = counts.get(name, 0) + 1
+            else:
+                astral.append(cp)
+
+    for cp in astral:
+        name = _names[bisect_left(_endpoints, cp)]
+        counts[name] = counts.get(name, 0) + 1
+    return counts
@@ -17,7 +17,8 @@
 
 import unittest
 
-from blocks import unicodeBlock
+from blocks import unicodeBlock, count_blocks
+import blocks
 
 class blocks_test(unittest.TestCase):
     def test_unicodeBlock(self):
@@ -35,6 +36,25 @@ class blocks_test(unittest.TestCase):
         self.assertBlock('Tibetan', 0xFFF)
         self.assertBlock('Cyrillic', 0x421)
         
+    def test_count_blocks(self):
+        self.assertEquals({}, count_blocks(u''))
+        self.assertEquals({'Basic Latin': 4, 'Extended Latin': 2}, count_blocks(u'ab d\xe9\u0250'))
+        self.assertEquals({'Cyrillic': 2, 'Thai': 1}, count_blocks(u'\u0421\u0421\u0E00'))
+        self.assertRaises(IndexError, count_blocks, u'a\U0001D400')
+        
+        text = u''.join(unichr(c) for c in range(0x10000))
+        counts = {}
+        for c in text:
+            counts[unicodeBlock(c)] = counts.get(unicodeBlock(c), 0) + 1
+        self.assertEquals(counts, count_blocks(text))
+        
+        numpy = blocks.numpy
+        blocks.numpy = None
+        try:
+            self.assertEquals(counts, count_blocks(text))
+        finally:
+            blocks.numpy = numpy
+        
     def assertBlock(self, name, c):
         c = unichr(c)
         block = unicodeBlock(c)
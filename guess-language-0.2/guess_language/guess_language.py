@@ -30,11 +30,17 @@
     
 '''
 
-__all__ = 'guessLanguage guessLanguageName guessLanguageInfo guessLanguageTag guessLanguageId'.split()
+__all__ = 'guessLanguage guessLanguageName guessLanguageInfo guessLanguageTag guessLanguageId guessLanguageBatch guessLanguageNameBatch enableCache disableCache cacheInfo'.split()
 
-import codecs, os, re, sys, unicodedata
-from collections import defaultdict
-from blocks import unicodeBlock
+import codecs, hashlib, os, re, sys, traceback, unicodedata
+from collections import defaultdict, namedtuple, OrderedDict
+from blocks import count_blocks
+import trigram_store
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 
 MIN_LENGTH = 20
@@ -74,6 +80,8 @@ PT = "pt_BR pt_PT".split()
 UNKNOWN = 'UNKNOWN'
 
 models = {}
+# the compiled models backing models, None when they were parsed from the text files
+trigramStore = None
 
 NAME_MAP = {
     "ab" : "Abkhazian",
@@ -266,23 +274,34 @@ IANA_MAP = {
 }
 
 
-def _load_models():
-    modelsDir = os.path.join(os.path.dirname(__file__), 'trigrams')
-    modelsList = os.listdir(modelsDir)
-    
-    lineRe = re.compile(r"(.{3})\s+(.*)")
-    for modelFile in modelsList:
-        modelPath = os.path.join(modelsDir, modelFile)
-        if os.path.isdir(modelPath):
-            continue
-        f = codecs.open(modelPath, 'r', 'utf-8')
-        model = {}  # QHash<QString,int> model
-        for line in f:
-            m = lineRe.search(line)
-            if m:
-                model[m.group(1)] = int(m.group(2))
-                
-        models[modelFile.lower()] = model
+def _open_store(path):
+    ''' Returns the compiled trigram store at path, (re)building it when it is
+        missing, older than the text models, or can not be read.
+    '''
+    if trigram_store.isFresh(path):
+        try:
+            return trigram_store.TrigramStore(path)
+        except (IOError, ValueError):   # not a store, or a corrupted one
+            pass
+    trigram_store.build(path=path)
+    return trigram_store.TrigramStore(path)
+
+
+def _load_models(path=trigram_store.STORE_PATH):
+    ''' Fill models from the compiled trigram store (see _open_store). If the
+        store can not be written or read the text models are parsed into
+        dicts as before.
+    '''
+    global trigramStore
+    try:
+        trigramStore = _open_store(path)
+    except (IOError, OSError, ValueError):
+        trigramStore = None
+        models.update(trigram_store.parseModels())
+        return
+
+    for language in trigramStore.languages:
+        models[language] = trigramStore.model(language)
 
 
 _load_models()
@@ -297,7 +316,15 @@ def guessLanguage(text):
     
     text = normalize(text)
     
-    return _identify(text, find_runs(text))
+    if _cache is None:
+        return _identify(text, find_runs(text))
+
+    tag = _cache.get(text)
+    if tag is None:
+        tag = _identify(text, find_runs(text))
+        _cache.put(text, tag)
+        _cache.flush()
+    return tag
 
 
 def guessLanguageInfo(text):
@@ -334,6 +361,195 @@ def guessLanguageName(text):
     return _getName(lang) 
 
 
+def guessLanguageBatch(texts):
+    """
+        Returns the language code of each of texts, as a list of (tag, error)
+        pairs. error is None, or the formatted traceback of the exception
+        raised for the text, in which case tag is UNKNOWN.
+        The texts are scored together, one pass per set of candidate languages.
+    """
+    results = [None] * len(texts)
+    pending = defaultdict(list)     # langs -> [(index, sample)]
+    firstIndexes = {}               # sample -> index of its first text, repeated samples being scored once
+    repeated = []                   # (index, first index)
+    for index, text in enumerate(texts):
+        try:
+            if not text:
+                results[index] = (UNKNOWN, None)
+                continue
+
+            if isinstance(text, str):
+                text = unicode(text, 'utf-8')
+
+            sample = normalize(text)
+            if sample in firstIndexes:
+                repeated.append((index, firstIndexes[sample]))
+                continue
+            firstIndexes[sample] = index
+            if _cache is not None:
+                tag = _cache.get(sample)
+                if tag is not None:
+                    results[index] = (tag, None)
+                    continue
+            route = _route(sample, find_runs(sample))
+        except Exception:
+            results[index] = (UNKNOWN, traceback.format_exc())
+            continue
+
+        if isinstance(route, tuple):
+            pending[route].append((index, sample))
+        else:
+            results[index] = (route, None)
+            if _cache is not None:
+                _cache.put(sample, route)
+
+    for langs, items in pending.items():
+        for (index, sample), (tag, error) in zip(items, _checkMany([sample for index, sample in items], langs)):
+            results[index] = (tag, error)
+            if _cache is not None and not error:
+                _cache.put(sample, tag)
+
+    for index, firstIndex in repeated:
+        results[index] = results[firstIndex]
+
+    if _cache is not None:
+        _cache.flush()
+    return results
+
+
+def guessLanguageNameBatch(texts):
+    """
+        Returns the language name of each of texts, as a list of (name, error)
+        pairs, see guessLanguageBatch. name is None when error is not.
+    """
+    return [(None, error) if error else (_getName(tag), None) for tag, error in guessLanguageBatch(texts)]
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses maxsize currsize')
+
+# the cache of the results, None unless enableCache() was called
+_cache = None
+
+def enableCache(maxsize=100000, path=None):
+    """
+        Cache the language codes of up to maxsize texts, the least recently
+        used ones being dropped first. The cache is keyed by the normalized
+        text, so texts differing only in non-alphabetic characters share
+        their entry.
+        When path is given the results are also appended to that file, and
+        the ones already there (from the same models) are loaded first.
+    """
+    global _cache
+    disableCache()
+    _cache = _ResultCache(maxsize, path)
+
+
+def disableCache():
+    global _cache
+    if _cache is not None:
+        _cache.close()
+        _cache = None
+
+
+def cacheInfo():
+    """
+        Returns the CacheInfo(hits, misses, maxsize, currsize) of the cache,
+        or None when it is disabled.
+    """
+    if _cache is None:
+        return None
+    return CacheInfo(_cache.hits, _cache.misses, _cache.maxsize, len(_cache.entries))
+
+
+class _ResultCache(object):
+    ''' LRU cache sample -> language code, optionally backed by an append-only file.
+        Each line of the file is a language code and a sample separated by a
+        tab (normalized samples have no tabs nor newlines); the first line
+        identifies the models the results were computed with.
+    '''
+
+    def __init__(self, maxsize, path=None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        self.pending = []
+        self.file = None
+        if path is not None:
+            self._load(path)
+
+    def get(self, sample):
+        tag = self.entries.pop(sample, None)
+        if tag is None:
+            self.misses += 1
+            return None
+        self.entries[sample] = tag
+        self.hits += 1
+        return tag
+
+    def put(self, sample, tag):
+        self._insert(sample, tag)
+        if self.file is not None:
+            self.pending.append(u''.join([tag, u'\t', sample, u'\n']))
+
+    def flush(self):
+        if self.pending:
+            # a single write per flush keeps the lines whole when processes share the file
+            self.file.write(u''.join(self.pending).encode('utf-8'))
+            self.pending = []
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def _insert(self, sample, tag):
+        self.entries.pop(sample, None)
+        self.entries[sample] = tag
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def _load(self, path):
+        header = u'guess_language results %s\n' % _modelsSignature()
+        lines = 0
+        try:
+            f = codecs.open(path, 'r', 'utf-8')
+            try:
+                if f.readline() == header:
+                    for line in f:
+                        if line.endswith(u'\n') and u'\t' in line:   # a partial last line is dropped
+                            tag, sample = line[:-1].split(u'\t', 1)
+                            self._insert(sample, tag)
+                            lines += 1
+                else:
+                    lines = None
+            finally:
+                f.close()
+        except IOError:
+            lines = None
+
+        # a file of other models, or mostly duplicates and evicted entries, is rewritten
+        if lines is None or lines > 2 * max(len(self.entries), 1):
+            _writeCache(path, u''.join([header] + [u''.join([tag, u'\t', sample, u'\n']) for sample, tag in self.entries.items()]).encode('utf-8'))
+        self.file = open(path, 'ab', 0)
+
+
+def _modelsSignature():
+    ''' Digest of the text models, identifying the results computed with them '''
+    digest = hashlib.md5()
+    for modelFile in sorted(os.listdir(trigram_store.MODELS_DIR)):
+        modelPath = os.path.join(trigram_store.MODELS_DIR, modelFile)
+        if os.path.isfile(modelPath):
+            f = open(modelPath, 'rb')
+            try:
+                digest.update(modelFile)
+                digest.update(f.read())
+            finally:
+                f.close()
+    return digest.hexdigest()
+
+
 def _getId(iana):
     return IANA_MAP.get(iana, UNKNOWN)
 
@@ -343,15 +559,9 @@ def _getName(iana):
 
 def find_runs(text):
     ''' Count the number of characters in each character block '''
-    run_types = defaultdict(int)
-
-    totalCount = 0
+    run_types = count_blocks(_getNonAlphaRe().sub(u'', text))
 
-    for c in text:
-        if c.isalpha():
-            block = unicodeBlock(c)
-            run_types[block] += 1
-            totalCount += 1
+    totalCount = sum(run_types.values())
 
     # import pprint
     # pprint.pprint(run_types)
@@ -373,6 +583,24 @@ def find_runs(text):
 
 
 def _identify(sample, scripts):
+    route = _route(sample, scripts)
+    if not isinstance(route, tuple):
+        return route
+
+    return _checkRoute(sample, route)
+
+
+def _checkRoute(sample, langs):
+    lang = check(sample, langs)
+    if langs == tuple(EXTENDED_LATIN) and lang == "pt":
+        return check(sample, PT)
+    return lang
+
+
+def _route(sample, scripts):
+    ''' Returns the language of sample when its scripts are enough to tell it,
+        else the tuple of the languages to check it against
+    '''
     if len(sample) < 3:
         return UNKNOWN
 
@@ -395,13 +623,13 @@ def _identify(sample, scripts):
         return "zh"
 
     if "Cyrillic" in scripts:
-        return check( sample, CYRILLIC )
+        return tuple(CYRILLIC)
 
     if "Arabic" in scripts or "Arabic Presentation Forms-A" in scripts or "Arabic Presentation Forms-B" in scripts:
-        return check( sample, ARABIC )
+        return tuple(ARABIC)
 
     if "Devanagari" in scripts:
-        return check( sample, DEVANAGARI )
+        return tuple(DEVANAGARI)
 
 
     # Try languages with unique scripts
@@ -413,14 +641,10 @@ def _identify(sample, scripts):
         return "vi"
 
     if "Extended Latin" in scripts:
-        latinLang = check( sample, EXTENDED_LATIN )
-        if latinLang == "pt":
-            return check(sample, PT)
-        else:
-            return latinLang
+        return tuple(EXTENDED_LATIN)
             
     if "Basic Latin" in scripts:
-        return check( sample, ALL_LATIN )
+        return tuple(ALL_LATIN)
 
     return UNKNOWN
 
@@ -429,23 +653,120 @@ def check(sample, langs):
     if len(sample) < MIN_LENGTH:
         return UNKNOWN
 
-    scores = []
     model = createOrderedModel(sample)  # QMap<int,QString>
+    keys = [key for key in langs if key.lower() in models]
 
-    for key in langs:
-        lkey = key.lower()
-
-        if lkey in models:
-            scores.append( (distance(model, models[lkey]), key) )
-
-    if not scores:
+    if not keys:
         return UNKNOWN
 
+    if trigramStore is not None and numpy is not None:
+        distances = _distances(model, [key.lower() for key in keys])
+    else:
+        distances = [distance(model, models[key.lower()]) for key in keys]
+    scores = zip(distances, keys)
+
     # we want the lowest score, less distance = greater chance of match
 #    pprint(sorted(scores))
     return min(scores)[1]
 
 
+def _checkMany(samples, langs):
+    ''' The results of _identify() for samples routed to langs, as (tag, error)
+        pairs. Samples are scored together when possible, else one by one.
+    '''
+    if trigramStore is not None and numpy is not None:
+        try:
+            tags = _checkBatch(samples, langs)
+        except Exception:
+            pass
+        else:
+            if langs == tuple(EXTENDED_LATIN):
+                ptIndexes = [i for i, tag in enumerate(tags) if tag == "pt"]
+                for i, tag in zip(ptIndexes, _checkBatch([samples[i] for i in ptIndexes], PT)):
+                    tags[i] = tag
+            return [(tag, None) for tag in tags]
+
+    results = []
+    for sample in samples:
+        try:
+            results.append((_checkRoute(sample, langs), None))
+        except Exception:
+            results.append((UNKNOWN, traceback.format_exc()))
+    return results
+
+
+# number of samples scored by one numpy operation of _checkBatch, bounding its memory
+BATCH_SIZE = 1024
+
+def _checkBatch(samples, langs):
+    ''' check() of each of samples against langs, scoring the samples together
+        over the ranks table of trigramStore
+    '''
+    # sorting the keys makes the first minimum of each column the one min(scores) picks
+    keys = sorted(key for key in langs if key.lower() in models)
+    tags = [UNKNOWN] * len(samples)
+    if not keys:
+        return tags
+
+    indexes = [i for i, sample in enumerate(samples) if len(sample) >= MIN_LENGTH]
+    rows = numpy.array([trigramStore.languageRows[key.lower()] for key in keys], dtype=numpy.intp)
+    table = trigramStore.ranks.reshape(len(trigramStore.languages), trigramStore.numTrigrams)[rows]
+    for start in xrange(0, len(indexes), BATCH_SIZE):
+        chunk = indexes[start:start + BATCH_SIZE]
+        # the trigrams of all the samples of the chunk are laid end to end, bounds delimiting each sample
+        positions = []
+        ids = []
+        bounds = [0]
+        unknown = []
+        for i in chunk:
+            unknown.append(_encodeModel(createOrderedModel(samples[i]), positions, ids))
+            bounds.append(len(ids))
+
+        ranks = table[:, numpy.array(ids, dtype=numpy.intp)]
+        dist = numpy.where(ranks == trigram_store.MISSING, MAXGRAMS,
+                           numpy.abs(numpy.array(positions, dtype=numpy.int32) - ranks))
+        cumulative = numpy.zeros((len(keys), len(ids) + 1), dtype=numpy.int64)
+        numpy.cumsum(dist, axis=1, out=cumulative[:, 1:])
+        bounds = numpy.array(bounds, dtype=numpy.intp)
+        scores = cumulative[:, bounds[1:]] - cumulative[:, bounds[:-1]] + numpy.array(unknown) * MAXGRAMS
+        for i, best in zip(chunk, scores.argmin(axis=0)):
+            tags[i] = keys[best]
+    return tags
+
+
+def _encodeModel(model, positions, ids):
+    ''' Append to positions and ids the positions in model and the store ids
+        of the trigrams distance() looks up. Returns the number of the ones
+        missing from the store.
+    '''
+    unknown = 0
+    for i, value in enumerate(model[:MAXGRAMS]):
+        if not spRe.search(value):
+            trigramId = trigramStore.trigramIds.get(value)
+            if trigramId is None:
+                unknown += 1
+            else:
+                positions.append(i)
+                ids.append(trigramId)
+    return unknown
+
+
+def _distances(model, lkeys):
+    ''' The distance() of model to each of the lkeys languages, computed at
+        once over the ranks table of trigramStore
+    '''
+    positions = []
+    ids = []
+    unknown = _encodeModel(model, positions, ids)
+
+    table = trigramStore.ranks.reshape(len(trigramStore.languages), trigramStore.numTrigrams)
+    rows = numpy.array([trigramStore.languageRows[lkey] for lkey in lkeys], dtype=numpy.intp)
+    ranks = table[rows[:, numpy.newaxis], numpy.array(ids, dtype=numpy.intp)]
+    dist = numpy.where(ranks == trigram_store.MISSING, MAXGRAMS,
+                       numpy.abs(numpy.array(positions, dtype=numpy.int32) - ranks))
+    return (dist.sum(axis=1) + unknown * MAXGRAMS).tolist()
+
+
 def createOrderedModel(content):
     ''' Create a list of trigrams in content sorted by frequency '''
     trigrams = defaultdict(int) # QHash<QString,int> 
@@ -465,25 +786,95 @@ def distance(model, knownModel):
 
     for i, value in enumerate(model[:MAXGRAMS]):
         if not spRe.search(value):
-            if value in knownModel:
-                dist += abs(i - knownModel[value])
+            rank = knownModel.get(value)
+            if rank is not None:
+                dist += abs(i - rank)
             else:
                 dist += MAXGRAMS
 
     return dist
 
 
+def _alphaRanges():
+    ''' Returns the (first, last) codepoint ranges of the alphabetic characters '''
+    ranges = []
+    first = None
+    for i in xrange(sys.maxunicode):
+        if unichr(i).isalpha():
+            if first is None:
+                first = i
+        elif first is not None:
+            ranges.append((first, i - 1))
+            first = None
+    if first is not None:
+        ranges.append((first, sys.maxunicode - 1))
+    return ranges
+
+
+def _cachePath(name):
+    ''' Path of a cache file kept beside this module '''
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+
+
+def _writeCache(path, data):
+    ''' Atomically write data (a byte string) to a cache file.
+        The cache is an optimization only, so failures are ignored.
+    '''
+    tmpPath = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        f = open(tmpPath, 'wb')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        os.rename(tmpPath, path)
+    except (IOError, OSError):
+        try:
+            os.remove(tmpPath)
+        except OSError:
+            pass
+
+
 def _makeNonAlphaRe():
-    nonAlpha = [u'[^']
-    for i in range(sys.maxunicode):
-      c = unichr(i)
-      if c.isalpha(): nonAlpha.append(c)
-    nonAlpha.append(u']')
-    nonAlpha = u"".join(nonAlpha)
+    ''' Build the regex matching the non-alphabetic characters.
+        Finding the alphabetic characters means testing every codepoint, so the
+        character class is written as ranges and cached on disk, keyed by the
+        unicode database version and the interpreter's unicode width.
+    '''
+    cachePath = _cachePath('nonalpha-%s-%d.cache' % (unicodedata.unidata_version, sys.maxunicode))
+    nonAlpha = None
+    try:
+        f = open(cachePath, 'rb')
+        try:
+            nonAlpha = f.read().decode('utf-8')
+        finally:
+            f.close()
+    except (IOError, UnicodeDecodeError):
+        pass
+    if not nonAlpha or not nonAlpha.startswith(u'[^') or not nonAlpha.endswith(u']'):
+        nonAlpha = [u'[^']
+        for first, last in _alphaRanges():
+            nonAlpha.append(unichr(first))
+            if last > first + 1:
+                nonAlpha.append(u'-')
+            if last > first:
+                nonAlpha.append(unichr(last))
+        nonAlpha.append(u']')
+        nonAlpha = u"".join(nonAlpha)
+        _writeCache(cachePath, nonAlpha.encode('utf-8'))
     return re.compile(nonAlpha)
 
 
-nonAlphaRe = _makeNonAlphaRe()
+# nonAlphaRe is built on first use by _getNonAlphaRe(), keeping the import fast
+nonAlphaRe = None
+
+def _getNonAlphaRe():
+    global nonAlphaRe
+    if nonAlphaRe is None:
+        nonAlphaRe = _makeNonAlphaRe()
+    return nonAlphaRe
+
+
 spaceRe = re.compile('\s+', re.UNICODE)
     
 def normalize(u):
@@ -491,6 +882,6 @@ def normalize(u):
         Remove non-alpha chars and compress runs of spaces.
     '''
     u = unicodedata.normalize('NFC', u)
-    u = nonAlphaRe.sub(' ', u)
+    u = _getNonAlphaRe().sub(' ', u)
     u = spaceRe.sub(' ', u)
     return u
\ No newline at end of file
@@ -17,11 +17,13 @@
     Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
 '''
 
-import unittest
+import os, shutil, tempfile, unittest
 
 from guess_language import (createOrderedModel, find_runs, 
     guessLanguage, guessLanguageName, guessLanguageTag, guessLanguageId, guessLanguageInfo,
+    guessLanguageBatch, guessLanguageNameBatch,
     normalize, UNKNOWN)
+import guess_language
 
 class guess_language_test(unittest.TestCase):
     def test_normalize(self):
@@ -30,6 +32,12 @@ class guess_language_test(unittest.TestCase):
         s = u"På denne side bringer vi billeder fra de mange forskellige forberedelser til arrangementet efterhånden som vi får dem "
         self.assertEquals(s, normalize(s))
         
+    def test_nonAlphaRe(self):
+        nonAlphaRe = guess_language._makeNonAlphaRe()
+        for i in range(0, 0x3000) + range(0xFF00, 0x10000):
+            c = unichr(i)
+            self.assertEquals(not c.isalpha(), nonAlphaRe.match(c) is not None, '%r' % c)
+
     def test_find_runs(self):
         self.assertEquals(['Basic Latin'], find_runs(u'This is a test of the language checker'))
         self.assertEquals(set(['Basic Latin', 'Extended Latin']), set(find_runs(u'abcdééé')))
@@ -92,6 +100,103 @@ class guess_language_test(unittest.TestCase):
         self.assertEquals(('fr', 26150, 'French'), guessLanguageInfo(text))
         
         
+    @unittest.skipIf(guess_language.trigramStore is None or guess_language.numpy is None, 'needs the trigram store and numpy')
+    def test_check(self):
+        # the scores computed over the trigram store must match distance() on every language
+        samples = [u'This is a test of the language checker',
+            u'Verifions que le détecteur de langues marche',
+            u'Sprawdźmy, czy odgadywacz języków pracuje',
+            u'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
+            u'qzx qzx qzx qzx qzx qzx qzx qzx qzx',
+            u'авай проверить  узнает ли наш угадатель русски язык']
+        langs = sorted(guess_language.models)
+        for sample in samples:
+            model = createOrderedModel(sample)
+            expected = [guess_language.distance(model, guess_language.models[lang]) for lang in langs]
+            self.assertEquals(expected, guess_language._distances(model, langs))
+        self.assertEquals(UNKNOWN, guess_language.check(u'This is a test of the language checker', ['xx']))
+
+    def test_guessBatch(self):
+        texts = ["This is a test of the language checker",
+            "Verifions que le détecteur de langues marche",
+            "Сайлау нәтижесінде дауыстардың басым бөлігін ел премьер министрі Виктор Янукович пен оның қарсыласы, оппозиция жетекшісі Виктор Ющенко алды.",
+            "în acest sens aparţinînd Adunării Generale a organizaţiei, în ciuda faptului că mai multe dintre solicitările organizaţiei privind organizarea scrutinului nu au fost soluţionate",
+            "Hai vấn đề khó chịu với màn hình thường gặp nhất khi bạn dùng laptop là vết trầy xước và điểm chết. Sau đây là vài cách xử lý chú",
+            u"Portugal e o Brasil falam a mesma língua, mas não da mesma maneira",
+            u"O nosso país tem uma população de milhões de habitantes",
+            "ii",
+            "",
+            "caf\xe9 is not utf-8"]
+        results = guessLanguageBatch(texts)
+        self.assertEquals([guessLanguage(text) for text in texts[:-1]], [tag for tag, error in results[:-1]])
+        self.assertEquals([None] * (len(texts) - 1), [error for tag, error in results[:-1]])
+        self.assertEquals(UNKNOWN, results[-1][0])
+        self.assertTrue('UnicodeDecodeError' in results[-1][1])
+        
+        results = guessLanguageNameBatch(texts)
+        self.assertEquals(('French', None), results[1])
+        self.assertEquals(None, results[-1][0])
+        self.assertEquals([], guessLanguageBatch([]))
+        
+        # Portuguese samples checked against the extended latin languages are refined to pt_BR or pt_PT
+        samples = [normalize(text) for text in texts[5:7]]
+        langs = tuple(guess_language.EXTENDED_LATIN)
+        expected = [(guess_language._checkRoute(sample, langs), None) for sample in samples]
+        self.assertEquals(expected, guess_language._checkMany(samples, langs))
+        self.assertEquals(set(['pt_BR', 'pt_PT']) & set(tag for tag, error in expected), set(tag for tag, error in expected))
+
+    def test_cache(self):
+        texts = ["This is a test of the language checker",
+            "This is a test of the language, checker",
+            "Verifions que le détecteur de langues marche",
+            "Сайлау нәтижесінде дауыстардың басым бөлігін ел премьер министрі Виктор Янукович пен оның қарсыласы"]
+        expected = [guessLanguage(text) for text in texts]
+        
+        tmpDir = tempfile.mkdtemp()
+        path = os.path.join(tmpDir, 'results')
+        try:
+            guess_language.enableCache(2, path)
+            self.assertEquals(expected[:2], [guessLanguage(text) for text in texts[:2]])
+            self.assertEquals((1, 1, 2, 1), tuple(guess_language.cacheInfo()))
+            self.assertEquals(expected, [tag for tag, error in guessLanguageBatch(texts)])
+            self.assertEquals((2, 3, 2, 2), tuple(guess_language.cacheInfo()))
+            
+            # the file keeps the entries dropped from memory
+            guess_language.enableCache(10, path)
+            self.assertEquals(3, guess_language.cacheInfo().currsize)
+            self.assertEquals(expected, [guessLanguage(text) for text in texts])
+            self.assertEquals((4, 0, 10, 3), tuple(guess_language.cacheInfo()))
+            
+            guess_language.disableCache()
+            self.assertEquals(None, guess_language.cacheInfo())
+            self.assertEquals(expected, [guessLanguage(text) for text in texts])
+        finally:
+            guess_language.disableCache()
+            shutil.rmtree(tmpDir)
+
+    def test_loadModels(self):
+        tmpDir = tempfile.mkdtemp()
+        store = guess_language.trigramStore
+        try:
+            # a fresh store that can not be read is built again
+            path = os.path.join(tmpDir, 'trigrams.bin')
+            f = open(path, 'wb')
+            f.write(b'not a store' * 10)
+            f.close()
+            guess_language._load_models(path)
+            self.assertTrue(guess_language.trigramStore is not None)
+            self.assertEquals('en', guessLanguage(u'This is a test of the language checker'))
+            
+            # or the text models are parsed when it can not be written either
+            path = os.path.join(tmpDir, 'missing', 'trigrams.bin')
+            guess_language._load_models(path)
+            self.assertEquals(None, guess_language.trigramStore)
+            self.assertEquals('en', guessLanguage(u'This is a test of the language checker'))
+        finally:
+            guess_language._load_models()
+            self.assertTrue(guess_language.trigramStore is not None)
+            shutil.rmtree(tmpDir)
+
     def setUp(self):
         pass
 
@@ -0,0 +1,212 @@
+''' Compact store of the trigram models.
+
+    The text models under trigrams/ are compiled into a single binary file:
+    every distinct trigram of all the models is interned to an integer id and
+    the ranks are kept in a dense table with one row per language and one
+    column per trigram id (MISSING where the trigram is not in the model).
+    The table is memory-mapped, and used without copying when numpy is
+    available.
+
+    Layout of the file (little-endian):
+        MAGIC
+        number of languages, number of trigrams, size of the names block (3 x uint32)
+        names block: utf-8 of the languages then the trigrams, '\n' separated
+        padding up to a multiple of 8 bytes
+        ranks table: int16, languages x trigrams, row-major
+
+    Run this module as a script to (re)build the store.
+
+    Copyright (c) 2008, Kent S Johnson
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+'''
+
+import array, codecs, mmap, os, re, struct, sys
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MAGIC = b'GLTRIGRAMS1\n'
+HEADER = struct.Struct('<III')
+MISSING = -1
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trigrams')
+STORE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'trigrams.bin')
+
+
+def parseModels(modelsDir=MODELS_DIR):
+    ''' Parse the text models.
+        Returns a dict mapping the lowercased language to its model, a dict
+        mapping each trigram to its rank.
+    '''
+    models = {}
+    lineRe = re.compile(r"(.{3})\s+(.*)")
+    for modelFile in os.listdir(modelsDir):
+        modelPath = os.path.join(modelsDir, modelFile)
+        if os.path.isdir(modelPath):
+            continue
+        f = codecs.open(modelPath, 'r', 'utf-8')
+        model = {}  # QHash<QString,int> model
+        for line in f:
+            m = lineRe.search(line)
+            if m:
+                model[m.group(1)] = int(m.group(2))
+        f.close()
+
+        models[modelFile.lower()] = model
+    return models
+
+
+def build(modelsDir=MODELS_DIR, path=STORE_PATH):
+    ''' Compile the text models of modelsDir into the store file at path '''
+    models = parseModels(modelsDir)
+    languages = sorted(models)
+    trigrams = sorted(set(trigram for model in models.values() for trigram in model))
+    trigramIds = dict((trigram, i) for i, trigram in enumerate(trigrams))
+
+    ranks = array.array('h', [MISSING]) * (len(languages) * len(trigrams))
+    for row, language in enumerate(languages):
+        offset = row * len(trigrams)
+        for trigram, rank in models[language].items():
+            if not 0 <= rank < 2 ** 15:
+                raise ValueError('rank %d of %r in model %s does not fit the store' % (rank, trigram, language))
+            ranks[offset + trigramIds[trigram]] = rank
+    if sys.byteorder != 'little':
+        ranks.byteswap()
+
+    names = u'\n'.join(languages + trigrams).encode('utf-8')
+    padding = -(len(MAGIC) + HEADER.size + len(names)) % 8
+
+    tmpPath = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        f = open(tmpPath, 'wb')
+        try:
+            f.write(MAGIC)
+            f.write(HEADER.pack(len(languages), len(trigrams), len(names)))
+            f.write(names)
+            f.write(b'\0' * padding)
+            f.write(ranks.tostring())
+        finally:
+            f.close()
+        os.rename(tmpPath, path)
+    except:
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+        raise
+
+
+class TrigramStore(object):
+    ''' The models of a store file.
+        languages: the lowercased languages, in row order
+        trigrams: the trigrams, in id order
+        trigramIds: dict mapping each trigram to its id
+        ranks: the ranks table, flat and row-major (numpy array or array.array)
+    '''
+
+    def __init__(self, path=STORE_PATH):
+        f = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            f.close()
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a trigram store' % path)
+        if len(self._map) < len(MAGIC) + HEADER.size:
+            raise ValueError('%s is a corrupted trigram store' % path)
+        offset = len(MAGIC)
+        numLanguages, numTrigrams, namesSize = HEADER.unpack(self._map[offset:offset + HEADER.size])
+        offset += HEADER.size
+        names = self._map[offset:offset + namesSize].decode('utf-8').split(u'\n')
+        offset += namesSize
+        offset += -offset % 8
+
+        self.languages = names[:numLanguages]
+        self.trigrams = names[numLanguages:]
+        if len(self.trigrams) != numTrigrams:
+            raise ValueError('%s is a corrupted trigram store' % path)
+        self.languageRows = dict((language, row) for row, language in enumerate(self.languages))
+        self.trigramIds = dict((trigram, i) for i, trigram in enumerate(self.trigrams))
+        self.numTrigrams = numTrigrams
+
+        size = numLanguages * numTrigrams
+        if len(self._map) < offset + 2 * size:
+            raise ValueError('%s is a corrupted trigram store' % path)
+        if numpy is not None:
+            self.ranks = numpy.frombuffer(self._map, dtype='<i2', count=size, offset=offset)
+        else:
+            self.ranks = array.array('h')
+            self.ranks.fromstring(self._map[offset:offset + 2 * size])
+            if sys.byteorder != 'little':
+                self.ranks.byteswap()
+
+    def model(self, language):
+        return TrigramModel(self, self.languageRows[language])
+
+
+class TrigramModel(object):
+    ''' Read-only dict-like view (trigram -> rank) of one language of a store '''
+
+    def __init__(self, store, row):
+        self._store = store
+        self._offset = row * store.numTrigrams
+
+    def get(self, trigram, default=None):
+        i = self._store.trigramIds.get(trigram)
+        if i is None:
+            return default
+        rank = int(self._store.ranks[self._offset + i])
+        if rank == MISSING:
+            return default
+        return rank
+
+    def __getitem__(self, trigram):
+        rank = self.get(trigram)
+        if rank is None:
+            raise KeyError(trigram)
+        return rank
+
+    def __contains__(self, trigram):
+        return self.get(trigram) is not None
+
+    def __iter__(self):
+        for trigram in self._store.trigrams:
+            if trigram in self:
+                yield trigram
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def keys(self):
+        return list(self)
+
+    def items(self):
+        return [(trigram, self[trigram]) for trigram in self]
+
+
+def isFresh(path=STORE_PATH, modelsDir=MODELS_DIR):
+    ''' True if the store at path exists and is newer than every text model '''
+    try:
+        storeTime = os.path.getmtime(path)
+        return all(os.path.getmtime(os.path.join(modelsDir, name)) <= storeTime for name in os.listdir(modelsDir))
+    except OSError:
+        return False
+
+
+if __name__ == '__main__':
+    build()
+    print('Trigram store written to %s' % STORE_PATH)
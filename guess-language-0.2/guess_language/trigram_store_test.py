@@ -0,0 +1,69 @@
+''' Copyright (c) 2008, Kent S Johnson 
+
+    This library is free software; you can redistribute it and/or
+    modify it under the terms of the GNU Lesser General Public
+    License as published by the Free Software Foundation; either
+    version 2.1 of the License, or (at your option) any later version.
+
+    This library is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+    Lesser General Public License for more details.
+
+    You should have received a copy of the GNU Lesser General Public
+    License along with this library; if not, write to the Free Software
+    Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301  USA
+'''
+
+import os, shutil, tempfile, unittest
+
+import trigram_store
+
+class trigram_store_test(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'trigrams.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_roundtrip(self):
+        parsed = trigram_store.parseModels()
+        trigram_store.build(path=self.path)
+        store = trigram_store.TrigramStore(self.path)
+        
+        self.assertEquals(sorted(parsed), store.languages)
+        for language, model in parsed.items():
+            view = store.model(language)
+            self.assertEquals(model, dict(view.items()))
+            self.assertEquals(len(model), len(view))
+        
+        view = store.model('en')
+        self.assertEquals(None, view.get(u'qqq'))
+        self.assertFalse(u'qqq' in view)
+        self.assertRaises(KeyError, lambda: view[u'qqq'])
+
+    def test_isFresh(self):
+        self.assertFalse(trigram_store.isFresh(self.path))
+        trigram_store.build(path=self.path)
+        self.assertTrue(trigram_store.isFresh(self.path))
+
+    def test_notAStore(self):
+        f = open(self.path, 'wb')
+        f.write(b'not a store' * 10)
+        f.close()
+        self.assertRaises(ValueError, trigram_store.TrigramStore, self.path)
+
+    def test_truncated(self):
+        trigram_store.build(path=self.path)
+        f = open(self.path, 'rb')
+        data = f.read()
+        f.close()
+        for size in [len(trigram_store.MAGIC) + 4, len(data) - 2]:
+            f = open(self.path, 'wb')
+            f.write(data[:size])
+            f.close()
+            self.assertRaises(ValueError, trigram_store.TrigramStore, self.path)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,20 +10,24 @@ The output files are renamed to have the number of tweets selected prefixed in
     their filenames.
 """
 
+import attribution_daemon
+if __name__ == '__main__':
+    attribution_daemon.run_as_client('preprocess')     # before the heavy imports: runs in the daemon when one is listening
+
 import argparse
 import sys
 import os
 import glob
 import messages_persistence
-import traceback
 import logging
 import re
 import codecs
 import itertools
-from nltk.util import ngrams
-import numpy
-import sklearn.feature_extraction
-import sklearn.externals.joblib
+import functools
+import authors_pool
+import tagging_irrelevant_data
+from ngrams_generator import ngrams_generator
+import feature_store
 
 
 features_list = ['char-4-gram',
@@ -40,298 +44,398 @@ features_list = ['char-4-gram',
                 ]
 
 
-def grams_histogram(grams):
-    histogram = {}
-    for gram in grams:
-        if gram in histogram:
-            histogram[gram] += 1
-        else:
-            histogram[gram] = 1
-    return histogram
+retweets_regex_mask = u'(^RT\s)|(?<!\S)RT\s*@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])' # rationale: RT at the beginning of the message or RT followed by a user reference in the middle
+
+
+def command_line_parsing(argv=None):
+    parser = argparse.ArgumentParser()
+    # positional arguments of the four stages, in the order sent by the user interface
+    parser.add_argument('source_dir_data', help='Directory where the authors\' tweets files are stored.')
+    parser.add_argument('dest_dir', help='Directory where the language filtered files will be written.')
+    parser.add_argument('lang_mod_dir', help='Directory of the language detection module (guess_language).')
+    parser.add_argument('language', help='Language of the tweets to be kept.')
+    parser.add_argument('debug')
+    parser.add_argument('retweets_source_dir_data')
+    parser.add_argument('retweets_dest_dir', help='Directory where the retweets filtered files will be written.')
+    parser.add_argument('filter_retweets')
+    parser.add_argument('min_words', type=int)
+    parser.add_argument('retweets_debug')
+    parser.add_argument('tagging_source_dir_data')
+    parser.add_argument('tagging_dest_dir', help='Directory where the tagged files will be written.')
+    parser.add_argument('tagging_debug')
+    parser.add_argument('ngrams_source_dir_data')
+    parser.add_argument('ngrams_dest_dir', help='Directory where the n-grams will be written.')
+    parser.add_argument('features')
+    parser.add_argument('ngrams_debug')
+    parser.add_argument('--fused',
+                        dest='fused',
+                        action='store_true',
+                        default=False,
+                        help='Run the four stages in a single pass over each author\'s file.')
+    parser.add_argument('--keep-intermediate',
+                        dest='keep_intermediate',
+                        action='store_true',
+                        default=False,
+                        help='In fused mode, also write the language, retweets and tagging stages\' directories.')
+    parser.add_argument('--workers', '-w',
+                        dest='workers',
+                        type=int,
+                        default=1,
+                        help='Number of processes sharing the authors\' files of each stage. Default = 1.')
+    parser.add_argument('--language-cache',
+                        dest='language_cache',
+                        type=int,
+                        default=0,
+                        help='Cache the detected languages of up to this number of distinct tweets. Default = 0 (no cache), '
+                             + str(DEFAULT_LANGUAGE_CACHE_SIZE) + ' with --language-cache-file.')
+    parser.add_argument('--language-cache-file',
+                        dest='language_cache_file',
+                        default=None,
+                        help='File keeping the detected languages across runs (enables the cache).')
+    parser.add_argument('--hashing',
+                        dest='hashing_bits',
+                        type=int,
+                        choices=feature_store.hashing_bits_choices,
+                        default=None,
+                        help='Hash the grams of the n-grams to ids of this number of bits instead of indexing them in a vocabulary.')
+    return parser.parse_args(argv)
+
+
+# number of tweets handed over to guess_language at once
+LANGUAGE_BATCH_SIZE = 1000
+
+# size of the detected languages cache when only its file is given
+DEFAULT_LANGUAGE_CACHE_SIZE = 100000
+
+
+def detect_languages(messages):
+    """
+    Yields (message, detected language) for each message, the languages being
+        detected in batches of tweets. The detected language is None when
+        guess_language fails for the tweet.
+    """
+    messages = iter(messages)
+    for batch in iter(lambda: list(itertools.islice(messages, LANGUAGE_BATCH_SIZE)), []):
+        results = guess_language.guessLanguageNameBatch([message['tweet'] for message in batch])
+        for message, (detected_language, error) in itertools.izip(batch, results):
+            print(''.join(['Detecting language for tweet: ', message['tweet']]).encode('utf-8'))
+            if error:       # code guess-language breaks for some tweets
+                print('guess-language library error in detecting language for tweet: ' + message['tweet'])
+                print('Exception stack trace:')
+                print(error)
+            yield message, detected_language
 
 
-def remove_hapax_legomena(histograms_list):
-    if not histograms_list:
+def close_language_cache(workers):
+    cache_info = guess_language.cacheInfo()
+    if cache_info is None:
         return
+    guess_language.disableCache()       # flushes the cache file
+    if workers <= 1:    # the workers' counters are lost with their processes
+        print('Language cache: {} hits, {} misses, {} tweets cached'.format(cache_info.hits, cache_info.misses, cache_info.currsize))
 
-    # sum the occurrence of each feature (gram) through numpy operations
-    vectorizer = sklearn.feature_extraction.DictVectorizer(sparse=False)
-    feature_occurrence_sum = numpy.sum(vectorizer.fit_transform(histograms_list), axis=0)
-
-    # build an array where the elements are the features (grams) in the same order of the feature_occurence_sum columns
-    inverse_vocabulary_array = numpy.empty(len(vectorizer.vocabulary_.keys()), dtype='object')
-    for gram in vectorizer.vocabulary_.keys():
-        inverse_vocabulary_array[vectorizer.vocabulary_[gram]] = gram
-
-    # find the hapax legomena
-    hapax_legomena = []
-    for i in range(len(feature_occurrence_sum)):
-        if feature_occurrence_sum[i] == 1.0:
-            hapax_legomena.append(inverse_vocabulary_array[i])
-
-    # remove the hapax legomena
-    for hapax in hapax_legomena:
-        for histogram in histograms_list:
-            if hapax in histogram:
-                del histogram[hapax]
-
-
-def add_postag_id(histogram):
-    aux = {}
-    postag_id = 1
-    for gram in histogram.keys():
-        aux[(postag_id, gram)] = histogram[gram]
-    return aux
-
-
-def ngrams_generator(tweets, features, save_dir):
-    char_word_len = None
-    if 'char-4-gram' in features:
-        logging.debug('\tGenerating char-4-gram features ...')
-        gram_list = []
-        for tweet in tweets:
-            grams = ngrams(u' ' + tweet['tweet'] + u' ', 4)  # adding space as delimiter
-            gram_list.append(grams_histogram(grams))
-
-        char_word_len = len(gram_list)
-        logging.debug('\tRemoving \'hapax legomena\' ...')
-        remove_hapax_legomena(gram_list)
-        sklearn.externals.joblib.dump(gram_list, os.sep.join([save_dir, 'char-4-gram.pkl']))
-
-    tweets_words = []
-    logging.debug('\tRemoving the punctuation of tweets to generate word grams ...')
-    punctuation = u'\\!\\"\\#\\$\\%\\&\\\'\\(\\)\\*\\+\\,\\-\\.\\/\\:\\;\\<\\=\\>\\?\\@\\[\\\\\\]\\^\\_\\`\\{\\|\\}\\~'  # source: re.escape(string.punctuation)
-    for tweet in tweets:
-        words = re.sub(u''.join([u'[', punctuation, u']']), '', tweet['tweet']).split()
-        tweets_words.append([u'\x02'] + words + [u'\x03'])  # apply \x02 and \x03 as begin/end identifiers
-
-    for i in range(1, 6):
-        if ''.join(['word-', str(i), '-gram']) in features:
-            logging.debug(''.join(['\tGenerating word-', str(i), '-gram features ...']))
-            gram_list = []
-            for tweet in tweets_words:
-                if i == 1:
-                    grams = ngrams(tweet[1:-1], i)  # do not consider begin/end identifiers in case of word-1-grams
-                else:
-                    grams = ngrams(tweet, i)
-                gram_list.append(grams_histogram(grams))
-            if not char_word_len:
-                char_word_len = len(gram_list)
-            logging.debug('\tRemoving \'hapax legomena\' ...')
-            remove_hapax_legomena(gram_list)
-            sklearn.externals.joblib.dump(gram_list, ''.join([save_dir, os.sep, 'word-', str(i), '-gram.pkl']))
-
-    tweets_pos = []
-    for tweet in tweets:
-        if tweet['pos']:
-            tweets_pos.append(
-                [u'\x02'] + tweet['pos'].split() + [u'\x03'])  # apply \x02 and \x03 as begin/end identifiers
-    for i in range(1, 6):
-        if ''.join(['pos-', str(i), '-gram']) in features:
-            logging.debug(''.join(['\tGenerating pos-', str(i), '-gram features ...']))
-            gram_list = []
-            for tweet in tweets_pos:
-                if i == 1:
-                    grams = ngrams(tweet[1:-1], i)  # do not consider begin/end identifiers in case of pos-1-grams
-                else:
-                    grams = ngrams(tweet, i)
-                gram_list.append(add_postag_id(grams_histogram(
-                    grams)))  # add an element in the pos-tag gram identifier to not mix up these grams with other char/word grams
-            if char_word_len and char_word_len != len(gram_list):
-                logging.error(''.join(
-                    ['Tweet messages and POS Tags with different sizes for author ', os.path.basename(save_dir), ': ',
-                     str(char_word_len), ' and ', str(len(gram_list)), ' respectively. Quitting ...']))
-                sys.exit(1)
-            logging.debug('\tRemoving \'hapax legomena\' ...')
-            remove_hapax_legomena(gram_list)
-            sklearn.externals.joblib.dump(gram_list, ''.join([save_dir, os.sep, 'pos-', str(i), '-gram.pkl']))
 
+def keep_tweet(tweet, filter_retweets, min_words):
+    if filter_retweets and re.search(retweets_regex_mask, tweet):
+        return False
+    if len(tweet.split()) < min_words:
+        return False
+    return True
 
-def tag_url(text):
-    # source: http://stackoverflow.com/questions/6883049/regex-to-find-urls-in-string-in-python
-    # test: import re; re.sub('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+' , u'URL', 'ahttp:/www.uol.com.br ahttp://www.uol.com.br https://255.255.255.255/teste http://www.255.1.com/outroteste a a a ')
-    #return re.sub('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+' , u'URL', text)
 
-    # Thiago Cavalcante's approach
-    return re.sub('((([A-Za-z]{3,9}:(?:\/\/)?)(?:[\-;:&=\+\$,\w]+@)?[A-Za-z0-9\.\-]+|(?:www\.|[\-;:&=\+\$,\w]+@)[A-Za-z0-9\.\-]+)((?:\/[\+~%\/\.\w\-_]*)?\??(?:[\-\+=&;%@\.\w_]*)#?(?:[\.\!\/\\\w]*))?)', u'URL', text)
+tagger = tagging_irrelevant_data.Tagger()
 
 
-def tag_userref(text):
-    # rational: a username must start with a '@' and have unlimited occurences of letters, numbers and underscores.
-    # test: import re; re.sub('(?<!\S)@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])', u'REF', '@user @us3r @1user @1234567890123456 @_0334 @vser @_ @1 @faeeeec-cas caece ce ce asdcc@notuser ewdede-@dqwec email@some.com.br @ @aaa')
-    #return re.sub('(?<!\S)@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])', u'REF', text)
+def tag_message(message):
+    tagged = tagger.tag(message['tweet'])
+    logging.debug('Original message: ' + message['tweet'])
+    logging.debug('Tagged message: ' + tagged)
+    # the tagged message keeps only the tagged tweet, as read back from the tagging stage's output
+    tagged_message = {'tweet': tagged, 'pos': message['pos']}
+    if message['pos']:
+        tagged_message['full'] = u''.join([tagged, u'\n#POS', message['pos'], u'#POS'])
+    else:
+        tagged_message['full'] = tagged
+    return tagged_message
 
-    # Thiago Cavalcante's approach
-    return re.sub('@[^\s]+', u'REF', text)
 
+def create_dest_dir(dest_dir):
+    if os.path.exists(dest_dir):
+        print(''.join(['Destination directory ', dest_dir, ' already exists. Quitting ...']))
+        sys.exit(1)
+    os.makedirs(dest_dir)
 
-def tag_hashtag(text):
-    # rationale: https://support.twitter.com/articles/49309
-    # test: import re; re.sub('(?<!\S)(#[0-9a-zA-Z_-]+)(?![0-9a-zA-Z_-])', u'TAG', '#anotherhash #123 #a123 a not#hash #[]aaa #avbjd')
-    #return re.sub('(?<!\S)(#[0-9a-zA-Z_-]+)(?![0-9a-zA-Z_-])', u'TAG', text)
 
-    # Thiago Cavalcante's approach
-    return re.sub('#[a-zA-Z]+', u'TAG', text)
+def filter_language_file(author_filename, dest_dir, language):
+    languagedetected = 0
+    print(''.join(['Processing ', author_filename, ' file ...']))
+    partial_filename = ''.join([dest_dir, os.sep, os.path.basename(author_filename), '.part'])    # the number of tweets kept is only known at the end of the file
+    try:
+        with messages_persistence.Writer('full', partial_filename) as writer:
+            for message, detected_language in detect_languages(messages_persistence.iter_messages(author_filename)):
+                if detected_language:
+                    languagedetected = languagedetected + 1
+                    print(''.join(['\tLanguage \'', detected_language, '\' detected.']))
+                    if detected_language == language:
+                        writer.write(message)
+                else:
+                    print('No language detected for tweet: ' + message['tweet'])
+    except:
+        os.remove(partial_filename)     # no partial file left in the destination directory
+        raise
+    destination_filename = ''.join([dest_dir, os.sep, str(writer.count).zfill(5), '_', os.path.basename(author_filename)])      # the destination name is the original filename prefixed with the number of tweets
+    print(''.join(['Saving ', destination_filename, ' file ...']))
+    os.rename(partial_filename, destination_filename)
+    return languagedetected
 
 
-def tag_date(text):
-    # rationale: a date is a two or three blocks of digits separated by a slash.
-    # test: import re; re.sub(('(?<!\S)('
-    #                                       '[0-3]?[0-9]\s?[/-]\s?[0-3]?[0-9]\s?[/-]\s?[0-9]{1,4}|'     # DD/MM/YYYY or MM/DD/YYYY
-    #                                       '[0-1]?[0-9]\s?[/-]\s?[0-9]{1,4}|'                          # MM/YYYY
-    #                                       '[0-9]{1,4}\s?[/-]\s?[0-1]?[0-9]|'                          # YYYY/MM
-    #                                       '[0-3]?[0-9]\s?[/-]\s?[0-3]?[0-9]'                          # DD/MM or MM/DD
-    #                       '            )(?![0-9a-zA-Z])'
-    #                           ), u'DAT', '23/12/1977 12 - 23- 2014 25-10 12 / 23 09/2013 1999 - 02 90/12 a12/94 12/31. 12/31a 12-31')
-    #return re.sub(('(?<!\S)('
-    #                            '[0-3]?[0-9]\s?[/-]\s?[0-3]?[0-9]\s?[/-]\s?[0-9]{1,4}|'     # DD/MM/YYYY or MM/DD/YYYY
-    #                            '[0-1]?[0-9]\s?[/-]\s?[0-9]{1,4}|'                          # MM/YYYY
-    #                            '[0-9]{1,4}\s?[/-]\s?[0-1]?[0-9]|'                          # YYYY/MM
-    #                            '[0-3]?[0-9]\s?[/-]\s?[0-3]?[0-9]'                          # DD/MM or MM/DD
-    #                       ')(?![0-9a-zA-Z])'
-    #               ), u'DAT', text)
+def filter_language(source_dir_data, dest_dir, language, workers=1):
+    languagedetected = 0
+    print('Filtering tweets by language ...')
+    author_filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
+    print(author_filenames);
+    num_files = len(author_filenames)   # processing feedback
+    i = 0                               # processing feedback
+    for file_languagedetected in authors_pool.map_authors(functools.partial(filter_language_file, dest_dir=dest_dir, language=language), author_filenames, workers):
+        i += 1
+        print(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))
+        languagedetected = languagedetected + file_languagedetected
+    return languagedetected
 
-    # Thiago Cavalcante's approach
-    return re.sub('[0-9]?[0-9][-/][0-9]?[0-9]([-/][0-9][0-9][0-9][0-9])?', u'DAT', text)
 
+def filter_retweets_few_words_file(filename, dest_dir, filter_retweets, min_words):
+    retweetsfiltered = 0
+    print(''.join(['Processing ', filename, ' file ...']))
+    with messages_persistence.Writer('full', ''.join([dest_dir, os.sep, os.path.basename(filename)])) as writer:
+        for message in messages_persistence.iter_messages(filename):
+            if keep_tweet(message['tweet'], filter_retweets, min_words):
+                writer.write(message)
+            else:
+                retweetsfiltered = retweetsfiltered + 1
+                print('Filtering tweet: ' + message['tweet'])
+    return retweetsfiltered
 
-def tag_time(text):
-    # rationale: a time is one or two digits followed by a colon and one or two more digits followed by an optional seconds block. An optional AM/PM suffix can also occur.
-    # test: import re; re.sub('(?<!\S)([0-2]?[0-9]:[0-5]?[0-9](:[0-5]?[0-9])?\s?([A|P]M)?)(?![0-9a-zA-Z])', u'TIM', '00:00 AM 1:01PM 2:2 pm 01:02:03 Am 01:02. 03:12! 03:14a bbb 60:60 3:40am', flags=re.IGNORECASE)
-    #return re.sub('(?<!\S)([0-2]?[0-9]:[0-5]?[0-9](:[0-5]?[0-9])?\s?([A|P]M)?)(?![0-9a-zA-Z])', u'TIM', text, flags=re.IGNORECASE)
 
-    # Thiago Cavalcante's approach
-    return re.sub('[0-9]?[0-9]:[0-9]?[0-9](:[0-9]?[0-9])?', u'TIM', text)
+def filter_retweets_few_words(source_dir_data, dest_dir, filter_retweets, min_words, workers=1):
+    retweetsfiltered = 0
+    print('Processing authors\' files ...')
+    #glob module finds all the pathnames matching a pattern
+    #glob.glob returns list of pathnames that match given pathname
+    filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
+    num_files = len(filenames)              # processing feedback
+    i = 0                                   # processing feedback
+    for file_retweetsfiltered in authors_pool.map_authors(functools.partial(filter_retweets_few_words_file, dest_dir=dest_dir, filter_retweets=filter_retweets, min_words=min_words), filenames, workers):
+        i += 1
+        print(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))
+        retweetsfiltered = retweetsfiltered + file_retweetsfiltered
+    return retweetsfiltered
 
 
-def tag_number(text):
-    # rationale: a number is a group of consecutive digits, comma and points, prefixed by a optional plus/minus. Obs: expected very few false positives
-    # test: import re; re.sub('(?<!\S)([+-]?[0-9.,]*[0-9])(?![0-9a-zA-Z+-])', u'NUM', '98.786    123 123.1 345,2 32, 56. .92 ,34 100,000.00 +11,3 -10 10? 10! 1,1..2 1-1 1+1 dadcd12  89hjgj tt.bt.65bnnn 98,3')
-    #return re.sub('(?<!\S)([+-]?[0-9.,]*[0-9])(?![0-9a-zA-Z+-])', u'NUM', text)
+def tag_irrelevant_data_file(filename, dest_dir):
+    taggedTweets = 0
+    logging.debug(''.join(['Processing file ', filename, ' ...']))
+    with messages_persistence.Writer('full', os.sep.join([dest_dir, os.path.basename(filename)])) as writer:
+        for message in messages_persistence.iter_messages(filename):
+            writer.write(tag_message(message))
+            taggedTweets = taggedTweets + 1
+    return taggedTweets
 
-    # rationale: a number is a group of three possibilities: 1) a leading digits followed by point/comma and optional decimal digits; 2) leading comma/point followed by digits; 3) numbers without comma/point
-    # test: import re; re.sub('(?<!\S)([0-9]+[,.][0-9]*|[,.][0-9]+|[0-9]+)(?=\s|$)', u'NUM', '98.786    123 123.1 345,2 32, 56. .92 ,34 dadcd12  89hjgj tt.bt.65bnnn 98,3')
-    # return re.sub('(?<!\S)([0-9]+[,.][0-9]*|[,.][0-9]+|[0-9]+)(?=\s|$)', u'NUM', text)
 
-    # Thiago Cavalcante's approach
-    return re.sub('[0-9]+', u'NUM', text)
+def tag_irrelevant_data(source_dir_data, dest_dir, workers=1):
+    taggedTweets = 0
+    print('Tagging tweets ...')
+    filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
+    i = 0  # processing feedback
+    for file_taggedTweets in authors_pool.map_authors(functools.partial(tag_irrelevant_data_file, dest_dir=dest_dir), filenames, workers):
+        i += 1  # processing feedback
+        sys.stderr.write(''.join(['\t', str(i), '/', str(len(filenames)), ' files processed\r']))  # processing feedback
+        taggedTweets = taggedTweets + file_taggedTweets
+    return taggedTweets
 
 
+def generate_ngrams_file(filename, dest_dir, features, hashing_bits=None):
+    logging.debug(''.join(['Reading tweets and generating n-grams for file ', filename, ' ...']))
+    author_dir = os.sep.join([dest_dir, os.path.splitext(os.path.basename(filename))[0]])
+    os.makedirs(author_dir)
+    ngrams_generator(messages_persistence.read(filename), features, author_dir, hashing_bits)
+    return 1
 
-if __name__ == '__main__':
+
+def generate_ngrams(source_dir_data, dest_dir, features, workers=1, hashing_bits=None):
+    ngramsGenerated = 0
+    author_dirnames = glob.glob(os.sep.join([source_dir_data, '*.dat']))
+    num_files = len(author_dirnames)    # processing feedback
+    i = 0                               # processing feedback
+    print('Reading dataset and generating n-grams ...')
+    for file_ngramsGenerated in authors_pool.map_authors(functools.partial(generate_ngrams_file, dest_dir=dest_dir, features=features, hashing_bits=hashing_bits), author_dirnames, workers):
+        i += 1
+        sys.stderr.write(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))   # processing feedback
+        ngramsGenerated = ngramsGenerated + file_ngramsGenerated
+    print('Building the corpus vocabulary ...')
+    feature_store.build_corpus_vocabulary(dest_dir)
+    return ngramsGenerated
+
+
+def fused_preprocessing_file(author_filename, language, filter_retweets, min_words, features, ngrams_dest_dir, intermediate_dirs=None, hashing_bits=None):
+    languagedetected = 0
+    retweetsfiltered = 0
+    taggedTweets = 0
+    print(''.join(['Processing ', author_filename, ' file ...']))
+    basename = os.path.basename(author_filename)
+    writers = None
+    if intermediate_dirs:
+        writers = [messages_persistence.Writer('full', ''.join([intermediate_dir, os.sep, basename, '.part'])) for intermediate_dir in intermediate_dirs]
+    language_count = 0
+    tagged_messages = []
+    for message, detected_language in detect_languages(messages_persistence.iter_messages(author_filename)):
+        if not detected_language:
+            print('No language detected for tweet: ' + message['tweet'])
+            continue
+        languagedetected = languagedetected + 1
+        print(''.join(['\tLanguage \'', detected_language, '\' detected.']))
+        if detected_language != language:
+            continue
+        language_count += 1
+        if writers:
+            writers[0].write(message)
+        if not keep_tweet(message['tweet'], filter_retweets, min_words):
+            retweetsfiltered = retweetsfiltered + 1
+            print('Filtering tweet: ' + message['tweet'])
+            continue
+        if writers:
+            writers[1].write(message)
+        tagged_message = tag_message(message)
+        taggedTweets = taggedTweets + 1
+        if writers:
+            writers[2].write(tagged_message)
+        tagged_messages.append(tagged_message)
+
+    prefixed_basename = ''.join([str(language_count).zfill(5), '_', basename])     # the language stage prefixes the filename with the number of tweets
+    if writers:
+        for writer, intermediate_dir in itertools.izip(writers, intermediate_dirs):
+            writer.close()
+            os.rename(writer.filename, os.sep.join([intermediate_dir, prefixed_basename]))
+    author_dir = os.sep.join([ngrams_dest_dir, os.path.splitext(prefixed_basename)[0]])
+    os.makedirs(author_dir)
+    ngrams_generator(tagged_messages, features, author_dir, hashing_bits)
+    return languagedetected, retweetsfiltered, taggedTweets, 1
+
+
+def fused_preprocessing(source_dir_data, language, filter_retweets, min_words, features, ngrams_dest_dir, intermediate_dirs=None, workers=1, hashing_bits=None):
+    """
+    Runs the language, retweets, tagging and n-grams stages in a single pass
+        over each author's file. The stages' directories are only written when
+        intermediate_dirs (language, retweets and tagging destination
+        directories) is given.
+    Returns the counters of the four stages.
+    """
+    counters = [0, 0, 0, 0]     # languagedetected, retweetsfiltered, taggedTweets, ngramsGenerated
+    author_filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
+    num_files = len(author_filenames)   # processing feedback
+    i = 0                               # processing feedback
+    fused_function = functools.partial(fused_preprocessing_file, language=language, filter_retweets=filter_retweets, min_words=min_words,
+                                       features=features, ngrams_dest_dir=ngrams_dest_dir, intermediate_dirs=intermediate_dirs, hashing_bits=hashing_bits)
+    for file_counters in authors_pool.map_authors(fused_function, author_filenames, workers):
+        i += 1
+        print(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))
+        counters = [counter + file_counter for counter, file_counter in itertools.izip(counters, file_counters)]
+    print('Building the corpus vocabulary ...')
+    feature_store.build_corpus_vocabulary(ngrams_dest_dir)
+    return tuple(counters)
+
+
+def main(argv=None):
+    """
+    Runs the four stages with the command line arguments argv (sys.argv by
+        default).
+    """
     # parsing argument
-    source_dir_data = sys.argv[1]
-    dest_dir = sys.argv[2]
-    lang_mod_dir = sys.argv[3]
-    language = sys.argv[4]
-    debug = sys.argv[5]
+    args = command_line_parsing(argv)
+    source_dir_data = args.source_dir_data
+    dest_dir = args.dest_dir
+    lang_mod_dir = args.lang_mod_dir
+    language = args.language
+    debug = args.debug
     # logging configuration
 
     print("Starting filtering language ... \n\t source directory data = {} \n\t destination directory = {} \n\t language detection module directory = {} \n\t language = {} \n\t debug = {}" .format(source_dir_data, dest_dir, lang_mod_dir, language, str(debug)))
 
-    sys.path.append(lang_mod_dir)
+    if lang_mod_dir not in sys.path:
+        sys.path.append(lang_mod_dir)
+    global guess_language
     import guess_language
+    if args.language_cache or args.language_cache_file:
+        guess_language.enableCache(args.language_cache or DEFAULT_LANGUAGE_CACHE_SIZE, args.language_cache_file)
 
-    print('Creating output directories ...')
+    features = args.features
+    if 'all' in features:
+        features = features_list
 
-    if os.path.exists(dest_dir):
-        print(''.join(['Destination directory ', dest_dir, ' already exists. Quitting ...']))
-        sys.exit(1)
-    os.makedirs(dest_dir)
+    if args.fused:
+        print('Creating output directories ...')
+        intermediate_dirs = None
+        if args.keep_intermediate:
+            intermediate_dirs = [args.dest_dir, args.retweets_dest_dir, args.tagging_dest_dir]
+            for intermediate_dir in intermediate_dirs:
+                create_dest_dir(intermediate_dir)
+        create_dest_dir(args.ngrams_dest_dir)
+
+        print('Preprocessing tweets in a single pass ...')
+        languagedetected, retweetsfiltered, taggedTweets, ngramsGenerated = fused_preprocessing(source_dir_data, language, args.filter_retweets, args.min_words, features, args.ngrams_dest_dir, intermediate_dirs, args.workers, args.hashing_bits)
+
+        # same feedback as the staged run, expected by the user interface
+        print('\n')
+        print('Finishing...')
+        print(languagedetected)
+        print('\n')
+        print('RetweetsDone')
+        print(retweetsfiltered)
+        print('\n')
+        print('TaggedFinishing')
+        print(taggedTweets)
+        print('\n')
+        print('NGramsFinishing')
+        print(ngramsGenerated)
+        close_language_cache(args.workers)
+        sys.exit(0)
 
-    languagedetected = 0
-    print('Filtering tweets by language ...')
-    author_filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
-    print(author_filenames);
-    num_files = len(author_filenames)   # processing feedback
-    i = 0                               # processing feedback
-    for author_filename in author_filenames:
-        print(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))
-        i += 1
-        print(''.join(['Processing ', author_filename, ' file ...']))
-        messages = messages_persistence.read(author_filename)
-        messages_filtered = []
-        for message in messages:
-            print(''.join(['Detecting language for tweet: ', message['tweet']]).encode('utf-8'))
-            try:        # code guess-language breaks for some tweets
-                detected_language = guess_language.guessLanguageName(message['tweet'])
-                languagedetected = languagedetected + 1
-            except Exception as e:
-                print('guess-language library error in detecting language for tweet: ' + message['tweet'])
-                print('Exception message: ' + str(e))
-                print('Exception stack trace:')
-                traceback.print_tb(sys.exc_info()[2])
-                detected_language = None
-            if detected_language:
-                print(''.join(['\tLanguage \'', detected_language, '\' detected.']))
-                if detected_language == language:
-                    messages_filtered.append(message)
-            else:
-                print('No language detected for tweet: ' + message['tweet'])
-        destination_filename = ''.join([dest_dir, os.sep, str(len(messages_filtered)).zfill(5), '_', os.path.basename(author_filename)])      # the destination name is the original filename prefixed with the number of tweets
-        print(''.join(['Saving ', destination_filename, ' file ...']))
-        messages_persistence.write(messages_filtered, 'full', destination_filename)
+    print('Creating output directories ...')
+    create_dest_dir(dest_dir)
+
+    languagedetected = filter_language(source_dir_data, dest_dir, language, args.workers)
 
     print('\n')
     print('Finishing...')
     print(languagedetected)
+    close_language_cache(args.workers)
 
     #logging.basicConfig(level=logging.DEBUG if debug else logging.INFO, format='[%(asctime)s] - %(levelname)s - %(message)s')
-    source_dir_data = sys.argv[6]
-    dest_dir = sys.argv[7]
-    filter_retweets = sys.argv[8]
-    min_words = int(sys.argv[9])
-    debug = sys.argv[10]
+    source_dir_data = args.retweets_source_dir_data
+    dest_dir = args.retweets_dest_dir
+    filter_retweets = args.filter_retweets
+    min_words = args.min_words
+    debug = args.retweets_debug
 
-    retweetsfiltered = 0
     print ("Starting filtering out data ..\n\tsource directory data = {} \n\tdestination directory = {} \n\tfilter retweets = {} \n\tminimal number of words = {} \n\tdebug = {} ".format(str(source_dir_data), str(dest_dir), str(filter_retweets), str(min_words), str(debug)))
 
     print('Creating output directories ...')
-    if os.path.exists(dest_dir):
-        print(''.join(['Destination directory ', dest_dir, ' already exists. Quitting ...']))
-        sys.exit(1)
-    os.makedirs(dest_dir)
+    create_dest_dir(dest_dir)
 
-    print('Processing authors\' files ...')
-    #glob module finds all the pathnames matching a pattern
-    #glob.glob returns list of pathnames that match given pathname
-    filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
-    num_files = len(filenames)              # processing feedback
-    i = 0                                   # processing feedback
-    retweets_regex_mask = u'(^RT\s)|(?<!\S)RT\s*@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])' # rationale: RT at the beginning of the message or RT followed by a user reference in the middle
-    for filename in filenames:
-        print(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))
-        i += 1
-        print(''.join(['Processing ', filename, ' file ...']))
-        messages = messages_persistence.read(filename)
-        messages_filtered = []
-        for message in messages:
-            keep = True
-            if filter_retweets and re.search(retweets_regex_mask, message['tweet']):
-                keep = False
-            if len(message['tweet'].split()) < min_words:
-                keep = False
-            if keep:
-                messages_filtered.append(message)
-            else:
-                retweetsfiltered = retweetsfiltered + 1
-                print('Filtering tweet: ' + message['tweet'])
-
-        messages_persistence.write(messages_filtered, 'full', ''.join([dest_dir, os.sep, os.path.basename(filename)]))
+    retweetsfiltered = filter_retweets_few_words(source_dir_data, dest_dir, filter_retweets, min_words, args.workers)
 
     print('\n')
     print('RetweetsDone')
     print(retweetsfiltered)
 
-    source_dir_data = sys.argv[11]
-    dest_dir = sys.argv[12]
+    source_dir_data = args.tagging_source_dir_data
+    dest_dir = args.tagging_dest_dir
     no_number = False
     no_date = False
     no_time = False
     no_url = False
     no_hashtag = False
     no_userref = False
-    debug = sys.argv[13]
+    debug = args.tagging_debug
     print(''.join(['Starting tagging data ...',
                           '\n\tsource directory data = ', str(source_dir_data),
                           '\n\tdestination directory = ', str(dest_dir),
@@ -350,40 +454,7 @@ if __name__ == '__main__':
         sys.exit(1)
     os.makedirs(dest_dir)
 
-    taggedTweets = 0
-    print('Tagging tweets ...')
-    filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
-    i = 0  # processing feedback
-    for filename in filenames:
-        sys.stderr.write(''.join(['\t', str(i), '/', str(len(filenames)), ' files processed\r']))  # processing feedback
-        i += 1  # processing feedback
-        logging.debug(''.join(['Processing file ', filename, ' ...']))
-        messages = messages_persistence.read(filename)
-        messages_tagged = []
-        for message in messages:
-            tagged = message['tweet']
-            if not no_url:
-                tagged = tag_url(tagged)
-            if not no_userref:
-                tagged = tag_userref(tagged)
-            if not no_hashtag:
-                tagged = tag_hashtag(tagged)
-            if not no_date:
-                tagged = tag_date(tagged)
-            if not no_time:
-                tagged = tag_time(tagged)
-            if not no_number:
-                tagged = tag_number(tagged)
-            logging.debug('Original message: ' + message['tweet'])
-            taggedTweets = taggedTweets + 1
-            logging.debug('Tagged message: ' + tagged)
-            messages_tagged.append(tagged)
-        for [tagged, message] in itertools.izip(messages_tagged, messages):
-            if message['pos']:
-                message['full'] = u''.join([tagged, u'\n#POS', message['pos'], u'#POS'])
-            else:
-                message['full'] = tagged
-        messages_persistence.write(messages, 'full', os.sep.join([dest_dir, os.path.basename(filename)]))
+    taggedTweets = tag_irrelevant_data(source_dir_data, dest_dir, args.workers)
 
     print('\n')
     print('TaggedFinishing')
@@ -392,13 +463,9 @@ if __name__ == '__main__':
     # parsing arguments
     #args = command_line_parsing()
 
-    source_dir_data = sys.argv[14]
-    dest_dir = sys.argv[15]
-    features = sys.argv[16]
-    debug = sys.argv[17]
-
-    if 'all' in features:
-        features = features_list
+    source_dir_data = args.ngrams_source_dir_data
+    dest_dir = args.ngrams_dest_dir
+    debug = args.ngrams_debug
 
     # logging configuration
     #logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='[%(asctime)s] - %(levelname)s - %(message)s')
@@ -416,20 +483,12 @@ if __name__ == '__main__':
         sys.exit(1)
     os.makedirs(dest_dir)
 
-    ngramsGenerated = 0
-    author_dirnames = glob.glob(os.sep.join([source_dir_data, '*.dat']))
-    num_files = len(author_dirnames)    # processing feedback
-    i = 0                               # processing feedback
-    print('Reading dataset and generating n-grams ...')
-    for filename in author_dirnames:
-        sys.stderr.write(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))   # processing feedback
-        i += 1
-        logging.debug(''.join(['Reading tweets and generating n-grams for file ', filename, ' ...']))
-        ngramsGenerated = ngramsGenerated + 1
-        author_dir = os.sep.join([dest_dir, os.path.splitext(os.path.basename(filename))[0]])
-        os.makedirs(author_dir)
-        ngrams_generator(messages_persistence.read(filename), features, author_dir)
+    ngramsGenerated = generate_ngrams(source_dir_data, dest_dir, features, args.workers, args.hashing_bits)
 
     print('\n')
     print('NGramsFinishing')
     print(ngramsGenerated)
+
+
+if __name__ == '__main__':
+    main()
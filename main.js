@@ -1,10 +1,38 @@
 const {app,BrowserWindow}=require('electron');
+const {spawn}=require('child_process');
+const net=require('net');
+const os=require('os');
+const path=require('path');
+
+// the python scripts run by the windows forward their requests to the
+// attribution daemon listening to this socket (see attribution_daemon.py),
+// which keeps the interpreter, the libraries and the models loaded
+process.env.TWEETIFI_DAEMON_SOCKET=process.env.TWEETIFI_DAEMON_SOCKET||path.join(os.tmpdir(),'tweetifi-attribution-'+process.getuid()+'.sock');
+let daemon=null;
+
+function startDaemon(){
+	daemon=spawn('python2.7',[path.join(__dirname,'attribution_daemon.py')],{cwd:__dirname,stdio:'ignore'});
+	daemon.on('error',()=>{daemon=null;});	// no python: the scripts run by themselves
+	daemon.on('exit',()=>{daemon=null;});	// or another one is listening already
+}
+
+function stopDaemon(done){
+	daemon.on('exit',done);
+	const connection=net.connect(process.env.TWEETIFI_DAEMON_SOCKET,()=>{
+		connection.end(JSON.stringify({op:'shutdown'})+'\n');
+	});
+	connection.on('error',()=>{ if(daemon) daemon.kill(); });
+	setTimeout(()=>{ if(daemon) daemon.kill(); },5000);	// busy with a request
+}
 
 function createWindow(){
 	window=new BrowserWindow({width:800,height:600});
 	window.loadFile('login.html');
 }
-app.on('ready',createWindow);
+app.on('ready',()=>{
+	startDaemon();
+	createWindow();
+});
 
 
 app.on('window-all-closed', () => {
@@ -14,3 +42,10 @@ app.on('window-all-closed', () => {
       app.quit()
     }
   });
+
+app.on('will-quit',(event)=>{
+	if(daemon){
+		event.preventDefault();
+		stopDaemon(()=>app.quit());
+	}
+});
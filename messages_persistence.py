@@ -6,9 +6,22 @@ Auxiliary code for manipulating (read and write) Twitter messages in dataset fil
 import codecs
 
 
-def read(filename):
-    messages = []
-    str_buffer = u''
+def _build_message(lines):
+    str_buffer = u''.join(lines)
+    parts = str_buffer.split('#POS')
+    message = {}
+    message['tweet'] = parts[0][:-1]        # strips the last \n character
+    message['pos'] = parts[1] if len(parts) > 1 else None
+    message['full'] = str_buffer[:-1]       # strips the last \n character
+    return message
+
+
+def iter_messages(filename):
+    """
+    Yields the messages of a dataset file one at a time, so that only the
+        message being built is kept in memory.
+    """
+    lines = []
     with codecs.open(filename, encoding='utf-8', mode='r', buffering=1, errors='strict') as fd:
         read = False
         for line in fd:
@@ -18,19 +31,43 @@ def read(filename):
             else:
                 if line == u'}\n':
                     read = False
-                    parts = str_buffer.split('#POS')
-                    message = {}
-                    message['tweet'] = parts[0][:-1]        # strips the last \n character
-                    message['pos'] = parts[1] if len(parts) > 1 else None
-                    message['full'] = str_buffer[:-1]       # strips the last \n character
-                    messages.append(message)
-                    str_buffer = u''
+                    yield _build_message(lines)
+                    lines = []
                 else:
-                    str_buffer += line
-    return messages
+                    lines.append(line)
+
+
+def read(filename):
+    return list(iter_messages(filename))
+
+
+class Writer(object):
+    """
+    Incremental sink for messages: each message is written to the dataset
+        file as soon as it is handed over.
+    """
+
+    def __init__(self, id, filename):
+        self.id = id
+        self.filename = filename
+        self.count = 0
+        self._fd = codecs.open(filename, encoding='utf-8', mode='w+', errors='strict')
+
+    def write(self, message):
+        self._fd.write(u'\n'.join([u'{', message[self.id], u'}\n']))
+        self.count += 1
+
+    def close(self):
+        self._fd.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
 def write(messages, id, filename):
-    with codecs.open(filename, encoding='utf-8', mode='w+', errors='strict') as fd:
+    with Writer(id, filename) as writer:
         for message in messages:
-            fd.write(u'\n'.join([u'{', message[id], u'}\n']))
+            writer.write(message)
@@ -3,9 +3,10 @@
 
 """
 Code for generating ngrams for the messages presented in the dataset.
-The output are files in Python's built-in persistence model format implemented
-    by sklearn, one file for each feature of each author (char-4-gram, 
-    word-1-gram, word-2-gram, ...) to be fed to the classifiers.
+The output are the histograms of each feature of each author (char-4-gram,
+    word-1-gram, word-2-gram, ...) as CSR arrays in numpy's .npy format, plus
+    the vocabulary of the author and, once all the authors are done, the
+    corpus vocabulary (see feature_store), to be fed to the classifiers.
 """
 
 
@@ -14,13 +15,18 @@ import logging
 import os
 import sys
 import glob
+import functools
+import itertools
 import messages_persistence
-from nltk.util import ngrams
-import numpy
-import sklearn.feature_extraction
-import sklearn.externals.joblib
+import authors_pool
+import feature_store
+import hashlib
 import re
+import shutil
+import sklearn.externals.joblib
+
 
+manifest_filename = '.manifest.pkl'   # hidden, as it is not an author
 
 features_list = ['char-4-gram',
                  'word-1-gram',
@@ -51,6 +57,22 @@ def command_line_parsing():
                         nargs = '+',
                         default=['all'],
                         help='Features to be used in classification. Default = all.')
+    parser.add_argument('--workers', '-w',
+                        dest='workers',
+                        type=int,
+                        default=1,
+                        help='Number of processes sharing the authors\' files. Default = 1.')
+    parser.add_argument('--hashing',
+                        dest='hashing_bits',
+                        type=int,
+                        choices=feature_store.hashing_bits_choices,
+                        default=None,
+                        help='Hash the grams to ids of this number of bits instead of indexing them in a vocabulary.')
+    parser.add_argument('--incremental', '-i',
+                        dest='incremental',
+                        action='store_true',
+                        default=False,
+                        help='Update an existing output directory: only the authors whose files are new or changed since the last run are generated again.')
     parser.add_argument('--debug', '-d',
                         dest='debug',
                         action='store_true',
@@ -59,9 +81,34 @@ def command_line_parsing():
     return parser.parse_args()
 
 
-def grams_histogram(grams):
+def remove_hapax_legomena(histograms_list):
+    """
+    Removes, in place, the features (grams) occurring only once through all
+        the histograms of the list.
+    """
+    occurrences = {}    # total occurrences of each feature (gram)
+    owners = {}         # histogram where each feature (gram) was first found
+    for histogram in histograms_list:
+        for gram, count in histogram.iteritems():
+            if gram in occurrences:
+                occurrences[gram] += count
+            else:
+                occurrences[gram] = count
+                owners[gram] = histogram
+
+    # a hapax legomenon occurs in a single histogram, the one it was found in
+    for gram, count in occurrences.iteritems():
+        if count == 1:
+            del owners[gram][gram]
+
+
+def char_ngrams_histogram(text, n):
+    """
+    Histogram of the char n-grams of text, each gram being the tuple of its
+        characters, in a single pass over the string.
+    """
     histogram = {}
-    for gram in grams:
+    for gram in itertools.izip(*[text[i:] for i in range(n)]):
         if gram in histogram:
             histogram[gram] += 1
         else:
@@ -69,97 +116,197 @@ def grams_histogram(grams):
     return histogram
 
 
-def remove_hapax_legomena(histograms_list):
-    if not histograms_list:
-        return
-
-    # sum the occurrence of each feature (gram) through numpy operations
-    vectorizer = sklearn.feature_extraction.DictVectorizer(sparse=False)
-    feature_occurrence_sum = numpy.sum(vectorizer.fit_transform(histograms_list), axis=0)
-
-    # build an array where the elements are the features (grams) in the same order of the feature_occurence_sum columns
-    inverse_vocabulary_array = numpy.empty(len(vectorizer.vocabulary_.keys()), dtype='object')
-    for gram in vectorizer.vocabulary_.keys():
-        inverse_vocabulary_array[vectorizer.vocabulary_[gram]] = gram
-
-    # find the hapax legomena
-    hapax_legomena = []
-    for i in range(len(feature_occurrence_sum)):
-        if feature_occurrence_sum[i] == 1.0:
-            hapax_legomena.append(inverse_vocabulary_array[i])
-    
-    # remove the hapax legomena
-    for hapax in hapax_legomena:
-        for histogram in histograms_list:
-            if hapax in histogram:
-                del histogram[hapax]
-
-
-def add_postag_id(histogram):
-    aux = {}
-    postag_id = 1
-    for gram in histogram.keys():
-        aux[(postag_id, gram)] = histogram[gram]
-    return aux
-
-
-def ngrams_generator(tweets, features, save_dir):
+def sequence_ngrams_histograms(tokens, orders):
+    """
+    Histograms of the n-grams of tokens for each n of orders. The first and
+        last tokens are the begin/end identifiers, which are not 1-grams.
+    Returns a dict mapping each n to its histogram.
+    """
+    histograms = {}
+    for n in orders:
+        histogram = {}
+        sequence = tokens[1:-1] if n == 1 else tokens
+        # zipping the shifted sequences builds the grams without a Python level loop
+        for gram in itertools.izip(*[sequence[i:] for i in range(n)]):
+            if gram in histogram:
+                histogram[gram] += 1
+            else:
+                histogram[gram] = 1
+        histograms[n] = histogram
+    return histograms
+
+
+def save_histograms(gram_list, kind, save_dir, hashing_bits, grams):
+    if hashing_bits:
+        feature_store.save_csr(save_dir, kind, feature_store.hash_histograms(gram_list, kind, hashing_bits, grams))
+    else:
+        feature_store.save_csr(save_dir, kind, feature_store.index_histograms(gram_list, kind, grams))
+
+
+def ngrams_generator(tweets, features, save_dir, hashing_bits=None):
+    """
+    Generates and saves the histograms of each feature kind as CSR arrays of
+        the ids of the grams in the author's vocabulary or, when hashing_bits
+        is given, of their hashed ids (see feature_store).
+    """
     char_word_len = None
+    grams = {} if hashing_bits else []      # side table of the hashed ids or vocabulary
     if 'char-4-gram' in features:
         logging.debug('\tGenerating char-4-gram features ...')
         gram_list = []
         for tweet in tweets:
-            grams = ngrams(u' ' + tweet['tweet'] + u' ', 4)         # adding space as delimiter
-            gram_list.append(grams_histogram(grams))
+            gram_list.append(char_ngrams_histogram(u' ' + tweet['tweet'] + u' ', 4))     # adding space as delimiter
 
         char_word_len = len(gram_list)
         logging.debug('\tRemoving \'hapax legomena\' ...')
         remove_hapax_legomena(gram_list)
-        sklearn.externals.joblib.dump(gram_list, os.sep.join([save_dir, 'char-4-gram.pkl']))
-
-    tweets_words = []
-    logging.debug('\tRemoving the punctuation of tweets to generate word grams ...')
-    punctuation = u'\\!\\"\\#\\$\\%\\&\\\'\\(\\)\\*\\+\\,\\-\\.\\/\\:\\;\\<\\=\\>\\?\\@\\[\\\\\\]\\^\\_\\`\\{\\|\\}\\~'     # source: re.escape(string.punctuation)
-    for tweet in tweets:
-        words = re.sub(u''.join([u'[', punctuation, u']']), '', tweet['tweet']).split()
-        tweets_words.append([u'\x02'] + words + [u'\x03'])          # apply \x02 and \x03 as begin/end identifiers
-
-    for i in range(1,6):
-        if ''.join(['word-', str(i), '-gram']) in features:
-            logging.debug(''.join(['\tGenerating word-', str(i), '-gram features ...']))
-            gram_list = []
-            for tweet in tweets_words:
-                if i == 1:
-                    grams = ngrams(tweet[1:-1], i)                  # do not consider begin/end identifiers in case of word-1-grams
-                else:
-                    grams = ngrams(tweet, i)
-                gram_list.append(grams_histogram(grams))
+        save_histograms(gram_list, 'char-4-gram', save_dir, hashing_bits, grams)
+
+    word_orders = [i for i in range(1,6) if ''.join(['word-', str(i), '-gram']) in features]
+    if word_orders:
+        logging.debug('\tRemoving the punctuation of tweets to generate word grams ...')
+        punctuation = u'\\!\\"\\#\\$\\%\\&\\\'\\(\\)\\*\\+\\,\\-\\.\\/\\:\\;\\<\\=\\>\\?\\@\\[\\\\\\]\\^\\_\\`\\{\\|\\}\\~'     # source: re.escape(string.punctuation)
+        punctuation_regex = re.compile(u''.join([u'[', punctuation, u']']))
+        logging.debug(''.join(['\tGenerating word-n-gram features, n = ', str(word_orders), ' ...']))
+        tweets_histograms = []
+        for tweet in tweets:
+            words = punctuation_regex.sub('', tweet['tweet']).split()
+            tweets_histograms.append(sequence_ngrams_histograms([u'\x02'] + words + [u'\x03'], word_orders))    # apply \x02 and \x03 as begin/end identifiers
+
+        for i in word_orders:
+            gram_list = [histograms[i] for histograms in tweets_histograms]
             if not char_word_len:
                 char_word_len = len(gram_list)
             logging.debug('\tRemoving \'hapax legomena\' ...')
             remove_hapax_legomena(gram_list)
-            sklearn.externals.joblib.dump(gram_list, ''.join([save_dir, os.sep, 'word-', str(i), '-gram.pkl']))
-
-    tweets_pos = []
-    for tweet in tweets:
-        if tweet['pos']:
-            tweets_pos.append([u'\x02'] + tweet['pos'].split() + [u'\x03'])     # apply \x02 and \x03 as begin/end identifiers
-    for i in range(1,6):
-        if ''.join(['pos-', str(i), '-gram']) in features:
-            logging.debug(''.join(['\tGenerating pos-', str(i), '-gram features ...']))
-            gram_list = []
-            for tweet in tweets_pos:
-                if i == 1:
-                    grams = ngrams(tweet[1:-1], i)                  # do not consider begin/end identifiers in case of pos-1-grams
-                else:
-                    grams = ngrams(tweet, i)
-                gram_list.append(add_postag_id(grams_histogram(grams)))         # add an element in the pos-tag gram identifier to not mix up these grams with other char/word grams
+            save_histograms(gram_list, ''.join(['word-', str(i), '-gram']), save_dir, hashing_bits, grams)
+
+    pos_orders = [i for i in range(1,6) if ''.join(['pos-', str(i), '-gram']) in features]
+    if pos_orders:
+        logging.debug(''.join(['\tGenerating pos-n-gram features, n = ', str(pos_orders), ' ...']))
+        tweets_histograms = []
+        for tweet in tweets:
+            if tweet['pos']:
+                tweets_histograms.append(sequence_ngrams_histograms([u'\x02'] + tweet['pos'].split() + [u'\x03'], pos_orders))     # apply \x02 and \x03 as begin/end identifiers
+
+        for i in pos_orders:
+            gram_list = [histograms[i] for histograms in tweets_histograms]     # the ids are already namespaced by the feature kind
             if char_word_len and char_word_len != len(gram_list):
                 logging.error(''.join(['Tweet messages and POS Tags with different sizes for author ', os.path.basename(save_dir), ': ', str(char_word_len), ' and ', str(len(gram_list)), ' respectively. Quitting ...']))
                 sys.exit(1)
             logging.debug('\tRemoving \'hapax legomena\' ...')
             remove_hapax_legomena(gram_list)
-            sklearn.externals.joblib.dump(gram_list, ''.join([save_dir, os.sep, 'pos-', str(i), '-gram.pkl']))
+            save_histograms(gram_list, ''.join(['pos-', str(i), '-gram']), save_dir, hashing_bits, grams)
+
+    if hashing_bits:
+        feature_store.save_hashed_grams(save_dir, hashing_bits, grams)
+    else:
+        feature_store.save_vocabulary(save_dir, grams)
+
+
+def file_hash(filename):
+    sha1 = hashlib.sha1()
+    with open(filename, mode='rb') as fd:
+        for block in iter(lambda: fd.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+def save_manifest(dest_dir, features, hashing_bits, files_hashes):
+    """
+    Saves the features and hashing bits of the run and the content hash of
+        each author's file, by file basename, the n-grams in dest_dir were
+        generated from.
+    """
+    sklearn.externals.joblib.dump({'features': list(features), 'hashing_bits': hashing_bits, 'files': files_hashes},
+                                  os.sep.join([dest_dir, manifest_filename]))
+
+
+def load_manifest(dest_dir):
+    filename = os.sep.join([dest_dir, manifest_filename])
+    if not os.path.exists(filename):
+        return None
+    return sklearn.externals.joblib.load(filename)
+
+
+def author_dirname(filename, dest_dir):
+    return os.sep.join([dest_dir, os.path.splitext(os.path.basename(filename))[0]])
+
+
+def generate_author_ngrams(filename, dest_dir, features, hashing_bits=None):
+    logging.debug(''.join(['Reading tweets and generating n-grams for file ', filename, ' ...']))
+    author_dir = author_dirname(filename, dest_dir)
+    os.makedirs(author_dir)
+    ngrams_generator(messages_persistence.read(filename), features, author_dir, hashing_bits)
+
+
+def stale_authors(dest_dir, manifest, files_hashes):
+    """
+    Returns the basenames of the files whose author directories in dest_dir
+        are stale, as the files changed or were removed since the manifest
+        was saved or their content is unknown, and the basenames of the files
+        to generate again, new or changed.
+    """
+    stale_basenames = [basename for basename, file_hash in manifest['files'].iteritems() if files_hashes.get(basename) != file_hash]
+    stale_basenames += [basename for basename in files_hashes if basename not in manifest['files'] and os.path.exists(author_dirname(basename, dest_dir))]
+    changed_basenames = sorted(basename for basename in files_hashes if manifest['files'].get(basename) != files_hashes[basename])
+    return stale_basenames, changed_basenames
+
+
+def update_ngrams(source_dir_data, dest_dir, features, hashing_bits=None, workers=1):
+    """
+    Generates the n-grams of the authors of source_dir_data whose files are new
+        or changed since the last run in dest_dir, removes those of the stale
+        authors, and updates the corpus vocabulary and the manifest. Returns
+        the corpus vocabulary.
+    The saved corpus vocabulary is deleted before any author directory is
+        touched, so that a run interrupted from then on builds it again from
+        all the authors.
+    """
+    files_hashes = {}
+    for filename in glob.glob(os.sep.join([source_dir_data, '*.dat'])):
+        files_hashes[os.path.basename(filename)] = file_hash(filename)
+
+    manifest = load_manifest(dest_dir) or {'features': features, 'hashing_bits': hashing_bits, 'files': {}}
+    if sorted(manifest['features']) != sorted(features) or manifest['hashing_bits'] != hashing_bits:
+        logging.error(''.join(['Output directory generated with features ', str(manifest['features']), ' and hashing bits ', str(manifest['hashing_bits']),
+                               '. Quitting ...']))
+        sys.exit(1)
+    stale_basenames, changed_basenames = stale_authors(dest_dir, manifest, files_hashes)
+    logging.info(''.join(['Updating ', str(len(changed_basenames)), ' authors and removing ', str(len(set(stale_basenames) - set(files_hashes))), ' authors ...']))
+
+    vocabulary = None
+    if feature_store.is_corpus_vocabulary(dest_dir) and (stale_basenames or changed_basenames):
+        vocabulary = feature_store.load_corpus_vocabulary(dest_dir)
+        feature_store.remove_corpus_vocabulary_info(dest_dir)
+    for basename in stale_basenames:
+        author_dir = author_dirname(basename, dest_dir)
+        if os.path.exists(author_dir):
+            if vocabulary is not None:
+                vocabulary.remove_author(feature_store.FeatureStore(author_dir))
+            shutil.rmtree(author_dir)
+
+    filenames = [os.sep.join([source_dir_data, basename]) for basename in changed_basenames]
+    num_files = len(filenames)      # processing feedback
+    i = 0                           # processing feedback
+    logging.info('Reading dataset and generating n-grams ...')
+    for _ in authors_pool.map_authors(functools.partial(generate_author_ngrams, dest_dir=dest_dir, features=features, hashing_bits=hashing_bits), filenames, workers):
+        i += 1
+        sys.stderr.write(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))   # processing feedback
+
+    if vocabulary is not None:
+        logging.info('Updating the corpus vocabulary ...')
+        for filename in filenames:
+            vocabulary.add_author(feature_store.FeatureStore(author_dirname(filename, dest_dir)))
+        vocabulary.save()
+    elif feature_store.is_corpus_vocabulary(dest_dir):
+        vocabulary = feature_store.load_corpus_vocabulary(dest_dir)     # up to date
+    else:
+        logging.info('Building the corpus vocabulary ...')
+        vocabulary = feature_store.build_corpus_vocabulary(dest_dir)
+    logging.info(''.join(['Corpus vocabulary of ', str(len(vocabulary)), ' grams.']))
+    save_manifest(dest_dir, features, hashing_bits, files_hashes)
+    return vocabulary
 
 
 if  __name__ == '__main__':
@@ -175,26 +322,16 @@ if  __name__ == '__main__':
                            '\n\tsource directory data = ', args.source_dir_data,
                            '\n\toutput directory = ', args.dest_dir,
                            '\n\tfeatures = ', str(args.features),
+                           '\n\thashing bits = ', str(args.hashing_bits),
                            '\n\tdebug = ', str(args.debug),
                          ]))
 
-    logging.info('Creating output directory ...')
-    if os.path.exists(args.dest_dir):
-        logging.error('Output directory already exists. Quitting ...')
-        sys.exit(1)
-    os.makedirs(args.dest_dir)
-
-    author_dirnames = glob.glob(os.sep.join([args.source_dir_data, '*.dat']))
-    num_files = len(author_dirnames)    # processing feedback
-    i = 0                               # processing feedback
-    logging.info('Reading dataset and generating n-grams ...')
-    for filename in author_dirnames:
-        sys.stderr.write(''.join(['\t', str(i), '/', str(num_files), ' files processed\r']))   # processing feedback
-        i += 1
-        logging.debug(''.join(['Reading tweets and generating n-grams for file ', filename, ' ...']))
-        author_dir = os.sep.join([args.dest_dir, os.path.splitext(os.path.basename(filename))[0]])
-        os.makedirs(author_dir)
-        ngrams_generator(messages_persistence.read(filename), args.features, author_dir)
+    if not args.incremental or not os.path.exists(args.dest_dir):
+        logging.info('Creating output directory ...')
+        if os.path.exists(args.dest_dir):
+            logging.error('Output directory already exists. Quitting ...')
+            sys.exit(1)
+        os.makedirs(args.dest_dir)
+    update_ngrams(args.source_dir_data, args.dest_dir, args.features, args.hashing_bits, args.workers)
 
     logging.info('Finishing ...')
-    
@@ -0,0 +1,94 @@
+# coding=utf-8
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import feature_store
+import messages_persistence
+import ngrams_generator
+
+
+class ngrams_generator_test(unittest.TestCase):
+    def test_char_ngrams_histogram(self):
+        self.assertEqual({(u' ', u'a', u'b', u'a'): 1, (u'a', u'b', u'a', u'b'): 1, (u'b', u'a', u'b', u'a'): 1, (u'a', u'b', u'a', u' '): 1},
+                         ngrams_generator.char_ngrams_histogram(u' ababa ', 4))
+        self.assertEqual({(u' ', u'a', u'a', u'a'): 1, (u'a', u'a', u'a', u'a'): 2, (u'a', u'a', u'a', u' '): 1},
+                         ngrams_generator.char_ngrams_histogram(u' aaaaa ', 4))
+        self.assertEqual({(u' ', u'ç', u'ã', u' '): 1}, ngrams_generator.char_ngrams_histogram(u' çã ', 4))
+        # texts shorter than n
+        self.assertEqual({}, ngrams_generator.char_ngrams_histogram(u' a ', 4))
+        self.assertEqual({}, ngrams_generator.char_ngrams_histogram(u'', 4))
+
+    def test_sequence_ngrams_histograms(self):
+        tokens = [u'\x02', u'a', u'b', u'a', u'\x03']
+        self.assertEqual({1: {(u'a',): 2, (u'b',): 1},      # the 1-grams leave the begin/end identifiers out
+                          2: {(u'\x02', u'a'): 1, (u'a', u'b'): 1, (u'b', u'a'): 1, (u'a', u'\x03'): 1},
+                          3: {(u'\x02', u'a', u'b'): 1, (u'a', u'b', u'a'): 1, (u'b', u'a', u'\x03'): 1},
+                          4: {(u'\x02', u'a', u'b', u'a'): 1, (u'a', u'b', u'a', u'\x03'): 1},
+                          5: {(u'\x02', u'a', u'b', u'a', u'\x03'): 1},
+                         },
+                         ngrams_generator.sequence_ngrams_histograms(tokens, range(1, 6)))
+        self.assertEqual({2: {(u'\x02', u'a'): 1, (u'a', u'\x03'): 1}, 4: {}},
+                         ngrams_generator.sequence_ngrams_histograms([u'\x02', u'a', u'\x03'], [2, 4]))
+        # a tweet without words, shorter than all the orders but 2
+        self.assertEqual({1: {}, 2: {(u'\x02', u'\x03'): 1}, 3: {}, 4: {}, 5: {}},
+                         ngrams_generator.sequence_ngrams_histograms([u'\x02', u'\x03'], range(1, 6)))
+
+    def test_update_ngrams(self):
+        features = ['char-4-gram', 'word-1-gram', 'word-2-gram']
+        for hashing_bits in [None] + feature_store.hashing_bits_choices[:1]:
+            work_dir = tempfile.mkdtemp()
+            source_dir_data = os.path.join(work_dir, 'source')
+            dest_dir = os.path.join(work_dir, 'ngrams')
+            os.mkdir(source_dir_data)
+            os.mkdir(dest_dir)
+            try:
+                def write(author, tweets):
+                    messages_persistence.write([{'tweet': tweet} for tweet in tweets * 2], 'tweet', os.path.join(source_dir_data, author + '.dat'))
+
+                def check(vocabulary):
+                    # the updated vocabulary counts as the one built from all the authors
+                    full = feature_store.build_corpus_vocabulary(dest_dir, save=False)
+                    self.assertEqual(dict((full.key(corpus_id), full.df[corpus_id]) for corpus_id in range(len(full))),
+                                     dict((vocabulary.key(corpus_id), vocabulary.df[corpus_id]) for corpus_id in range(len(vocabulary)) if vocabulary.df[corpus_id]))
+                    stores = [feature_store.FeatureStore(author_dir) for author_dir in feature_store.corpus_author_dirs(dest_dir)]
+                    tweet_idxs_list = [range(store.num_tweets('word-1-gram')) for store in stores]
+                    self.assertEqual(self.keyed_rows(feature_store.stack(stores, tweet_idxs_list, features, full), full),
+                                     self.keyed_rows(feature_store.stack(stores, tweet_idxs_list, features, vocabulary), vocabulary))
+                    return sorted(os.path.basename(store.author_dir) for store in stores)
+
+                write('a', [u'the cat sat', u'a cat'])
+                write('b', [u'the dog ran', u'a dog'])
+                write('c', [u'the bird flew'])
+                self.assertEqual(['a', 'b', 'c'], check(ngrams_generator.update_ngrams(source_dir_data, dest_dir, features, hashing_bits)))
+
+                # an author removed, one changed and one added, in a run interrupted while generating
+                os.remove(os.path.join(source_dir_data, 'a.dat'))
+                write('b', [u'the dog sat', u'a fish'])
+                write('d', [u'the cat flew'])
+                generate_author_ngrams = ngrams_generator.generate_author_ngrams
+                ngrams_generator.generate_author_ngrams = lambda *args, **kwargs: 1 / 0
+                try:
+                    self.assertRaises(ZeroDivisionError, ngrams_generator.update_ngrams, source_dir_data, dest_dir, features, hashing_bits)
+                finally:
+                    ngrams_generator.generate_author_ngrams = generate_author_ngrams
+                self.assertFalse(feature_store.is_corpus_vocabulary(dest_dir))
+                self.assertEqual(['b', 'c', 'd'], check(ngrams_generator.update_ngrams(source_dir_data, dest_dir, features, hashing_bits)))
+
+                # updated from the saved vocabulary
+                os.remove(os.path.join(source_dir_data, 'd.dat'))
+                write('c', [u'the bird sat'])
+                write('e', [u'a bird ran'])
+                self.assertEqual(['b', 'c', 'e'], check(ngrams_generator.update_ngrams(source_dir_data, dest_dir, features, hashing_bits)))
+                self.assertEqual(['b', 'c', 'e'], check(ngrams_generator.update_ngrams(source_dir_data, dest_dir, features, hashing_bits)))  # up to date
+            finally:
+                shutil.rmtree(work_dir)
+
+    def keyed_rows(self, matrix, vocabulary):
+        return [dict((vocabulary.key(column), count) for column, count in zip(matrix.getrow(row).indices, matrix.getrow(row).data)) for row in range(matrix.shape[0])]
+
+
+if __name__ == '__main__':
+    unittest.main()
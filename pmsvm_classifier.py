@@ -10,12 +10,12 @@ Logic in pseudo-code
         2.1 - Sample the authors
         2.2 - For each sampled author
             2.2.1 - Read and sample the tweets ngrams
-        2.3 - Fold the sampled dataset (list of histograms)
+        2.3 - Fold the sampled dataset (sparse matrix of the histograms)
         2.4 - For each fold
             2.4.1 - Remove 'hapax legomena' from the training set
             2.4.2 - Fit the vectorizer based on training set
             2.4.3 - Define training/test feature vectors through the vectorizer learned
-            2.4.4 - Train and run the classifier
+            2.4.4 - Train and run the classifier (PmSVM or an in-process backend)
             2.4.5 - Register accuracy for this fold
         2.5 - Calculate accuracy for this run
     3 - Calculate accuracy for this experiment
@@ -28,15 +28,19 @@ import logging
 import os
 import sys
 import glob
+import functools
+import hashlib
 import random
+import subprocess
+import sklearn.base
 import sklearn.cross_validation
-import sklearn.feature_extraction
-import sklearn.externals.joblib
-import copy
+import sklearn.linear_model
+import sklearn.svm
 import scipy
 import numpy
-import itertools
 import re
+import feature_store
+import authors_pool
 
 
 
@@ -53,6 +57,36 @@ features_list = ['char-4-gram',
                  'pos-5-gram',
                 ]
 
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    # positional arguments, in the order of the former command line
+    parser.add_argument('source_dir_data', help='Directory where the authors\' n-grams are stored.')
+    parser.add_argument('output_dir', help='Directory where the classification files will be written.')
+    parser.add_argument('min_tweets', type=int, help='Minimal number of tweets of the selected authors.')
+    parser.add_argument('validation_folding', type=int, help='Number of folds in cross validation.')
+    parser.add_argument('repetitions', type=int, help='Number of runs of the experiment.')
+    parser.add_argument('num_authors', type=int, help='Number of authors sampled in each run.')
+    parser.add_argument('num_tweets', type=int, help='Number of tweets sampled from each author.')
+    parser.add_argument('features')
+    parser.add_argument('debug')
+    parser.add_argument('--backend', '-b',
+                        dest='backend',
+                        choices=sorted(backends),
+                        default='pmsvm',
+                        help='Classifier of the folds. Default = pmsvm.')
+    parser.add_argument('--jobs', '-j',
+                        dest='jobs',
+                        type=int,
+                        default=1,
+                        help='Number of processes running the folds of all the runs. Default = 1.')
+    parser.add_argument('--seed',
+                        dest='seed',
+                        type=int,
+                        default=None,
+                        help='Seed of the sampling of the runs, for reproducible experiments. Default = random.')
+    return parser.parse_args()
+
+
 def filter_authors(source_dir_data, threshold):
     selected_filenames = []
     for filename in glob.glob(os.sep.join([source_dir_data, '*'])):
@@ -61,51 +95,152 @@ def filter_authors(source_dir_data, threshold):
     return selected_filenames
 
 
-def sample_tweets(authors_list, num_tweets, features):
-    tweets_sampled = {}
+def sample_tweets(authors_list, num_tweets, features, vocabulary, rng=random):
+    """
+    Returns the CSR matrix of num_tweets tweets sampled from each author, in
+        blocks of rows in the order of the authors, whose columns are the
+        corpus ids of the vocabulary (see feature_store.stack).
+    """
+    stores = []
+    tweet_idxs_list = []
     for author in authors_list:
         logging.debug(''.join(['\t\tSampling tweets from author ', os.path.basename(author), ' ...']))
-        author_features_list = []
-        for feature in features:
-            logging.debug(''.join(['\t\t\tReading feature ' , feature, ' ...']))
-            author_features_list.append(sklearn.externals.joblib.load(''.join([author, os.sep, feature, '.pkl'])))
-
-        if len(author_features_list) > 0:
-            tweets_sampled[author] = list(author_features_list[0])
-        for feature in author_features_list[1:]:
-            for i in range(len(tweets_sampled[author])):
-                tweets_sampled[author][i].update(feature[i])
-
-        random.shuffle(tweets_sampled[author])
-        tweets_sampled[author] = tweets_sampled[author][0:num_tweets]
-
-    return tweets_sampled
-
-
-def remove_hapax_legomena(histograms_list):
-    if not histograms_list:
-        return
-
-    # sum the occurrence of each feature (gram) through numpy operations
-    vectorizer = sklearn.feature_extraction.DictVectorizer(sparse=False)
-    feature_occurrence_sum = numpy.sum(vectorizer.fit_transform(histograms_list), axis=0)
-
-   # build an array where the elements are the features (grams) in the same order of the feature_occurence_sum columns
-    inverse_vocabulary_array = numpy.empty(len(vectorizer.vocabulary_.keys()), dtype='object')
-    for gram in vectorizer.vocabulary_.keys():
-        inverse_vocabulary_array[vectorizer.vocabulary_[gram]] = gram
-
-    # find the hapax legomena
-    hapax_legomena = []
-    for i in range(len(feature_occurrence_sum)):
-        if feature_occurrence_sum[i] == 1.0:
-            hapax_legomena.append(inverse_vocabulary_array[i])
-
-    # remove the hapax legomena
-    for hapax in hapax_legomena:
-        for histogram in histograms_list:
-            if hapax in histogram:
-                del histogram[hapax]
+        store = feature_store.FeatureStore(author)
+        tweet_idxs = range(store.num_tweets(features[0]))
+        rng.shuffle(tweet_idxs)
+        stores.append(store)
+        tweet_idxs_list.append(tweet_idxs[0:num_tweets])
+
+    return feature_store.stack(stores, tweet_idxs_list, features, vocabulary)
+
+
+libsvm_chunk_size = 1 << 20    # non-zeros formatted at once by write_libsvm
+pmsvm_compiler_flags = ['-O3']
+run_tweets_sampled = None      # the tweets of the run being classified (see classify_runs)
+
+
+def decimal_bytes(values):
+    """
+    Returns the uint8 matrix of the ASCII decimal representation of each value
+        of the array, one row per value, right aligned and padded with zeros,
+        so that the characters of all the values in order are the non-zero
+        bytes of the matrix.
+    Integers are formatted arithmetically, digit by digit over the whole array,
+        other types through numpy's conversion to strings.
+    """
+    values = numpy.asarray(values)
+    if not numpy.issubdtype(values.dtype, numpy.integer):
+        strings = values.astype(bytes)
+        return strings.view(numpy.uint8).reshape(len(strings), strings.itemsize)
+    negative = values < 0
+    magnitudes = numpy.abs(values.astype(numpy.int64))
+    num_digits = numpy.ones(len(values), dtype=numpy.int64)
+    power = 10
+    while len(values) and power <= magnitudes.max():
+        num_digits += magnitudes >= power
+        power *= 10
+    width = int(num_digits.max()) + int(negative.any()) if len(values) else 1
+    matrix = numpy.zeros((len(values), width), dtype=numpy.uint8)
+    for position in range(int(num_digits.max()) if len(values) else 0):
+        digits = magnitudes % 10
+        magnitudes //= 10
+        matrix[:, width - 1 - position] = numpy.where(position < num_digits, digits + ord('0'), 0)
+    matrix[negative, width - 1 - num_digits[negative]] = ord('-')
+    return matrix
+
+
+def write_libsvm(fd, x, y, binary=False, chunk_size=libsvm_chunk_size):
+    """
+    Writes the rows of the CSR matrix x labelled by y (a column matrix or a
+        sequence) to the file fd, opened in binary mode, in libsvm format:
+        'label index:value ... \\n', the indexes starting at 1.
+    The rows are formatted in chunks of about chunk_size non-zeros straight
+        from the indptr/indices/data arrays: each label, token ' index:value'
+        and line ending is a row of a byte matrix laid out in the order of the
+        file, whose non-zero bytes are written at once.
+    When binary is set, the values are not formatted: the stored non-zeros
+        are active and written as ':1'.
+    """
+    x = x.tocsr()
+    if not x.has_sorted_indices:
+        x = x.sorted_indices()
+    labels = numpy.asarray(y).ravel()
+    indptr = x.indptr
+    row_start = 0
+    while row_start < x.shape[0]:
+        # the rows of the chunk, at least one
+        row_end = max(row_start + 1, numpy.searchsorted(indptr, indptr[row_start] + chunk_size, side='right') - 1)
+        row_end = min(row_end, x.shape[0])
+        offsets = indptr[row_start:row_end + 1] - indptr[row_start]
+        lengths = numpy.diff(offsets)
+        indices = x.indices[indptr[row_start]:indptr[row_end]]
+        if binary:
+            active = x.data[indptr[row_start]:indptr[row_end]] != 0
+            if not active.all():
+                lengths = numpy.diff(numpy.append(0, numpy.cumsum(active))[offsets])
+                indices = indices[active]
+            values = numpy.ones((len(indices), 1), dtype=numpy.uint8) * ord('1')
+        else:
+            values = decimal_bytes(x.data[indptr[row_start]:indptr[row_end]])
+        indexes = decimal_bytes(indices.astype(numpy.int64) + 1)
+        label_bytes = decimal_bytes(labels[row_start:row_end])
+
+        # token ' index:value' of each non-zero
+        tokens = numpy.zeros((len(indices), 2 + indexes.shape[1] + values.shape[1]), dtype=numpy.uint8)
+        tokens[:, 0] = ord(' ')
+        tokens[:, 1:1 + indexes.shape[1]] = indexes
+        tokens[:, 1 + indexes.shape[1]] = ord(':')
+        tokens[:, 2 + indexes.shape[1]:] = values
+
+        # each row is its label, its tokens and the line ending ' \n'
+        width = max(tokens.shape[1], label_bytes.shape[1], 2)
+        items = numpy.zeros((len(indices) + 2 * len(lengths), width), dtype=numpy.uint8)
+        heads = numpy.cumsum(numpy.append(0, lengths[:-1] + 2))
+        items[heads, :label_bytes.shape[1]] = label_bytes
+        items[heads + lengths + 1, :2] = [ord(' '), ord('\n')]
+        is_token = numpy.ones(len(items), dtype=bool)
+        is_token[heads] = False
+        is_token[heads + lengths + 1] = False
+        items[is_token, :tokens.shape[1]] = tokens
+        fd.write(items[items != 0].tobytes())
+        row_start = row_end
+
+
+def compile_pmsvm(script_dir, flags=pmsvm_compiler_flags):
+    """
+    Compiles the PmSVM classifier unless its binary was built from the same
+        source with the same compiler flags, as recorded in a stamp file next
+        to the binary (the SHA-1 of the source and the flags).
+    Returns whether the classifier was compiled. Exits if the compilation
+        fails, logging the compiler's output.
+    """
+    pmsvm_dir = os.sep.join([script_dir, 'PmSVM'])
+    source_filename = os.sep.join([pmsvm_dir, 'PmSVM.cpp'])
+    binary_filename = os.sep.join([pmsvm_dir, 'pmsvm'])
+    stamp_filename = os.sep.join([pmsvm_dir, 'pmsvm.stamp'])
+    try:
+        with open(source_filename, mode='rb') as fd:
+            stamp = '\n'.join([hashlib.sha1(fd.read()).hexdigest(), ' '.join(flags)])
+    except IOError as error:
+        logging.error(''.join(['Error reading the PmSVM classifier source: ', str(error), ' . Exiting ...']))
+        sys.exit(1)
+    if os.path.exists(binary_filename) and os.path.exists(stamp_filename):
+        with open(stamp_filename) as fd:
+            if fd.read() == stamp:
+                return False
+        os.remove(stamp_filename)     # the binary is stale until it is rebuilt
+
+    command = ['g++'] + list(flags) + [source_filename, '-o', binary_filename]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.communicate()[0]
+    if process.returncode != 0:
+        logging.error(''.join(['Error compiling the PmSVM classifier. Error code = ', str(process.returncode), ' . Exiting ...\n', output]))
+        sys.exit(1)
+    if output:
+        logging.debug(''.join(['\tCompiler output:\n', output]))
+    with open(stamp_filename, mode='w') as fd:
+        fd.write(stamp)
+    return True
 
 
 def classify(x_train, y_train, x_test, y_test, work_dir):
@@ -118,24 +253,10 @@ def classify(x_train, y_train, x_test, y_test, work_dir):
 
     pmsvm_classifier_stdout_filename = os.sep.join([work_dir, 'pmsvm_stdout.log'])
     pmsvm_classifier_stderr_filename = os.sep.join([work_dir, 'pmsvm_stderr.log'])
-    with open(pmsvm_classifier_train_filename, mode='w') as fd:
-        for row_idx in range(x_train.shape[0]):
-            sample = [ str(y_train[row_idx, 0]) ]
-            row = x_train.getrow(row_idx)
-            row.sort_indices()
-            for idx,value in itertools.izip(row.indices, row.data):
-                sample.append(':'.join([str(idx+1), str(value)]))
-            sample.append('\n')
-            fd.write(' '.join(sample))
-    with open(pmsvm_classifier_test_filename, mode='w') as fd:
-        for row_idx in range(x_test.shape[0]):
-            sample = [ str(y_test[row_idx, 0]) ]
-            row = x_test.getrow(row_idx)
-            row.sort_indices()
-            for idx,value in itertools.izip(row.indices, row.data):
-                sample.append(':'.join([str(idx+1), str(value)]))
-            sample.append('\n')
-            fd.write(' '.join(sample))
+    with open(pmsvm_classifier_train_filename, mode='wb') as fd:
+        write_libsvm(fd, x_train, y_train, binary=True)
+    with open(pmsvm_classifier_test_filename, mode='wb') as fd:
+        write_libsvm(fd, x_test, y_test, binary=True)
 
     logging.debug('\t\tTraining and running the classifier ...')
     script_dir = os.path.dirname(os.path.realpath(__file__))
@@ -156,19 +277,174 @@ def classify(x_train, y_train, x_test, y_test, work_dir):
     return float(match.groups()[0])
 
 
-if  __name__ == '__main__':
-    # parsing arguments
+class ClassifierBackend(object):
+    """
+    Interface of the classifiers of the folds: prepare() is called once before
+        the folds are run, and classify() trains the classifier on a fold's
+        training set (CSR matrix of binary activations and column matrix of
+        the classes), runs it on its test set and returns the accuracy in
+        percentage. work_dir is the fold's own directory.
+    The backends are shared by the processes of the pool, so they must be
+        picklable.
+    """
+
+    def prepare(self):
+        pass
+
+    def classify(self, x_train, y_train, x_test, y_test, work_dir):
+        raise NotImplementedError
+
+
+class PmsvmBackend(ClassifierBackend):
+    """
+    The external Power Mean SVM classifier, compiled if needed, fed with the
+        folds through libsvm files.
+    """
+
+    def prepare(self):
+        logging.info('Compiling PmSVM classifier ...')
+        if not compile_pmsvm(os.path.dirname(os.path.realpath(__file__))):
+            logging.info('PmSVM classifier up to date.')
+
+    def classify(self, x_train, y_train, x_test, y_test, work_dir):
+        return classify(x_train, y_train, x_test, y_test, work_dir)
+
+
+class SklearnBackend(ClassifierBackend):
+    """
+    An in-process scikit-learn classifier, trained on the CSR matrices
+        themselves. The estimator is cloned for each fold.
+    """
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+
+    def classify(self, x_train, y_train, x_test, y_test, work_dir):
+        model = sklearn.base.clone(self.estimator)
+        model.fit(x_train, numpy.asarray(y_train).ravel())
+        return 100.0 * numpy.mean(model.predict(x_test) == numpy.asarray(y_test).ravel())
+
+
+backends = {'pmsvm': PmsvmBackend(),
+            'linear-svc': SklearnBackend(sklearn.svm.LinearSVC()),
+            'sgd': SklearnBackend(sklearn.linear_model.SGDClassifier(loss='hinge', max_iter=1000, tol=1e-3, random_state=0)),
+           }
+
+
+def classify_fold(fold, backend):
+    """
+    Builds the training/test sets of a fold of a run and classifies them
+        through the backend.
+    fold is the tuple (fold_dir, authors_sampled, num_tweets, train, test) of
+        the run whose tweets are in run_tweets_sampled, so that the folds can
+        be shared by a pool of processes without the tweets.
+    Returns the accuracy of the fold.
+    """
+    fold_dir, authors_sampled, num_tweets, train, test = fold
+    tweets_sampled = run_tweets_sampled
+    logging.info(''.join(['\tRunning fold ', fold_dir, ' ...']))
+    os.makedirs(fold_dir)
+    train_rows = []
+    test_rows = []
+    logging.debug('\t\tBuilding training/test sets...')
+    y_train = []
+    y_test = []
+    for class_id, author in enumerate(authors_sampled):
+        author_rows = class_id * num_tweets    # first row of the author's block
+        train_rows.append(author_rows + train)
+        test_rows.append(author_rows + test)
+        y_train += [class_id] * len(train)
+        y_test += [class_id] * len(test)
+    x_train = tweets_sampled[numpy.concatenate(train_rows)]     # tweets_sampled is shared by all the folds, and left untouched
+    for class_id, author in enumerate(authors_sampled):
+        logging.debug(''.join(['\t\t\tRemoving \'hapax legomena\' for author ', os.path.basename(author), '...']))
+        feature_store.remove_hapax_legomena(x_train, numpy.arange(class_id * len(train), (class_id + 1) * len(train)))
+    x_train.eliminate_zeros()
+    logging.debug('\t\tFitting and vectorizing the training set ...')
+    train_columns = numpy.unique(x_train.indices)     # the grams left in the training set
+    x_train = x_train[:, train_columns]
+    logging.debug('\t\tVectorizing the test set ...')
+    x_test = tweets_sampled[numpy.concatenate(test_rows)][:, train_columns]
+    logging.debug('\t\tTransforming the feature vector in a binary activation feature vector ...')
+    x_train = x_train.astype(bool).astype(int)
+    x_test = x_test.astype(bool).astype(int)
+    y_train = numpy.asmatrix(y_train).reshape(len(y_train), 1)
+    y_test = numpy.asmatrix(y_test).reshape(len(y_test), 1)
+
+    logging.debug('\t\tClassifying ...')
+    return backend.classify(x_train, y_train, x_test, y_test, fold_dir)
+
+
+def sample_runs(authors_list, output_dir, repetitions, num_authors, num_tweets, validation_folding, features, vocabulary, seed):
+    """
+    Samples the authors and tweets of each run and folds them, creating the
+        runs' directories in output_dir.
+    Each run samples with its own generator, seeded from seed, so that the runs
+        do not depend on the order the folds are run.
+    Yields the tweets and the list of the folds (see classify_fold) of each
+        run, one run at a time.
+    """
+    seeds_rng = random.Random(seed)
+    for run in range(1, repetitions+1):
+        logging.info('Run ' + str(run))
+        run_rng = random.Random(seeds_rng.randint(0, sys.maxint))
+        run_dir = ''.join([output_dir, os.sep,'run_', str(run).zfill(3)])
+        os.makedirs(run_dir)
+
+        logging.info('\tSampling the authors ...')
+        authors_sampled = list(authors_list) # copy the list
+        run_rng.shuffle(authors_sampled)
+        authors_sampled = authors_sampled[0:num_authors]
+        with open(''.join([run_dir, os.sep, 'sampled_authors.txt']), mode='w') as fd:
+            fd.write('\n'.join(authors_sampled))
+
+        logging.info('\tSampling the tweets ...')
+        tweets_sampled = sample_tweets(authors_sampled, num_tweets, features, vocabulary, run_rng)
+
+        logging.debug('\tFolding the dataset ...')
+        folds = sklearn.cross_validation.KFold(num_tweets, n_folds=validation_folding)
+        folds_list = []
+        fold_id = 0
+        for train, test in folds:
+            fold_id += 1
+            fold_dir = ''.join([run_dir, os.sep,'fold_', str(fold_id).zfill(2)])
+            folds_list.append((fold_dir, authors_sampled, num_tweets, train, test))
+        yield tweets_sampled, folds_list
+        del tweets_sampled      # not kept while the next run is sampled
+
+
+def classify_runs(authors_list, output_dir, repetitions, num_authors, num_tweets, validation_folding, features, vocabulary, seed, backend, jobs=1):
+    """
+    Classifies the folds of each run (see sample_runs) through the backend,
+        in jobs processes.
+    Only the tweets of the run being classified are kept in memory: the
+        forked processes of the run's pool inherit them in run_tweets_sampled
+        instead of receiving them with each fold.
+    Yields the list of the accuracies of the folds of each run, in order.
+    """
+    global run_tweets_sampled
+    for tweets_sampled, folds_list in sample_runs(authors_list, output_dir, repetitions, num_authors, num_tweets, validation_folding, features, vocabulary, seed):
+        run_tweets_sampled = tweets_sampled
+        del tweets_sampled
+        try:
+            fold_accuracies = list(authors_pool.map_authors(functools.partial(classify_fold, backend=backend), folds_list, jobs))
+        finally:
+            run_tweets_sampled = None
+        yield fold_accuracies
 
 
-    source_dir_data= sys.argv[1];
-    output_dir= sys.argv[2];
-    min_tweets= sys.argv[3];
-    validation_folding= int(sys.argv[4]);
-    repetitions = sys.argv[5];
-    num_authors = sys.argv[6];
-    num_tweets = int(sys.argv[7]);
-    features = sys.argv[8];
-    debug= sys.argv[9];
+if  __name__ == '__main__':
+    # parsing arguments
+    args = command_line_parsing()
+    source_dir_data = args.source_dir_data
+    output_dir = args.output_dir
+    min_tweets = args.min_tweets
+    validation_folding = args.validation_folding
+    repetitions = args.repetitions
+    num_authors = args.num_authors
+    num_tweets = args.num_tweets
+    features = args.features
+    debug = args.debug
 
     print('classifier ran successfully');
 
@@ -180,6 +456,8 @@ if  __name__ == '__main__':
     # logging configuration
     logging.basicConfig(level=logging.DEBUG if debug else logging.INFO, format='[%(asctime)s] - %(levelname)s - %(message)s')
 
+    seed = args.seed if args.seed is not None else random.SystemRandom().randint(0, sys.maxint)
+
     logging.info(''.join(['Starting the Power Mean SVM classification ...',
                            '\n\tsource directory data = ', source_dir_data,
                            '\n\toutput directory = ', output_dir,
@@ -189,6 +467,9 @@ if  __name__ == '__main__':
                            '\n\tnumber of authors = ', str(num_authors),
                            '\n\tnumber of tweets = ', str(num_tweets),
                            '\n\tfeatures = ', str(features),
+                           '\n\tbackend = ', args.backend,
+                           '\n\tjobs = ', str(args.jobs),
+                           '\n\tseed = ', str(seed),
                            '\n\tdebug = ', str(debug),
                          ]));
 
@@ -202,18 +483,8 @@ if  __name__ == '__main__':
         sys.exit(1)
     os.makedirs(output_dir)
 
-    logging.info('Compiling PmSVM classifier ...')
-
-    script_dir = os.path.dirname(os.path.realpath(__file__)) #returns the current working directory
-    #compiling PmSVM compiler here
-    #os.system is used to run command
-    #Both compliing and linking to from executable
-    ret_code = os.system(''.join(['g++ -O3 ',
-                            script_dir, os.sep, 'PmSVM', os.sep, 'PmSVM.cpp ',
-                            '-o ', script_dir, os.sep, 'PmSVM', os.sep, 'pmsvm']))
-    if ret_code != 0:
-        logging.error(''.join(['Error compiling the PmSVM classifier. Error code = ', str(ret_code), ' . Exiting ...']))
-        sys.exit(1)
+    backend = backends[args.backend]
+    backend.prepare()
 
     logging.info(''.join(['Filtering out authors with less than ', str(min_tweets), ' tweets ...']))
     authors_list = filter_authors(source_dir_data, min_tweets)
@@ -224,64 +495,14 @@ if  __name__ == '__main__':
     with open(''.join([output_dir, os.sep, 'filtered_authors.txt']), mode='w') as fd:
         fd.write('\n'.join(authors_list))
 
-    accuracy_accumulator = 0.0
-    for run in range(1, repetitions+1):
-        logging.info('Run ' + str(run))
-        run_dir = ''.join([output_dir, os.sep,'run_', str(run).zfill(3)])
-        os.makedirs(run_dir)
-
-        logging.info('\tSampling the authors ...')
-        authors_sampled = list(authors_list) # copy the list
-        random.shuffle(authors_sampled)
-        authors_sampled = authors_sampled[0:num_authors]
-        with open(''.join([run_dir, os.sep, 'sampled_authors.txt']), mode='w') as fd:
-            fd.write('\n'.join(authors_sampled))
-
-        logging.info('\tSampling the tweets ...')
-        tweets_sampled = sample_tweets(authors_sampled, num_tweets, features)
+    logging.info('Loading the corpus vocabulary ...')
+    vocabulary = feature_store.corpus_vocabulary(source_dir_data)
 
+    accuracy_accumulator = 0.0
+    for run, fold_accuracies in enumerate(classify_runs(authors_list, output_dir, repetitions, num_authors, num_tweets, validation_folding, features, vocabulary, seed, backend, args.jobs), 1):
         fold_accuracy_accumulator = 0.0
-        logging.debug('\tFolding the dataset ...')
-        folds = sklearn.cross_validation.KFold(num_tweets, n_folds=validation_folding)
-        fold_id = 0
-        for train, test in folds:
-            fold_id += 1
-            logging.info(''.join(['\tRunning fold ', str(fold_id), ' ...']))
-            fold_dir = ''.join([run_dir, os.sep,'fold_', str(fold_id).zfill(2)])
-            os.makedirs(fold_dir)
-            train_list = []
-            test_list = []
-            logging.debug('\t\tBuilding training/test sets...')
-            fold_tweets_sampled = copy.deepcopy(tweets_sampled)     # need to copy recursively all the data so that the hapax legomena step do not interfere in the other folds
-            author_train_start_idx = 0
-            class_id = 0
-            y_train = []
-            y_test = []
-            for author in fold_tweets_sampled.keys():
-                for idx in train:
-                    train_list.append(fold_tweets_sampled[author][idx])
-                logging.debug(''.join(['\t\t\tRemoving \'hapax legomena\' for author ', os.path.basename(author), '...']))
-                remove_hapax_legomena(train_list[author_train_start_idx:])
-                author_train_start_idx += len(train)
-                for idx in test:
-                    test_list.append(fold_tweets_sampled[author][idx])
-                y_train += [class_id] * len(train)
-                y_test += [class_id] * len(test)
-                class_id += 1
-            logging.debug('\t\tFitting and vectorizing the training set ...')
-            vectorizer = sklearn.feature_extraction.DictVectorizer()
-            x_train = vectorizer.fit_transform(train_list)
-            logging.debug('\t\tVectorizing the test set ...')
-            x_test = vectorizer.transform(test_list)
-            logging.debug('\t\tTransforming the feature vector in a binary activation feature vector ...')
-            x_train = x_train.astype(bool).astype(int)
-            x_test = x_test.astype(bool).astype(int)
-            y_train = numpy.asmatrix(y_train).reshape(len(y_train), 1)
-            y_test = numpy.asmatrix(y_test).reshape(len(y_test), 1)
-
-            logging.debug('\t\tClassifying ...')
-            fold_accuracy = classify(x_train, y_train, x_test, y_test, fold_dir)
-            logging.info(''.join(['\t\tFold ', str(fold_id), ' accuracy: ', str(fold_accuracy)]))
+        for fold_id, fold_accuracy in enumerate(fold_accuracies, 1):
+            logging.info(''.join(['\t\tRun ', str(run), ' fold ', str(fold_id), ' accuracy: ', str(fold_accuracy)]))
             fold_accuracy_accumulator += fold_accuracy
 
         run_accuracy = fold_accuracy_accumulator/validation_folding
@@ -0,0 +1,60 @@
+# coding=utf-8
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+import scipy.sparse
+
+import feature_store
+import pmsvm_classifier
+
+
+class pmsvm_classifier_test(unittest.TestCase):
+    def test_decimal_bytes(self):
+        for values in [[0, 7, 10, 123456, -1, -90], [0.5, 2.25]]:
+            matrix = pmsvm_classifier.decimal_bytes(numpy.array(values))
+            self.assertEqual([row[row != 0].tobytes() for row in matrix], [str(value) for value in values])
+
+    def test_write_libsvm(self):
+        x = scipy.sparse.csr_matrix((numpy.array([2, 1, 0, 12, 3]), numpy.array([9, 0, 4, 2, 0]), numpy.array([0, 2, 2, 5])), shape=(3, 10))
+        y = numpy.asmatrix([1, 0, 13]).reshape(3, 1)
+        for chunk_size in [1, 2, 1000]:
+            fd = io.BytesIO()
+            pmsvm_classifier.write_libsvm(fd, x, y, chunk_size=chunk_size)
+            self.assertEqual(fd.getvalue(), '1 1:1 10:2 \n0 \n13 1:3 3:12 5:0 \n')
+            fd = io.BytesIO()
+            pmsvm_classifier.write_libsvm(fd, x, y, binary=True, chunk_size=chunk_size)
+            self.assertEqual(fd.getvalue(), '1 1:1 10:1 \n0 \n13 1:1 3:1 \n')
+
+    def test_sklearn_backends(self):
+        x = scipy.sparse.csr_matrix(numpy.array([[1, 0, 0, 1], [1, 1, 0, 0], [0, 0, 1, 1], [0, 1, 1, 0]]))
+        y = numpy.asmatrix([0, 0, 1, 1]).reshape(4, 1)
+        for name in ['linear-svc', 'sgd']:
+            self.assertEqual(pmsvm_classifier.backends[name].classify(x, y, x, y, None), 100.0)
+
+    def test_classify_runs(self):
+        source_dir_data = os.sep.join([os.path.dirname(os.path.realpath(__file__)), 'Data5'])
+        authors_list = pmsvm_classifier.filter_authors(source_dir_data, 0)
+        vocabulary = feature_store.corpus_vocabulary(source_dir_data)
+        output_dir = tempfile.mkdtemp()
+        try:
+            # the same seed gives the same runs, whatever the number of processes
+            runs = [list(pmsvm_classifier.classify_runs(authors_list, os.sep.join([output_dir, str(i)]), 3, 2, 4, 2, pmsvm_classifier.features_list, vocabulary, 7,
+                                                        pmsvm_classifier.backends['linear-svc'], jobs))
+                    for i, jobs in enumerate([1, 3, 1])]
+            self.assertEqual(3, len(runs[0]))
+            self.assertEqual([2, 2, 2], [len(fold_accuracies) for fold_accuracies in runs[0]])
+            self.assertEqual(runs[0], runs[1])
+            self.assertEqual(runs[0], runs[2])
+            self.assertEqual(*[[open(os.sep.join([output_dir, str(i), run, 'sampled_authors.txt'])).read() for run in ['run_001', 'run_002', 'run_003']] for i in [0, 1]])
+            self.assertIsNone(pmsvm_classifier.run_tweets_sampled)
+        finally:
+            shutil.rmtree(output_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -10,28 +10,45 @@ The output files are renamed to have the number of tweets selected prefixed in
     their filenames.
 """
 
+import attribution_daemon
+if __name__ == '__main__':
+    attribution_daemon.run_as_client('attribute')      # before the heavy imports: runs in the daemon when one is listening
+
 import argparse
 import sys
 import os
 import glob
 import messages_persistence
+from ngrams_generator import ngrams_generator
+import feature_store
 import traceback
 import logging
 import re
 import codecs
 import itertools
-from nltk.util import ngrams
 import numpy
-import sklearn.feature_extraction
 import sklearn.externals.joblib
 import random
+import sklearn.base
 import sklearn.ensemble
+import sklearn.linear_model
+import sklearn.tree._tree
 from sklearn import svm
 from sklearn.svm import SVC
-import copy
 import scipy
 
 
+model_filename = 'rf_model.pkl'
+loaded_models = {}      # (saved time, model) by model directory
+modes = ['train-predict', 'train', 'predict', 'update']
+
+# the linear models trained next to the random forest: only the stochastic
+# gradient descent one is trained incrementally when the model is updated
+linear_models = {'svc': lambda: svm.SVC(kernel='linear', C=1.0),
+                 'sgd': lambda: sklearn.linear_model.SGDClassifier(loss='hinge', max_iter=1000, tol=1e-3, random_state=0),
+                }
+update_epochs = 20      # passes of partial_fit over the training set when updating the SGD model
+
 features_list = ['char-4-gram',
                  'word-1-gram',
                  'word-2-gram',
@@ -57,251 +74,164 @@ def filter_authors(source_dir_data, threshold):
 
 
 
-def sample_tweets(authors_list, num_tweets, features):
+def sample_tweets(authors_list, num_tweets, features, vocabulary):
+    """
+    Returns the CSR matrix of the first num_tweets tweets of each author,
+        whose columns are the corpus ids of the vocabulary (see
+        feature_store.stack), and the row of the first tweet of each author.
+    """
 
     print('Function ke andar')
-    tweets_sampled = {}
-    feature_kind_dict = {}      # Maps each gram (feature) to its kind (gram-4-gram, word-1-gram, pos-1-gram, ...)
-
+    stores = []
+    tweet_idxs_list = []
     for author in authors_list:
         print('For {}'.format(author))
-        #print('For1')
-        author_features_list = []
-        for feature in features:
-            #print('For2')
-            #print(author)
-            #print(os.sep)
-            #print(feature)
-            author_features_list.append(sklearn.externals.joblib.load(''.join([author, os.sep, feature, '.pkl'])))
-            #print('For2_2')
-            for tweet_histogram in author_features_list[-1]:
-                #print('For3')
-                for gram in tweet_histogram.keys():
-                    #print('For4')
-                    feature_kind_dict[gram] = feature
-                #print('OutFor4')
-            #print('OutFor3')
-        #print('OutFor2')
-        if len(author_features_list) > 0:
-            tweets_sampled[author] = list(author_features_list[0])
-        for feature in author_features_list[1:]:
-            for i in range(len(tweets_sampled[author])):
-                tweets_sampled[author][i].update(feature[i])
-        tweets_sampled[author] = tweets_sampled[author][0:num_tweets]
-    #print('OutFor1')
-    return tweets_sampled, feature_kind_dict
-
-
-def grams_histogram(grams):
-    histogram = {}
-    for gram in grams:
-        if gram in histogram:
-            histogram[gram] += 1
-        else:
-            histogram[gram] = 1
-    return histogram
-
-def build_inverse_vocabulary_array(vocabulary):
-    inverse_vocabulary_array = numpy.empty(len(vocabulary.keys()), dtype='object')
-    for key in vocabulary.keys():
-        inverse_vocabulary_array[vocabulary[key]] = key
-    return inverse_vocabulary_array
-
-
-def remove_hapax_legomena(histograms_list):
-    if not histograms_list:
-        return
-
-    # sum the occurrence of each feature (gram) through numpy operations
-    vectorizer = sklearn.feature_extraction.DictVectorizer(sparse=False)
-    feature_occurrence_sum = numpy.sum(vectorizer.fit_transform(histograms_list), axis=0)
-
-    # build an array where the elements are the features (grams) in the same order of the feature_occurence_sum columns
-    inverse_vocabulary_array = numpy.empty(len(vectorizer.vocabulary_.keys()), dtype='object')
-    for gram in vectorizer.vocabulary_.keys():
-        inverse_vocabulary_array[vectorizer.vocabulary_[gram]] = gram
-
-    # find the hapax legomena
-    hapax_legomena = []
-    for i in range(len(feature_occurrence_sum)):
-        if feature_occurrence_sum[i] == 1.0:
-            hapax_legomena.append(inverse_vocabulary_array[i])
-
-    # remove the hapax legomena
-    for hapax in hapax_legomena:
-        for histogram in histograms_list:
-            if hapax in histogram:
-                del histogram[hapax]
-
-
-def add_postag_id(histogram):
-    aux = {}
-    postag_id = 1
-    for gram in histogram.keys():
-        aux[(postag_id, gram)] = histogram[gram]
-    return aux
-
-
-def fit_classify(num_trees, x_train, y_train, x_test, y_test):
+        store = feature_store.FeatureStore(author)
+        stores.append(store)
+        tweet_idxs_list.append(range(min(num_tweets, store.num_tweets(features[0]))))
+    tweets_sampled = feature_store.stack(stores, tweet_idxs_list, features, vocabulary)
+    authors_rows = numpy.cumsum([0] + [len(tweet_idxs) for tweet_idxs in tweet_idxs_list[:-1]])
+    return tweets_sampled, authors_rows
+
+
+def training_set(authors_sampled, num_tweets, features, vocabulary):
+    """
+    Returns the training set of the authors: the first tweet of each author
+        (see sample_tweets) without its hapax legomena, in the columns of the
+        vocabulary.
+    """
+    tweets_sampled, authors_rows = sample_tweets(authors_sampled, num_tweets, features, vocabulary)
+
+    # the first tweet of each author
+    x_train = tweets_sampled[authors_rows]
+    # removing the 'hapax legomena' of each tweet (a single histogram per author)
+    x_train.data[x_train.data == 1] = 0
+    x_train.eliminate_zeros()
+    return x_train
+
+
+def fit(num_trees, x_train, y_train, linear_model='svc'):
+    """
+    Trains a random forest and a linear SVM (see linear_models) on the
+        training set, which may be the CSR matrix itself: both estimators
+        take it without densifying it.
+    """
     rf = sklearn.ensemble.RandomForestClassifier(n_estimators = num_trees, n_jobs = 6)
 
     #print("x_train:{}".format(x_train))
     #print("y_train:{}".format(y_train))
-    #print("x_test:{}".format(manoj))
-    #print("y_test:{}".format(y_test))
     rf.fit(x_train, y_train)
-    clf = svm.SVC(kernel='linear', C=1.0)
+    clf = linear_models[linear_model]()
     clf.fit(x_train,y_train)
-
-    # return the fitted model and the accuracy in percentage
-    return (rf, rf.predict(x_test),clf.predict(x_test))
-
-
-def ngrams_generator(tweets, features, save_dir):
-    char_word_len = None
-    if 'char-4-gram' in features:
-        logging.debug('\tGenerating char-4-gram features ...')
-        gram_list = []
-        for tweet in tweets:
-            grams = ngrams(u' ' + tweet['tweet'] + u' ', 4)  # adding space as delimiter
-            gram_list.append(grams_histogram(grams))
-
-        char_word_len = len(gram_list)
-        logging.debug('\tRemoving \'hapax legomena\' ...')
-        remove_hapax_legomena(gram_list)
-        sklearn.externals.joblib.dump(gram_list, os.sep.join([save_dir, 'char-4-gram.pkl']))
-
-    tweets_words = []
-    logging.debug('\tRemoving the punctuation of tweets to generate word grams ...')
-    punctuation = u'\\!\\"\\#\\$\\%\\&\\\'\\(\\)\\*\\+\\,\\-\\.\\/\\:\\;\\<\\=\\>\\?\\@\\[\\\\\\]\\^\\_\\`\\{\\|\\}\\~'  # source: re.escape(string.punctuation)
-    for tweet in tweets:
-        words = re.sub(u''.join([u'[', punctuation, u']']), '', tweet['tweet']).split()
-        tweets_words.append([u'\x02'] + words + [u'\x03'])  # apply \x02 and \x03 as begin/end identifiers
-
-    for i in range(1, 6):
-        if ''.join(['word-', str(i), '-gram']) in features:
-            logging.debug(''.join(['\tGenerating word-', str(i), '-gram features ...']))
-            gram_list = []
-            for tweet in tweets_words:
-                if i == 1:
-                    grams = ngrams(tweet[1:-1], i)  # do not consider begin/end identifiers in case of word-1-grams
-                else:
-                    grams = ngrams(tweet, i)
-                gram_list.append(grams_histogram(grams))
-            if not char_word_len:
-                char_word_len = len(gram_list)
-            logging.debug('\tRemoving \'hapax legomena\' ...')
-            remove_hapax_legomena(gram_list)
-            sklearn.externals.joblib.dump(gram_list, ''.join([save_dir, os.sep, 'word-', str(i), '-gram.pkl']))
-
-    tweets_pos = []
-    for tweet in tweets:
-        if tweet['pos']:
-            tweets_pos.append(
-                [u'\x02'] + tweet['pos'].split() + [u'\x03'])  # apply \x02 and \x03 as begin/end identifiers
-    for i in range(1, 6):
-        if ''.join(['pos-', str(i), '-gram']) in features:
-            logging.debug(''.join(['\tGenerating pos-', str(i), '-gram features ...']))
-            gram_list = []
-            for tweet in tweets_pos:
-                if i == 1:
-                    grams = ngrams(tweet[1:-1], i)  # do not consider begin/end identifiers in case of pos-1-grams
-                else:
-                    grams = ngrams(tweet, i)
-                gram_list.append(add_postag_id(grams_histogram(
-                    grams)))  # add an element in the pos-tag gram identifier to not mix up these grams with other char/word grams
-            if char_word_len and char_word_len != len(gram_list):
-                logging.error(''.join(
-                    ['Tweet messages and POS Tags with different sizes for author ', os.path.basename(save_dir), ': ',
-                     str(char_word_len), ' and ', str(len(gram_list)), ' respectively. Quitting ...']))
-                sys.exit(1)
-            logging.debug('\tRemoving \'hapax legomena\' ...')
-            remove_hapax_legomena(gram_list)
-            sklearn.externals.joblib.dump(gram_list, ''.join([save_dir, os.sep, 'pos-', str(i), '-gram.pkl']))
-
-
-def tag_url(text):
-    # source: http://stackoverflow.com/questions/6883049/regex-to-find-urls-in-string-in-python
-    # test: import re; re.sub('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+' , u'URL', 'ahttp:/www.uol.com.br ahttp://www.uol.com.br https://255.255.255.255/teste http://www.255.1.com/outroteste a a a ')
-    #return re.sub('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+' , u'URL', text)
-
-    # Thiago Cavalcante's approach
-    return re.sub('((([A-Za-z]{3,9}:(?:\/\/)?)(?:[\-;:&=\+\$,\w]+@)?[A-Za-z0-9\.\-]+|(?:www\.|[\-;:&=\+\$,\w]+@)[A-Za-z0-9\.\-]+)((?:\/[\+~%\/\.\w\-_]*)?\??(?:[\-\+=&;%@\.\w_]*)#?(?:[\.\!\/\\\w]*))?)', u'URL', text)
-
-
-def tag_userref(text):
-    # rational: a username must start with a '@' and have unlimited occurences of letters, numbers and underscores.
-    # test: import re; re.sub('(?<!\S)@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])', u'REF', '@user @us3r @1user @1234567890123456 @_0334 @vser @_ @1 @faeeeec-cas caece ce ce asdcc@notuser ewdede-@dqwec email@some.com.br @ @aaa')
-    #return re.sub('(?<!\S)@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])', u'REF', text)
-
-    # Thiago Cavalcante's approach
-    return re.sub('@[^\s]+', u'REF', text)
-
-
-def tag_hashtag(text):
-    # rationale: https://support.twitter.com/articles/49309
-    # test: import re; re.sub('(?<!\S)(#[0-9a-zA-Z_-]+)(?![0-9a-zA-Z_-])', u'TAG', '#anotherhash #123 #a123 a not#hash #[]aaa #avbjd')
-    #return re.sub('(?<!\S)(#[0-9a-zA-Z_-]+)(?![0-9a-zA-Z_-])', u'TAG', text)
-
-    # Thiago Cavalcante's approach
-    return re.sub('#[a-zA-Z]+', u'TAG', text)
-
-
-def tag_date(text):
-    # rationale: a date is a two or three blocks of digits separated by a slash.
-    # test: import re; re.sub(('(?<!\S)('
-    #                                       '[0-3]?[0-9]\s?[/-]\s?[0-3]?[0-9]\s?[/-]\s?[0-9]{1,4}|'     # DD/MM/YYYY or MM/DD/YYYY
-    #                                       '[0-1]?[0-9]\s?[/-]\s?[0-9]{1,4}|'                          # MM/YYYY
-    #                                       '[0-9]{1,4}\s?[/-]\s?[0-1]?[0-9]|'                          # YYYY/MM
-    #                                       '[0-3]?[0-9]\s?[/-]\s?[0-3]?[0-9]'                          # DD/MM or MM/DD
-    #                       '            )(?![0-9a-zA-Z])'
-    #                           ), u'DAT', '23/12/1977 12 - 23- 2014 25-10 12 / 23 09/2013 1999 - 02 90/12 a12/94 12/31. 12/31a 12-31')
-    #return re.sub(('(?<!\S)('
-    #                            '[0-3]?[0-9]\s?[/-]\s?[0-3]?[0-9]\s?[/-]\s?[0-9]{1,4}|'     # DD/MM/YYYY or MM/DD/YYYY
-    #                            '[0-1]?[0-9]\s?[/-]\s?[0-9]{1,4}|'                          # MM/YYYY
-    #                            '[0-9]{1,4}\s?[/-]\s?[0-1]?[0-9]|'                          # YYYY/MM
-    #                            '[0-3]?[0-9]\s?[/-]\s?[0-3]?[0-9]'                          # DD/MM or MM/DD
-    #                       ')(?![0-9a-zA-Z])'
-    #               ), u'DAT', text)
-
-    # Thiago Cavalcante's approach
-    return re.sub('[0-9]?[0-9][-/][0-9]?[0-9]([-/][0-9][0-9][0-9][0-9])?', u'DAT', text)
-
-
-def tag_time(text):
-    # rationale: a time is one or two digits followed by a colon and one or two more digits followed by an optional seconds block. An optional AM/PM suffix can also occur.
-    # test: import re; re.sub('(?<!\S)([0-2]?[0-9]:[0-5]?[0-9](:[0-5]?[0-9])?\s?([A|P]M)?)(?![0-9a-zA-Z])', u'TIM', '00:00 AM 1:01PM 2:2 pm 01:02:03 Am 01:02. 03:12! 03:14a bbb 60:60 3:40am', flags=re.IGNORECASE)
-    #return re.sub('(?<!\S)([0-2]?[0-9]:[0-5]?[0-9](:[0-5]?[0-9])?\s?([A|P]M)?)(?![0-9a-zA-Z])', u'TIM', text, flags=re.IGNORECASE)
-
-    # Thiago Cavalcante's approach
-    return re.sub('[0-9]?[0-9]:[0-9]?[0-9](:[0-9]?[0-9])?', u'TIM', text)
-
-
-def tag_number(text):
-    # rationale: a number is a group of consecutive digits, comma and points, prefixed by a optional plus/minus. Obs: expected very few false positives
-    # test: import re; re.sub('(?<!\S)([+-]?[0-9.,]*[0-9])(?![0-9a-zA-Z+-])', u'NUM', '98.786    123 123.1 345,2 32, 56. .92 ,34 100,000.00 +11,3 -10 10? 10! 1,1..2 1-1 1+1 dadcd12  89hjgj tt.bt.65bnnn 98,3')
-    #return re.sub('(?<!\S)([+-]?[0-9.,]*[0-9])(?![0-9a-zA-Z+-])', u'NUM', text)
-
-    # rationale: a number is a group of three possibilities: 1) a leading digits followed by point/comma and optional decimal digits; 2) leading comma/point followed by digits; 3) numbers without comma/point
-    # test: import re; re.sub('(?<!\S)([0-9]+[,.][0-9]*|[,.][0-9]+|[0-9]+)(?=\s|$)', u'NUM', '98.786    123 123.1 345,2 32, 56. .92 ,34 dadcd12  89hjgj tt.bt.65bnnn 98,3')
-    # return re.sub('(?<!\S)([0-9]+[,.][0-9]*|[,.][0-9]+|[0-9]+)(?=\s|$)', u'NUM', text)
-
-    # Thiago Cavalcante's approach
-    return re.sub('[0-9]+', u'NUM', text)
-
-
-
-if __name__ == '__main__':
-    # parsing argument
-
-    # parsing arguments
-    #args = command_line_parsing()
-
-    source_dir_data = sys.argv[1]
-    dest_dir = sys.argv[2]
+    return rf, clf
+
+
+def fit_classify(num_trees, x_train, y_train, x_test, y_test, linear_model='svc'):
+    """
+    Trains the classifiers (see fit) and runs them on the test set.
+    """
+    rf, clf = fit(num_trees, x_train, y_train, linear_model)
+
+    # return the fitted models and their predictions
+    return (rf, clf, rf.predict(x_test), clf.predict(x_test))
+
+
+def extend_tree(tree, column_positions, class_positions, num_columns, num_classes):
+    """
+    Makes a fitted tree of a random forest take num_columns columns and
+        predict num_classes classes, its former ones being at the given
+        positions: its splits are renumbered and the new classes get no
+        samples in its leaves, so that its predictions are left unchanged.
+    """
+    state = tree.tree_.__getstate__()
+    nodes = state['nodes'].copy()
+    splits = nodes['feature'] >= 0      # the leaves have no feature
+    nodes['feature'][splits] = column_positions[nodes['feature'][splits]]
+    values = numpy.zeros((state['node_count'], tree.n_outputs_, num_classes))
+    values[:, :, class_positions] = state['values'][:, :, :tree.n_classes_]
+    tree.tree_ = sklearn.tree._tree.Tree(num_columns, numpy.array([num_classes], dtype=numpy.intp), tree.n_outputs_)
+    tree.tree_.__setstate__(dict(state, nodes=nodes, values=values))
+    tree.n_features_ = num_columns
+    tree.n_classes_ = num_classes
+    tree.classes_ = numpy.arange(num_classes, dtype=numpy.float64)      # the forest encodes the classes by index
+
+
+def extend_linear_model(clf, column_positions, class_positions, num_columns, classes):
+    """
+    Makes a fitted linear model (SGDClassifier) take num_columns columns and
+        predict the classes, its former ones being at the given positions,
+        for partial_fit to go on training it. The new columns and classes
+        start with null weights.
+    """
+    coef = clf.coef_
+    intercept = clf.intercept_
+    if len(clf.classes_) == 2:      # a single hyperplane, for the second class
+        coef = numpy.vstack([-coef, coef])
+        intercept = numpy.concatenate([-intercept, intercept])
+    clf.coef_ = numpy.zeros((len(classes), num_columns))
+    clf.coef_[numpy.ix_(class_positions, column_positions)] = coef
+    clf.intercept_ = numpy.zeros(len(classes))
+    clf.intercept_[class_positions] = intercept
+    if len(classes) == 2:
+        clf.coef_ = clf.coef_[1:]
+        clf.intercept_ = clf.intercept_[1:]
+    clf.classes_ = classes
+
+
+def linear_model_name(clf):
+    """
+    Returns the name of the linear model clf in linear_models.
+    """
+    return 'sgd' if isinstance(clf, sklearn.linear_model.SGDClassifier) else 'svc'
+
+
+def update(num_trees, model_vocabulary, rf, clf, vocabulary, x_train, y_train, linear_model=None):
+    """
+    Updates the classifiers of a saved model with the training set of the
+        corpus vocabulary, which may bring new authors and new grams: the
+        forest grows num_trees trees trained on all the classes, its former
+        trees being kept, and the linear model goes on training with
+        partial_fit (see update_epochs) or, without it (SVC), is trained again.
+        When linear_model names another linear model than clf's, a new one of
+        it is trained instead.
+        The former trees never vote for the new authors: the more trees are
+        grown, the better the new authors are recognized.
+    Returns the corpus ids of the columns of the updated classifiers and the
+        classifiers, or None when the model does not fit the corpus (authors
+        of the model left out of the training set, grams of the model missing
+        from the corpus vocabulary).
+    """
+    model_columns = vocabulary.corpus_ids(model_vocabulary)
+    classes = numpy.unique(y_train)
+    if vocabulary.hashing_bits != model_vocabulary.hashing_bits or (model_columns == -1).any() or not set(rf.classes_) <= set(classes):
+        return None
+    columns = numpy.union1d(model_columns, x_train.indices)
+    x_train = x_train[:, columns].astype(bool).astype(int)
+    column_positions = numpy.searchsorted(columns, model_columns)
+
+    for tree in rf.estimators_:
+        extend_tree(tree, column_positions, numpy.searchsorted(classes, rf.classes_), len(columns), len(classes))
+    rf.set_params(n_estimators=len(rf.estimators_) + num_trees, warm_start=True)
+    rf.fit(x_train, y_train)
+    rf.set_params(warm_start=False)
+
+    if linear_model is not None and linear_model != linear_model_name(clf):
+        clf = linear_models[linear_model]().fit(x_train, y_train)
+    elif hasattr(clf, 'partial_fit'):
+        extend_linear_model(clf, column_positions, numpy.searchsorted(classes, clf.classes_), len(columns), classes)
+        for _ in range(update_epochs):
+            clf.partial_fit(x_train, y_train, classes=classes)
+    else:
+        clf = sklearn.base.clone(clf).fit(x_train, y_train)
+    return columns, rf, clf
+
+
+def generate_test_ngrams(source_dir_data, dest_dir, debug, hashing_bits):
+    """
+    Generates the n-grams of the test tweets' files of source_dir_data in
+        dest_dir, hashed with hashing_bits as the training ones.
+    """
     #features = sys.argv[3]
-    debug = sys.argv[4]
-
     #if 'all' in features:
     features = features_list
 
@@ -331,30 +261,189 @@ if __name__ == '__main__':
         logging.debug(''.join(['Reading tweets and generating n-grams for file ', filename, ' ...']))
         author_dir = os.sep.join([dest_dir, os.path.splitext(os.path.basename(filename))[0]])
         os.makedirs(author_dir)
-        ngrams_generator(messages_persistence.read(filename), features, author_dir)
+        ngrams_generator(messages_persistence.read(filename), features, author_dir, hashing_bits)
 
     print('\n')
-    print('NgramsOfTestTweetProcessed')
+
+
+def save_model(model_dir, vocabulary, train_columns, features, rf, clf):
+    """
+    Saves the trained classifiers in model_dir, with the vocabulary of their
+        columns (the corpus ids of train_columns, see
+        feature_store.CorpusVocabulary.subset) as the fitted vectorizer.
+    """
+    vocabulary.subset(train_columns, model_dir).save()
+    sklearn.externals.joblib.dump((features, rf, clf), os.sep.join([model_dir, model_filename]))
+
+
+def save_feature_importances(output_dir, vocabulary, train_columns, rf):
+    sklearn.externals.joblib.dump(dict((vocabulary.key(feature), column) for column, feature in enumerate(train_columns)),
+                                  os.sep.join([output_dir, 'vectorizer_vocabulary.pkl']))
+    sklearn.externals.joblib.dump(rf.feature_importances_,
+                                  os.sep.join([output_dir, 'rf_model_feature_importances.pkl']))
+
+
+def load_model(model_dir):
+    """
+    Returns the vocabulary, features, random forest and SVM saved by save_model.
+    The model is loaded again only when it was saved again since, for long-lived
+        processes (see attribution_daemon.py).
+    """
+    filename = os.sep.join([model_dir, model_filename])
+    saved_time = os.path.getmtime(filename)
+    model_dir = os.path.abspath(model_dir)
+    if model_dir not in loaded_models or loaded_models[model_dir][0] != saved_time:
+        features, rf, clf = sklearn.externals.joblib.load(filename)
+        loaded_models[model_dir] = (saved_time, (feature_store.load_corpus_vocabulary(model_dir), features, rf, clf))
+    return loaded_models[model_dir][1]
+
+
+def is_model(model_dir):
+    return os.path.exists(os.sep.join([model_dir, model_filename]))
+
+
+def sample_test_tweets(test_dir, min_tweets, num_authors, num_tweets, features, vocabulary):
+    """
+    Returns the authors sampled from test_dir and the CSR matrix of their
+        first tweet, in the columns of the vocabulary.
+    """
+    print(''.join(['Filtering out authors with less than ', str(min_tweets), ' tweets ...']))
+    authors_list = filter_authors(test_dir, min_tweets)
+    print("auther list:{}".format(authors_list))
+    if len(authors_list) != num_authors:
+        print('Too few author\'s filenames to sample. Exiting ...')
+        # sys.exit(1)
+    print(''.join(['Selected ', str(len(authors_list)), ' authors for the experiment.']))
+
+    print('\tSampling the authors ...')
+    authors_sampled = list(authors_list)  # copy the list
+    random.shuffle(authors_sampled)
+    authors_sampled = authors_sampled[0:num_authors]
+
+    print('\tSampling the tweets ...')
+    tweets_sampled, authors_rows = sample_tweets(authors_sampled, num_tweets, features, vocabulary)
+    print("tweets after sampling:{}".format(tweets_sampled))
+    return authors_list, authors_sampled, tweets_sampled[authors_rows]
+
+
+def print_predictions(rf_result, svm_result):
+    print("resultarecoming")
+    print("prediction of rf classifier:", rf_result)
+    print("prediction of svm classifier:", svm_result)
+
+
+def update_model(output_dir, source_dir_data, min_tweets, num_tweets, features, num_trees, vocabulary, model_vocabulary, rf, clf, linear_model=None):
+    """
+    Updates the model saved in output_dir with all the authors of
+        source_dir_data, which must include the authors of the model (see
+        update), and saves it again.
+    """
+    print(''.join(['Filtering out authors with less than ', str(min_tweets), ' tweets ...']))
+    authors_list = filter_authors(source_dir_data, min_tweets)
+    missing_authors = sorted(set(rf.classes_) - set(authors_list))
+    if missing_authors:
+        print(''.join(['Authors of the model saved in ', output_dir, ' not found in ', source_dir_data, ': ', str(missing_authors),
+                       ', train it again. Quitting ...']))
+        sys.exit(1)
+    # all the authors of the model and the new ones, whatever the number of authors asked
+    authors_sampled = sorted(authors_list)
+    new_authors = sorted(set(authors_sampled) - set(rf.classes_))
+    print(''.join(['Updating the model with ', str(len(authors_sampled)), ' authors, ', str(len(new_authors)), ' of them new ...']))
+    saved_linear_model = linear_model_name(clf)
+    if linear_model not in [None, saved_linear_model]:
+        print(''.join(['Replacing the ', saved_linear_model, ' linear model of the model by a new ', linear_model, ' one ...']))
+    elif saved_linear_model == 'svc':
+        print('The svc linear model of the model has no incremental training: training it again on all the authors (select sgd to replace it) ...')
+    with open(''.join([output_dir, os.sep, 'filtered_authors.txt']), mode='w') as fd:
+        fd.write('\n'.join(authors_list))
+    with open(''.join([output_dir, os.sep, 'updated_authors.txt']), mode='w') as fd:
+        fd.write('\n'.join(new_authors))
+
+    loaded_models.pop(os.path.abspath(output_dir), None)     # updated in place
+    x_train = training_set(authors_sampled, num_tweets, features, vocabulary)
+    updated = update(num_trees, model_vocabulary, rf, clf, vocabulary, x_train, list(authors_sampled), linear_model)
+    if updated is None:
+        print(''.join(['The model saved in ', output_dir, ' does not fit the corpus vocabulary of ', source_dir_data,
+                       ', train it again. Quitting ...']))
+        sys.exit(1)
+    train_columns, rf, clf = updated
+    if vocabulary.hashing_bits:
+        # side table to reverse the hashed ids of vectorizer_vocabulary.pkl
+        feature_store.save_hashed_grams(output_dir, vocabulary.hashing_bits, feature_store.merge_hashed_grams(authors_sampled))
+    save_model(output_dir, vocabulary, train_columns, features, rf, clf)
+    save_feature_importances(output_dir, vocabulary, train_columns, rf)
+    print(''.join(['Model of ', str(len(rf.estimators_)), ' trees and ', str(len(train_columns)), ' grams.']))
+
+
+def main(argv):
+    """
+    Runs the attribution with the command line arguments argv (see the modes
+        below).
+    """
+    # parsing argument
+
+    # parsing arguments
+    #args = command_line_parsing()
+
+    # the optional 16th argument selects training and saving the model in the
+    # output directory, predicting with the model saved there, or both (default)
+    # (update trains the model saved there further with the authors of the
+    # source directory, new ones included, without training it again)
+    mode = argv[16] if len(argv) > 16 else 'train-predict'
+    if mode not in modes:
+        print(''.join(['Unknown mode ', mode, ', expected one of ', str(modes), '. Quitting ...']))
+        sys.exit(1)
+    # the optional 17th argument selects the linear model trained next to the
+    # random forest (see linear_models): svc by default or, when updating, the
+    # linear model of the saved model
+    linear_model = argv[17] if len(argv) > 17 else None
+    if linear_model is None and mode != 'update':
+        linear_model = 'svc'
+    if linear_model is not None and linear_model not in linear_models:
+        print(''.join(['Unknown linear model ', linear_model, ', expected one of ', str(sorted(linear_models)), '. Quitting ...']))
+        sys.exit(1)
+
+    source_dir_data = argv[5]
+    output_dir = argv[6]
+    if mode in ['predict', 'update']:
+        if not is_model(output_dir):
+            print(''.join(['No model saved in ', output_dir, '. Quitting ...']))
+            sys.exit(1)
+        model_vocabulary, features, model, model_svm = load_model(output_dir)
+        hashing_bits = model_vocabulary.hashing_bits      # the test n-grams are hashed as the training ones
+    else:
+        hashing_bits = feature_store.corpus_hashing_bits(source_dir_data)      # the test n-grams are hashed as the training ones
+
+    if mode not in ['train', 'update']:
+        generate_test_ngrams(argv[1], argv[2], argv[4], hashing_bits)
+        print('NgramsOfTestTweetProcessed')
 
     #args = command_line_parsing()
 
     # logging configuration
     #logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO,format='[%(asctime)s] - %(levelname)s - %(message)s')
-    source_dir_data = sys.argv[5]
-    output_dir = sys.argv[6]
-    min_tweets = int(sys.argv[7])
-    test_dir = sys.argv[8]
-    repetitions = int(sys.argv[9])
-    num_authors = int(sys.argv[10])
-    num_tweets = int(sys.argv[11])
-    features = sys.argv[12]
-    num_trees = int(sys.argv[13])
-    num_most_important_features = int(sys.argv[14])
-    debug = sys.argv[15]
+    min_tweets = int(argv[7])
+    test_dir = argv[8]
+    repetitions = int(argv[9])
+    num_authors = int(argv[10])
+    num_tweets = int(argv[11])
+    if mode not in ['predict', 'update']:
+        features = argv[12]
+    num_trees = int(argv[13])
+    num_most_important_features = int(argv[14])
+    debug = argv[15]
 
     if 'all' in features:
         features = features_list
 
+    if mode == 'predict':
+        x_test = sample_test_tweets(test_dir, min_tweets, num_authors, num_tweets, features, model_vocabulary)[2].astype(bool).astype(int)
+        print_predictions(model.predict(x_test), model_svm.predict(x_test))
+        print('Finishing ... ;)')
+        return
+
+    vocabulary = feature_store.corpus_vocabulary(source_dir_data)
+
     print(''.join(['Starting the classification ...',
                           '\n\tsource directory data = ', source_dir_data,
                           '\n\toutput directory = ', output_dir,
@@ -369,6 +458,11 @@ if __name__ == '__main__':
                           '\n\tdebug = ', str(debug),
                           ]))
 
+    if mode == 'update':
+        update_model(output_dir, source_dir_data, min_tweets, num_tweets, features, num_trees, vocabulary, model_vocabulary, model, model_svm, linear_model)
+        print('Finishing ... ;)')
+        return
+
     print('Creating output directory ...')
     if os.path.exists(output_dir):
         print('Output directory already exists. Quitting ...')
@@ -409,98 +503,48 @@ if __name__ == '__main__':
 
         print('\tSampling the tweets ...')
         print('Sample tweet ke upar se')
-        tweets_sampled, feature_kind_dict = sample_tweets(authors_sampled, num_tweets, features)
+        x_train = training_set(authors_sampled, num_tweets, features, vocabulary)
+        if hashing_bits:
+            # side table to reverse the hashed ids of vectorizer_vocabulary.pkl
+            feature_store.save_hashed_grams(output_dir, hashing_bits, feature_store.merge_hashed_grams(authors_sampled))
 
-        # print("tweets after sampling:{}".format(tweets_sampled))
-        fold_tweets_sampled = copy.deepcopy(
-            tweets_sampled)  # need to copy recursively all the data so that the hapax legomena step do not interfere in the other folds
-
-        # print("tweets after sampling:{}".format(fold_tweets_sampled))
-        # sys.exit(1)
-        author_train_start_idx = 0
-        class_id = 0
-        y_train = [0] * num_authors
+        y_train = list(authors_sampled)
         y_test = [0] * 1
-        train_list = []
-        test_list = []
-        #print('\t\tBuilding training/test sets...')
-        # print("tweets after sampling:{}".format(fold_tweets_sampled.values()))
-        i = 0
-        j = 0
-        for author in fold_tweets_sampled.keys():
-            train_list.append(fold_tweets_sampled[author][0])
-            y_train[i] = author
-            i = i + 1
-            #logging.debug(''.join(['\t\t\tRemoving \'hapax legomena\' for author ', os.path.basename(author), '...']))
-            remove_hapax_legomena(train_list[author_train_start_idx:])
-            author_train_start_idx += 1
-
-        # print("number of data:{}".format(i))
-
-        print(''.join(['Filtering out authors with less than ', str(min_tweets), ' tweets ...']))
-        authors_list = filter_authors(test_dir, min_tweets)
-        print("auther list:{}".format(authors_list))
-        if len(authors_list) != num_authors:
-            print('Too few author\'s filenames to sample. Exiting ...')
-            # sys.exit(1)
-        print(''.join(['Selected ', str(len(authors_list)), ' authors for the experiment.']))
-        with open(''.join([output_dir, os.sep, 'filtered_authors_test.txt']), mode='w') as fd:
-            fd.write('\n'.join(authors_list))
-
-        print('\tSampling the authors ...')
-        authors_sampled = list(authors_list)  # copy the list
-        random.shuffle(authors_sampled)
-        authors_sampled = authors_sampled[0:num_authors]
-        with open(''.join([run_dir, os.sep, 'sampled_authors_test.txt']), mode='w') as fd:
-            fd.write('\n'.join(authors_sampled))
-
-        print('\tSampling the tweets ...')
-        tweets_sampled, feature111 = sample_tweets(authors_sampled, num_tweets, features)
-
-        fold_tweets_sampled_test = copy.deepcopy(tweets_sampled)
-        print("tweets after sampling:{}".format(tweets_sampled))
-        train_list_t = []
-        i = 0
-        for author in fold_tweets_sampled_test.keys():
-            train_list_t.append(fold_tweets_sampled_test[author][0])
-
-        # print("tweets after sampling:{}".format(train_list_t))
 
         #logging.debug('\t\tFitting and vectorizing the training set ...')
-        vectorizer = sklearn.feature_extraction.DictVectorizer()
-        x_train = vectorizer.fit_transform(train_list)
-
-        x_test_t = vectorizer.transform(train_list_t)
-
-        # print("X_test array:{}".format(x_test_t))
-
-        # print("X_test array:{}".format(manoj))
+        train_columns = numpy.unique(x_train.indices)     # the corpus ids of the grams left in the training set
+        x_train = x_train[:, train_columns]
 
         #logging.debug('\t\tTransforming the feature vector in a binary activation feature vector ...')
         x_train = x_train.astype(bool).astype(int)
-        x_test = x_test_t.astype(bool).astype(int)
 
         #logging.debug('\t\tTraining and running the classifier ...')
         #logging.debug(''.join(['\t\tFeature vector training size: ', str(x_train.shape)]))
-        model, result, result1 = fit_classify(num_trees, x_train.todense(), y_train, x_test.todense(), y_test)
+        if mode == 'train':
+            model, model_svm = fit(num_trees, x_train, y_train, linear_model)
+        else:
+            authors_list, authors_sampled, x_test_t = sample_test_tweets(test_dir, min_tweets, num_authors, num_tweets, features, vocabulary)
+            with open(''.join([output_dir, os.sep, 'filtered_authors_test.txt']), mode='w') as fd:
+                fd.write('\n'.join(authors_list))
+            with open(''.join([run_dir, os.sep, 'sampled_authors_test.txt']), mode='w') as fd:
+                fd.write('\n'.join(authors_sampled))
+            x_test = x_test_t[:, train_columns].astype(bool).astype(int)
+
+            model, model_svm, result, result1 = fit_classify(num_trees, x_train, y_train, x_test, y_test, linear_model)
+            print_predictions(result, result1)
 
-        print("resultarecoming")
-        print("prediction of rf classifier:", result)
-        print("prediction of svm classifier:", result1)
+        #print('\t\tSaving the model ...')
+        save_model(output_dir, vocabulary, train_columns, features, model, model_svm)
 
         #print('\t\tAccounting for feature importance')
-        inverse_vocabulary_array = build_inverse_vocabulary_array(vectorizer.vocabulary_)
         most_important_features_idxs = numpy.argsort(model.feature_importances_)[
                                        -num_most_important_features:]  # the indexes of the 100 most important features in ascending order of importance (the bigger the better)
         for i in range(len(most_important_features_idxs)):  # account the rank of the feature
-            feature = inverse_vocabulary_array[most_important_features_idxs[i]]
-            feature_kind_importance_accumulator[feature_kind_dict[feature]] += i + 1
+            feature = train_columns[most_important_features_idxs[i]]
+            feature_kind_importance_accumulator[vocabulary.kind(feature)] += i + 1
 
         #print('\t\tSaving feature importance data ...')
-        sklearn.externals.joblib.dump(vectorizer.vocabulary_,
-                                      os.sep.join([output_dir, 'vectorizer_vocabulary.pkl']))
-        sklearn.externals.joblib.dump(model.feature_importances_,
-                                      os.sep.join([output_dir, 'rf_model_feature_importances.pkl']))
+        save_feature_importances(output_dir, vocabulary, train_columns, model)
 
     print('Feature importance:')
     feature_importance_counter = 0.0
@@ -511,3 +555,7 @@ if __name__ == '__main__':
             feature_kind_importance_accumulator[feature_kind] / feature_importance_normalization)]))
 
     print('Finishing ... ;)')
+
+
+if __name__ == '__main__':
+    main(sys.argv)
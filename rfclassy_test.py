@@ -0,0 +1,113 @@
+# coding=utf-8
+
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+
+import numpy
+import scipy.sparse
+
+import feature_store
+import rfclassy
+
+
+class rfclassy_test(unittest.TestCase):
+    def setUp(self):
+        random = numpy.random.RandomState(0)
+        self.x = scipy.sparse.csr_matrix(random.randint(0, 2, size=(30, 10)))
+        self.y = numpy.array(['a', 'b', 'c'])[random.randint(0, 3, size=30)]
+        # the same rows with 5 more columns and a new class
+        self.column_positions = numpy.array([0, 1, 3, 4, 6, 7, 9, 10, 12, 13])
+        self.class_positions = numpy.array([0, 2, 3])
+        self.x_extended = scipy.sparse.csr_matrix((self.x.data, self.column_positions[self.x.indices], self.x.indptr), shape=(30, 15))
+
+    def test_extend_tree(self):
+        rf = rfclassy.fit(5, self.x, self.y)[0]
+        probas = [tree.predict_proba(self.x) for tree in rf.estimators_]
+        for tree, proba in zip(rf.estimators_, probas):
+            rfclassy.extend_tree(tree, self.column_positions, self.class_positions, 15, 4)
+            extended_proba = numpy.zeros((30, 4))
+            extended_proba[:, self.class_positions] = proba
+            self.assertTrue(numpy.allclose(extended_proba, tree.predict_proba(self.x_extended)))
+
+    def test_extend_linear_model(self):
+        for classes in [['a', 'b'], ['a', 'b', 'c']]:
+            rows = numpy.in1d(self.y, classes)
+            clf = rfclassy.fit(1, self.x[rows], self.y[rows], 'sgd')[1]
+            decision = clf.decision_function(self.x)
+            if len(classes) == 2:
+                decision = numpy.vstack([-decision, decision]).T
+            rfclassy.extend_linear_model(clf, self.column_positions, self.class_positions[:len(classes)], 15, numpy.array(['a', 'b', 'c', 'd']))
+            self.assertTrue(numpy.allclose(decision, clf.decision_function(self.x_extended)[:, self.class_positions[:len(classes)]]))
+
+    def test_update(self):
+        grams = [('word-1-gram', (unicode(i),)) for i in range(15)]
+        vocabulary = feature_store.CorpusVocabulary(None, ['word-1-gram'], None, grams, None, numpy.zeros(15, dtype=numpy.uint8), numpy.ones(15, dtype=numpy.int64))
+        model_vocabulary = vocabulary.subset(self.column_positions, None)
+        # a new author, with new grams
+        y = self.y.copy()
+        y[:5] = 'd'
+        x = self.x_extended.tolil()
+        x[:5, [2, 5]] = 1
+        x = x.tocsr()
+        for linear_model in sorted(rfclassy.linear_models):
+            rf, clf = rfclassy.fit(5, self.x[5:], self.y[5:], linear_model)
+            columns, rf, clf = rfclassy.update(3, model_vocabulary, rf, clf, vocabulary, x, y)
+            self.assertEqual(sorted(self.column_positions.tolist() + [2, 5]), columns.tolist())      # the grams of the model and the new ones
+            self.assertEqual(8, len(rf.estimators_))
+            self.assertEqual(['a', 'b', 'c', 'd'], rf.classes_.tolist())
+            self.assertEqual(['a', 'b', 'c', 'd'], clf.classes_.tolist())
+            self.assertEqual(12, rf.feature_importances_.shape[0])
+            self.assertEqual((30, 4), rf.predict_proba(x[:, columns]).shape)
+
+            # the linear model asked replaces another one
+            other = [name for name in rfclassy.linear_models if name != linear_model][0]
+            rf, clf = rfclassy.fit(5, self.x[5:], self.y[5:], linear_model)
+            clf = rfclassy.update(3, model_vocabulary, rf, clf, vocabulary, x, y, other)[2]
+            self.assertEqual(other, rfclassy.linear_model_name(clf))
+            self.assertEqual(['a', 'b', 'c', 'd'], clf.classes_.tolist())
+
+            # the authors of the model must be kept
+            rf, clf = rfclassy.fit(5, self.x, self.y, linear_model)
+            self.assertIsNone(rfclassy.update(3, model_vocabulary, rf, clf, vocabulary, x[y != 'a'], y[y != 'a']))
+
+    def test_train_predict(self):
+        package_dir = os.path.dirname(os.path.realpath(__file__))
+        work_dir = tempfile.mkdtemp()
+        stdout = sys.stdout
+        try:
+            def main(mode, test_ngrams_dir):
+                sys.stdout = StringIO.StringIO()
+                try:
+                    rfclassy.main(['rfclassy.py', os.path.join(package_dir, 'DataTest'), test_ngrams_dir, 'all', 'False', os.path.join(package_dir, 'Data5'),
+                                   os.path.join(work_dir, 'model'), '20', test_ngrams_dir, '1', '3', '50', 'all', '10', '100', 'False', mode])
+                    return [line for line in sys.stdout.getvalue().splitlines() if 'prediction of' in line]
+                finally:
+                    sys.stdout = stdout
+
+            # the model trained and saved once predicts as when it was trained
+            predictions = main('train-predict', os.path.join(work_dir, 'test_1'))
+            self.assertEqual(2, len(predictions))
+            self.assertTrue(rfclassy.is_model(os.path.join(work_dir, 'model')))
+            self.assertEqual(predictions, main('predict', os.path.join(work_dir, 'test_2')))
+
+            # the grams of the test tweets, out of the corpus, are looked up in the vocabulary of the model
+            model_vocabulary, features, rf, clf = rfclassy.load_model(os.path.join(work_dir, 'model'))
+            self.assertEqual(rf.n_features_, len(model_vocabulary))
+            corpus_vocabulary = feature_store.corpus_vocabulary(os.path.join(package_dir, 'Data5'))
+            stores = [feature_store.FeatureStore(author_dir) for author_dir in feature_store.corpus_author_dirs(os.path.join(work_dir, 'test_2'))]
+            tweet_idxs_list = [[0] for store in stores]
+            x_test = feature_store.stack(stores, tweet_idxs_list, features, model_vocabulary)
+            self.assertTrue(x_test.nnz > 0)
+            self.assertEqual(feature_store.stack(stores, tweet_idxs_list, features, corpus_vocabulary)[:, corpus_vocabulary.corpus_ids(model_vocabulary)].toarray().tolist(),
+                             x_test.toarray().tolist())
+            self.assertTrue(rfclassy.load_model(os.path.join(work_dir, 'model'))[2] is rf)     # not loaded again while unchanged
+        finally:
+            shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -17,6 +17,24 @@ import codecs
 import re
 import messages_persistence
 import itertools
+import functools
+import authors_pool
+
+
+def command_line_parsing():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('source_dir_data', help='Directory where the tweets\' files are stored.')
+    parser.add_argument('dest_dir', help='Directory where the output files will be written.')
+    parser.add_argument('debug')
+    parser.add_argument('--workers', '-w',
+                        dest='workers',
+                        type=int,
+                        default=1,
+                        help='Number of processes sharing the authors\' files. Default = 1.')
+    return parser.parse_args()
+
+
+url_regex = re.compile('((([A-Za-z]{3,9}:(?:\/\/)?)(?:[\-;:&=\+\$,\w]+@)?[A-Za-z0-9\.\-]+|(?:www\.|[\-;:&=\+\$,\w]+@)[A-Za-z0-9\.\-]+)((?:\/[\+~%\/\.\w\-_]*)?\??(?:[\-\+=&;%@\.\w_]*)#?(?:[\.\!\/\\\w]*))?)')
 
 
 def tag_url(text):
@@ -25,7 +43,10 @@ def tag_url(text):
     #return re.sub('http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+' , u'URL', text)
 
     # Thiago Cavalcante's approach
-    return re.sub('((([A-Za-z]{3,9}:(?:\/\/)?)(?:[\-;:&=\+\$,\w]+@)?[A-Za-z0-9\.\-]+|(?:www\.|[\-;:&=\+\$,\w]+@)[A-Za-z0-9\.\-]+)((?:\/[\+~%\/\.\w\-_]*)?\??(?:[\-\+=&;%@\.\w_]*)#?(?:[\.\!\/\\\w]*))?)', u'URL', text)
+    return url_regex.sub(u'URL', text)
+
+
+userref_regex = re.compile('@[^\s]+')
 
 
 def tag_userref(text):
@@ -34,7 +55,10 @@ def tag_userref(text):
     #return re.sub('(?<!\S)@[0-9a-zA-Z_]{1,}(?![0-9a-zA-Z_])', u'REF', text)
 
     # Thiago Cavalcante's approach
-    return re.sub('@[^\s]+', u'REF', text)
+    return userref_regex.sub(u'REF', text)
+
+
+hashtag_regex = re.compile('#[a-zA-Z]+')
 
 
 def tag_hashtag(text):
@@ -43,7 +67,10 @@ def tag_hashtag(text):
     #return re.sub('(?<!\S)(#[0-9a-zA-Z_-]+)(?![0-9a-zA-Z_-])', u'TAG', text)
 
     # Thiago Cavalcante's approach
-    return re.sub('#[a-zA-Z]+', u'TAG', text)
+    return hashtag_regex.sub(u'TAG', text)
+
+
+date_regex = re.compile('[0-9]?[0-9][-/][0-9]?[0-9]([-/][0-9][0-9][0-9][0-9])?')
 
 
 def tag_date(text):
@@ -64,7 +91,10 @@ def tag_date(text):
     #               ), u'DAT', text)
 
     # Thiago Cavalcante's approach
-    return re.sub('[0-9]?[0-9][-/][0-9]?[0-9]([-/][0-9][0-9][0-9][0-9])?', u'DAT', text)
+    return date_regex.sub(u'DAT', text)
+
+
+time_regex = re.compile('[0-9]?[0-9]:[0-9]?[0-9](:[0-9]?[0-9])?')
 
 
 def tag_time(text):
@@ -73,7 +103,10 @@ def tag_time(text):
     #return re.sub('(?<!\S)([0-2]?[0-9]:[0-5]?[0-9](:[0-5]?[0-9])?\s?([A|P]M)?)(?![0-9a-zA-Z])', u'TIM', text, flags=re.IGNORECASE)
 
     # Thiago Cavalcante's approach
-    return re.sub('[0-9]?[0-9]:[0-9]?[0-9](:[0-9]?[0-9])?', u'TIM', text)
+    return time_regex.sub(u'TIM', text)
+
+
+number_regex = re.compile('[0-9]+')
 
 
 def tag_number(text):
@@ -86,21 +119,108 @@ def tag_number(text):
     # return re.sub('(?<!\S)([0-9]+[,.][0-9]*|[,.][0-9]+|[0-9]+)(?=\s|$)', u'NUM', text)
 
     # Thiago Cavalcante's approach
-    return re.sub('[0-9]+', u'NUM', text)
+    return number_regex.sub(u'NUM', text)
+
+
+class Tagger(object):
+    """
+    Tags a text as the tag_* functions applied in sequence (URLs, user
+        references, hashtags, dates, times and numbers), but in a single
+        left-to-right pass.
+    None of the patterns matches whitespace, and every tag is a run of capital
+        letters, so each whitespace-delimited token of the text is tagged on
+        its own. A pattern can only match a token holding one of its trigger
+        characters ('@', ':' or 'www.' for URLs, '@' for user references,
+        '#' for hashtags and digits for dates, times and numbers), so a single
+        compiled scanner finds the tokens holding a trigger and only these are
+        run through the ordered substitutions, memoized by token.
+    """
+
+    max_cache_size = 100000
+
+    def __init__(self, no_number=False, no_date=False, no_time=False, no_url=False, no_hashtag=False, no_userref=False):
+        self.substitutions = []
+        triggers = []
+        if not no_url:
+            self.substitutions.append(tag_url)
+            triggers += ['@', ':', 'www\\.']
+        if not no_userref:
+            self.substitutions.append(tag_userref)
+            triggers.append('@')
+        if not no_hashtag:
+            self.substitutions.append(tag_hashtag)
+            triggers.append('#')
+        if not no_date:
+            self.substitutions.append(tag_date)
+            triggers.append('[0-9]')
+        if not no_time:
+            self.substitutions.append(tag_time)
+            triggers.append('[0-9]')
+        if not no_number:
+            self.substitutions.append(tag_number)
+            triggers.append('[0-9]')
+        self.token_regex = None
+        if triggers:
+            triggers = sorted(set(triggers))
+            self.token_regex = re.compile(''.join(['(?<!\\S)\\S*?(?:', '|'.join(triggers), ')\\S*']))
+        self.cache = {}
+
+    def _tag_token(self, match):
+        token = match.group(0)
+        tagged = self.cache.get(token)
+        if tagged is None:
+            tagged = token
+            for substitution in self.substitutions:
+                tagged = substitution(tagged)
+            if len(self.cache) >= self.max_cache_size:
+                self.cache.clear()
+            self.cache[token] = tagged
+        return tagged
+
+    def tag(self, text):
+        if self.token_regex is None:
+            return text
+        return self.token_regex.sub(self._tag_token, text)
+
+    def tag_many(self, texts):
+        texts = list(texts)
+        for text in texts:
+            if u'\n' in text:
+                return [self.tag(text) for text in texts]
+        # a line break is a token delimiter, so all the texts are tagged by a single scan
+        return self.tag(u'\n'.join(texts)).split(u'\n') if texts else []
+
+
+def tag_file(filename, dest_dir, no_number=False, no_date=False, no_time=False, no_url=False, no_hashtag=False, no_userref=False):
+    taggedTweets = 0
+    tagger = Tagger(no_number, no_date, no_time, no_url, no_hashtag, no_userref)
+    print(''.join(['Processing file ', filename, ' ...']))
+    with messages_persistence.Writer('full', os.sep.join([dest_dir, os.path.basename(filename)])) as writer:
+        for message in messages_persistence.iter_messages(filename):
+            tagged = tagger.tag(message['tweet'])
+            print('Original message: ' + message['tweet'])
+            print('Tagged message: ' + tagged)
+            if message['pos']:
+                message['full'] = u''.join([tagged, u'\n#POS', message['pos'], u'#POS'])
+            else:
+                message['full'] = tagged
+            writer.write(message)
+            taggedTweets += 1
+    return taggedTweets
 
 
 if __name__ == '__main__':
     # parsing arguments
-    #args = command_line_parsing()
-    source_dir_data = sys.argv[1]
-    dest_dir = sys.argv[2]
+    args = command_line_parsing()
+    source_dir_data = args.source_dir_data
+    dest_dir = args.dest_dir
     no_number = False
     no_date = False
     no_time = False
     no_url = False
     no_hashtag = False
     no_userref = False
-    debug = sys.argv[3]
+    debug = args.debug
     # logging configuration
     #logging.basicConfig(level=logging.DEBUG if debug else logging.INFO, format='[%(asctime)s] - %(levelname)s - %(message)s')
 
@@ -125,34 +245,13 @@ if __name__ == '__main__':
     print('Tagging tweets ...')
     filenames = glob.glob(''.join([source_dir_data, os.sep, '*.dat']))
     i = 0   # processing feedback
-    for filename in filenames:
-        #sys.stderr.write(''.join(['\t', str(i), '/', str(len(filenames)), ' files processed\r']))   # processing feedback
+    taggedTweets = 0
+    tag_function = functools.partial(tag_file, dest_dir=dest_dir, no_number=no_number, no_date=no_date, no_time=no_time,
+                                     no_url=no_url, no_hashtag=no_hashtag, no_userref=no_userref)
+    for file_taggedTweets in authors_pool.map_authors(tag_function, filenames, args.workers):
         i += 1  # processing feedback
-        print(''.join(['Processing file ', filename, ' ...']))
-        messages = messages_persistence.read(filename)
-        messages_tagged = []
-        for message in messages:
-            tagged = message['tweet']
-            if not args.no_url:
-                tagged = tag_url(tagged)
-            if not args.no_userref:
-                tagged = tag_userref(tagged)
-            if not args.no_hashtag:
-                tagged = tag_hashtag(tagged)
-            if not args.no_date:
-                tagged = tag_date(tagged)
-            if not args.no_time:
-                tagged = tag_time(tagged)
-            if not args.no_number:
-                tagged = tag_number(tagged)
-            print('Original message: ' + message['tweet'])
-            print('Tagged message: ' + tagged)
-            messages_tagged.append(tagged)
-        for tagged, message in itertools.izip(messages_tagged, messages):
-            if message['pos']:
-                message['full'] = u''.join([tagged, u'\n#POS', message['pos'], u'#POS'])
-            else:
-                message['full'] = tagged
-        messages_persistence.write(messages, 'full', os.sep.join([args.dest_dir, os.path.basename(filename)]))
+        #sys.stderr.write(''.join(['\t', str(i), '/', str(len(filenames)), ' files processed\r']))   # processing feedback
+        taggedTweets += file_taggedTweets
 
+    print(''.join(['Tagged tweets: ', str(taggedTweets)]))
     print('Finishing ...')
@@ -0,0 +1,64 @@
+# coding=utf-8
+
+import glob
+import os
+import unittest
+
+import messages_persistence
+from tagging_irrelevant_data import (Tagger, tag_url, tag_userref, tag_hashtag,
+    tag_date, tag_time, tag_number)
+
+
+def sequential_tagging(text):
+    for substitution in [tag_url, tag_userref, tag_hashtag, tag_date, tag_time, tag_number]:
+        text = substitution(text)
+    return text
+
+
+class tagging_irrelevant_data_test(unittest.TestCase):
+    texts = [
+        u'',
+        u'no triggers at all here',
+        u'ahttp:/www.uol.com.br ahttp://www.uol.com.br https://255.255.255.255/teste http://www.255.1.com/outroteste a a a ',
+        u'@user @us3r @1user @1234567890123456 @_0334 @vser @_ @1 @faeeeec-cas caece ce ce asdcc@notuser ewdede-@dqwec email@some.com.br @ @aaa',
+        u'#anotherhash #123 #a123 a not#hash #[]aaa #avbjd #http://x.com #@user',
+        u'23/12/1977 12 - 23- 2014 25-10 12 / 23 09/2013 1999 - 02 90/12 a12/94 12/31. 12/31a 12-31',
+        u'00:00 AM 1:01PM 2:2 pm 01:02:03 Am 01:02. 03:12! 03:14a bbb 60:60 3:40am 1:23/45 12/12:30',
+        u'98.786    123 123.1 345,2 32, 56. .92 ,34 100,000.00 +11,3 -10 10? 10! 1,1..2 1-1 1+1 dadcd12  89hjgj',
+        u'RT @someone: check www.example.com/path?a=1&b=2#frag at 10:30 on 12/05/2014 #news',
+        u'mail me: john.doe@example.com or j@x.io:8080/path www.a www. www.b.c/d',
+        u'tabs\tand\nnew lines\r\nwith 1 number\x0bvertical',
+        u'Gamba tade kena mengena, aku cuma berharap masih ada kesempatan untuk mereka bertemu dengan waris2… http://t.co/abc',
+        u'ação 123 café@bar #olá 12:30h',
+    ]
+
+    def test_tag(self):
+        tagger = Tagger()
+        for text in self.texts:
+            self.assertEqual(sequential_tagging(text), tagger.tag(text), repr(text))
+
+    def test_tag_many(self):
+        tagger = Tagger()
+        self.assertEqual([sequential_tagging(text) for text in self.texts], tagger.tag_many(self.texts))
+        single_line_texts = [text for text in self.texts if u'\n' not in text]
+        self.assertEqual([sequential_tagging(text) for text in single_line_texts], tagger.tag_many(single_line_texts))
+        self.assertEqual([], tagger.tag_many([]))
+
+    def test_disabled_tags(self):
+        tagger = Tagger(no_number=True, no_url=True)
+        for text in self.texts:
+            self.assertEqual(tag_time(tag_date(tag_hashtag(tag_userref(text)))), tagger.tag(text), repr(text))
+        tagger = Tagger(True, True, True, True, True, True)
+        for text in self.texts:
+            self.assertEqual(text, tagger.tag(text))
+
+    def test_dataset(self):
+        tagger = Tagger()
+        data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Data1')
+        for filename in glob.glob(os.path.join(data_dir, '*.dat')):
+            for message in messages_persistence.iter_messages(filename):
+                self.assertEqual(sequential_tagging(message['tweet']), tagger.tag(message['tweet']))
+
+
+if __name__ == '__main__':
+    unittest.main()